@@ -0,0 +1,62 @@
+#! /usr/bin/env python
+
+# Per-device circuit breaker.
+#
+# A TV that's off (or unplugged, or on a dead port) doesn't answer at all, so
+# every command sent to it costs a full serial timeout.  Once a device has
+# missed an ack, or is known to be off, its breaker opens and commands are
+# refused straight away.  After a cool-down the next command is allowed to
+# probe the TV with the short power query; if that's answered the breaker
+# closes, otherwise it stays open for twice as long.
+
+import threading
+import time
+
+################################################################################
+class CircuitBreaker(object):
+	def __init__(self, cooldown=2.0, maxCooldown=60.0):
+		self.lock = threading.Lock()
+		self.baseCooldown = cooldown
+		self.maxCooldown = maxCooldown
+		self.cooldown = cooldown
+		self.isOpen = False
+		self.retryAt = 0
+		self.failures = 0
+
+	########################################
+	def allow(self):
+		return not self.isOpen
+
+	########################################
+	#True once an open breaker has cooled down enough to try a probe
+	def probeDue(self, now=None):
+		if now is None:
+			now = time.time()
+		return self.isOpen and now >= self.retryAt
+
+	########################################
+	def success(self):
+		with self.lock:
+			self.isOpen = False
+			self.failures = 0
+			self.cooldown = self.baseCooldown
+
+	########################################
+	def failure(self, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			self.failures += 1
+			if self.isOpen:
+				self.cooldown = min(self.cooldown * 2, self.maxCooldown)
+			self.isOpen = True
+			self.retryAt = now + self.cooldown
+
+	########################################
+	#seconds until the next probe is allowed (0 if closed or already due)
+	def remaining(self, now=None):
+		if now is None:
+			now = time.time()
+		if not self.isOpen:
+			return 0
+		return max(0, self.retryAt - now)
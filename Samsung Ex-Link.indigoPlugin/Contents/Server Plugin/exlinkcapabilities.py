@@ -0,0 +1,152 @@
+#! /usr/bin/env python
+
+# What each TV can actually do.
+#
+# Not every Samsung answers every query or takes every command: plenty have no
+# 3D, older sets have no HDMI 5, and many lack the S-Video, PC or DVI inputs.
+# Asking one of those anyway costs a full timeout every time.  A device's
+# DeviceCapabilities learns from the plugin's timed exchanges which names -
+# status queries, commands, and selections like "Input HDMI5" - the TV deals
+# with:
+#   - anything answered (or seen in a reply, for selections) is supported
+#   - something that goes unanswered FAILURES_NEEDED times running, while the
+#     TV is answering other things, is unsupported
+# A TV that isn't answering anything teaches us nothing.  An unsupported name
+# is tried again after RECHECK seconds in case it was learned wrongly.
+#
+# A profile - {"supported" : [...], "unsupported" : [...]} - can seed a device,
+# so TVs of the same model needn't each learn it; what a profile says is
+# unsupported is never rechecked, though a TV that answers it anyway wins.
+# profile() exports what a device has learned in the same form.  state() and
+# the state argument round-trip through JSON so what's learned can be kept
+# across plugin restarts.
+
+import json
+import threading
+import time
+
+FAILURES_NEEDED = 3
+RECENT = 60 #seconds; a failure only counts if the TV answered something this recently
+RECHECK = 24 * 60 * 60
+
+################################################################################
+class CapabilityError(ValueError):
+	pass
+
+################################################################################
+class DeviceCapabilities(object):
+	def __init__(self, profile=None, state=None):
+		profile = profile or {}
+		state = state or {}
+		self.lock = threading.Lock()
+		self.supported = set(profile.get("supported", [])) | set(state.get("supported", []))
+		#name -> when it was found unsupported, or None if a profile says so
+		self.unsupported = dict((name, None) for name in profile.get("unsupported", []))
+		self.unsupported.update(state.get("unsupported", {}))
+		for name in self.supported:
+			self.unsupported.pop(name, None)
+		self.failures = {} #name -> unanswered tries in a row
+		self.lastAnswer = 0
+
+	########################################
+	#the TV answered something, even if it wasn't the thing asked for
+	def heard(self, now=None):
+		self.lastAnswer = time.time() if now is None else now
+
+	########################################
+	#the TV dealt with `name`; returns True if it had been thought unsupported
+	def answered(self, name, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			self.lastAnswer = now
+			self.supported.add(name)
+			self.failures.pop(name, None)
+			return self.unsupported.pop(name, False) is not False
+
+	########################################
+	#the TV didn't answer `name`; returns True if that makes it unsupported
+	def unanswered(self, name, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			if name in self.supported or name in self.unsupported or now - self.lastAnswer > RECENT:
+				return False
+			failures = self.failures[name] = self.failures.get(name, 0) + 1
+			if failures < FAILURES_NEEDED:
+				return False
+			del self.failures[name]
+			self.unsupported[name] = now
+			return True
+
+	########################################
+	#False if the TV is known not to support `name` and it isn't due a recheck
+	def allows(self, name, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			found = self.unsupported.get(name, False)
+			if found is False:
+				return True
+			if found is None or now - found < RECHECK:
+				return False
+			#one more miss and it's unsupported again
+			del self.unsupported[name]
+			self.failures[name] = FAILURES_NEEDED - 1
+			return True
+
+	########################################
+	def forget(self):
+		with self.lock:
+			self.supported = set()
+			self.unsupported = {}
+			self.failures = {}
+
+	########################################
+	def profile(self):
+		with self.lock:
+			return {"supported" : sorted(self.supported), "unsupported" : sorted(self.unsupported)}
+
+	########################################
+	#only what was learned; whatever came from a profile comes from it again
+	def state(self):
+		with self.lock:
+			return {
+				"supported" : sorted(self.supported),
+				"unsupported" : dict((name, found) for name, found in self.unsupported.items() if found is not None),
+			}
+
+########################################
+#one profile for several TVs of the same model: what any of them does is
+#supported, and what any of them doesn't (and none does) is unsupported
+def mergeProfiles(profiles):
+	supported = set()
+	unsupported = set()
+	for profile in profiles:
+		supported.update(profile.get("supported", []))
+		unsupported.update(profile.get("unsupported", []))
+	return {"supported" : sorted(supported), "unsupported" : sorted(unsupported - supported)}
+
+########################################
+#Parses profiles: JSON text, or the path of a file holding it, of the form
+#{model : profile}.  Raises CapabilityError if anything is wrong.
+def parseProfiles(text):
+	text = (text or "").strip()
+	if not text:
+		return {}
+	if not text.startswith("{"):
+		try:
+			with open(text) as definitions:
+				text = definitions.read()
+		except (IOError, OSError) as e:
+			raise CapabilityError("can't read capability profiles from "+text+": "+str(e))
+	try:
+		profiles = json.loads(text)
+	except ValueError as e:
+		raise CapabilityError("capability profiles aren't valid JSON: "+str(e))
+	if not isinstance(profiles, dict):
+		raise CapabilityError("capability profiles must be a JSON object of models")
+	for model, profile in profiles.items():
+		if not isinstance(profile, dict) or any(not isinstance(profile.get(key, []), list) for key in ("supported", "unsupported")):
+			raise CapabilityError("the profile for \""+model+"\" must be an object with \"supported\" and \"unsupported\" lists")
+	return profiles
@@ -0,0 +1,704 @@
+#! /usr/bin/env python
+
+# Ex-Link protocol codec.
+#
+# Everything the plugin knows about the wire format lives here: the command,
+# query and reply tables, and the functions that turn them into bytes and back.
+# It doesn't import indigo or serial, so the protocol path can be exercised
+# and timed away from the Indigo server.
+#
+# The tables are kept in the same shape they've always had (lists of ints)
+# because the action UI and menus read them.  At import time every fixed
+# command is turned into an immutable bytes frame, so sending one is a dict
+# lookup with nothing to build or convert.
+
+from collections import namedtuple
+
+QUERIES = {
+	"POWER" : [0x08, 0x22, 0xF0, 0x00, 0x00, 0x00, 0xE6],
+	"VOLUME" : [0x08, 0x22, 0xF0, 0x01, 0x00, 0x00, 0xE5],
+	"MUTE" : [0x08, 0x22, 0xF0, 0x02, 0x00, 0x00, 0xE4],
+	"CHANNEL" : [0x08, 0x22, 0xF0, 0x03, 0x00, 0x00, 0xE3],
+	"INPUT" : [0x08, 0x22, 0xF0, 0x04, 0x00, 0x00, 0xE2],
+	"PICTURE_SIZE" : [0x08, 0x22, 0xF0, 0x05, 0x00, 0x00, 0xE1],
+	"3D_MODE" : [0x08, 0x22, 0xF0, 0x06, 0x00, 0x00, 0xE0],
+	"PICTURE_MODE" : [0x08, 0x22, 0xF0, 0x07, 0x00, 0x00, 0xDF],
+	"SOUND_MODE" : [0x08, 0x22, 0xF0, 0x08, 0x00, 0x00, 0xDE],
+	#one might expect that other settings could be queried via successive
+	#values of byte 4, but that doesn't seem to be the case on my TV
+}
+
+#byte 3 of each query comes back as byte 5 of its 13-byte reply, which lets
+#us work out which query a reply belongs to when several are in flight
+QUERY_TYPES = dict((packet[3], query) for query, packet in QUERIES.items())
+
+#status types whose reply carries a plain number in byte 9 instead of a table entry
+VALUE_STATES = {
+	0x01 : "volume",
+	0x02 : "mute",
+	0x03 : "channel",
+}
+
+RESPONSES = {
+	"ACK" : [0x03, 0x0C, 0xF1],
+	"POWER" : [0x03, 0x0C, 0xF5, 0x08, 0xf0, 0x00, 0x00, 0x00, 0xf1, 0x05, 0x00, 0x00, 0x0e],
+	"STATUS" : [0x03, 0x0C, 0xF5], #header of every 13-byte status reply
+}
+
+RESPONSE_LENGTH = 13 #all response messages (except command ack) are 13 bytes long
+#the responses below all omit the 030CF508F0 header
+#I could be smarter about constructing and parsing these on the fly, but I won't
+INPUTS = {
+	#input responses don't seem to have any rhyme or reason to them
+	"TV" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x00, 0x00, 0xCC],
+			 "response" : [0x04, 0x00, 0x00, 0xf1, 0x00, 0x00, 0x00, 0x0f]
+		},
+	"AV1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x01, 0x00, 0xCB],
+			  "response" : [0x04, 0x00, 0x00, 0xf1, 0x1c, 0x00, 0x00, 0xf3]
+		},
+	"AV2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x01, 0x01, 0xCA],
+			  "response" : [0x04, 0x00, 0x00, 0xf1, 0x1d, 0x00, 0x00, 0xf2]
+		},
+	"AV3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x01, 0x02, 0xC9],
+			  "response" : [0x04, 0x00, 0x00, 0xf1, 0x1e, 0x00, 0x00, 0xf1]
+		},
+	"SVID1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x02, 0x00, 0xCA],
+				"response" : [] #no idea.  please email if you find it
+		},
+	"SVID2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x02, 0x01, 0xC9],
+				"response" : [] #no idea.  please email if you find it
+		},
+	"SVID3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x02, 0x02, 0xC8],
+				"response" : [] #no idea.  please email if you find it
+		},
+	"COMP1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x03, 0x00, 0xC9],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x29, 0x00, 0x00, 0xe6]
+		},
+	"COMP2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x03, 0x01, 0xC8],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x2a, 0x00, 0x00, 0xe5]
+		},
+	"COMP3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x03, 0x02, 0xC7],
+			 	"response" : [0x04, 0x00, 0x00, 0xf1, 0x2b, 0x00, 0x00, 0xe4]
+		},
+	"PC1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x04, 0x00, 0xC8],
+			  "response" :  [] #no idea.  please email if you find it
+		},
+	"PC2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x04, 0x01, 0xC7],
+			  "response" :  [] #no idea.  please email if you find it
+		},
+	"PC3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x04, 0x02, 0xC6],
+			  "response" :  [] #no idea.  please email if you find it
+		},
+	"HDMI1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x00, 0xC7],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x39, 0x00, 0x00, 0xd6],
+				"response2" : [0x04, 0x00, 0x00, 0xf1, 0x47, 0x00, 0x00, 0xc8]
+		},
+	"HDMI2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x01, 0xC6],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x3a, 0x00, 0x00, 0xd5],
+				"response2" : [0x04, 0x00, 0x00, 0xf1, 0x48, 0x00, 0x00, 0xc7]
+		},
+	"HDMI3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x02, 0xC5],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x3b, 0x00, 0x00, 0xd4],
+				"response2" : [0x04, 0x00, 0x00, 0xf1, 0x49, 0x00, 0x00, 0xc6]
+		},
+	"HDMI4" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x03, 0xC4],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x3c, 0x00, 0x00, 0xd3],
+				"response2" : [0x04, 0x00, 0x00, 0xf1, 0x4a, 0x00, 0x00, 0xc5]
+		},
+	"HDMI5" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x04, 0xC3],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x3d, 0x00, 0x00, 0xd2],
+				"response2" : [0x04, 0x00, 0x00, 0xf1, 0x4b, 0x00, 0x00, 0xc4]
+		},
+	"HDMI6" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x05, 0xC2],
+				"response" : [0x04, 0x00, 0x00, 0xf1, 0x3e, 0x00, 0x00, 0xd1],
+				"response2" : [0x04, 0x00, 0x00, 0xf1, 0x4c, 0x00, 0x00, 0xc3]
+		},
+	"DVI1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x06, 0x00, 0xC6],
+			   "response" :  [] #no idea.  please email if you find it
+		},
+	"DVI2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x06, 0x01, 0xC5],
+			   "response" :  [] #no idea.  please email if you find it
+		},
+	"DVI3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x06, 0x02, 0xC4],
+			   "response" :  [] #no idea.  please email if you find it
+		},
+	"SMARTHUB" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x8C, 0x3D],
+			#note this response is sent for any app but not for the smarthub menu screen
+			 "response" : [0x04, 0x00, 0x00, 0xf1, 0x59, 0x00, 0x00, 0xb6]
+		},
+	"NETFLIX" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0xF3, 0xD6]
+				  #netflix sends the generic smarthub response
+		},
+	"AMAZON" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0xF4, 0xD5]
+				 #amazon sends the generic smarthub response
+		}
+	#I'm not sure why Netflix and Amazon are so special, but my TV doesn't have
+	#direct access to any other smarthub apps.  Perhaps newer TVs do.
+	}
+
+PICTURE_MODES = {
+	"DYNAMIC" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x00, 0xCB],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x00, 0x00, 0x00, 0x0c]
+		},
+	"STANDARD" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x01, 0xCA],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x01, 0x00, 0x00, 0x0b]
+		},
+	"MOVIE" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x02, 0xC9],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x02, 0x00, 0x00, 0x0a]
+		},
+	"NATURAL" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x03, 0xC8],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x03, 0x00, 0x00, 0x09]
+		},
+	"CAL_NIGHT" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x04, 0xC7],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x04, 0x00, 0x00, 0x08]
+		},
+	"CAL_DAY" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x05, 0xC6],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x05, 0x00, 0x00, 0x07]
+		},
+	"BD_WISE" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x06, 0xC5],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x06, 0x00, 0x00, 0x06]
+		},
+	#I have no reference for the display names of modes 7-9, 11-12.
+	#If you discover any, please let me know
+	"MODE7" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x07, 0xC4],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x07, 0x00, 0x00, 0x05]
+		},
+	"MODE8" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x08, 0xC3],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x08, 0x00, 0x00, 0x04]
+		},
+	"MODE9" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x09, 0xC2],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x09, 0x00, 0x00, 0x03]
+		},
+	"RELAX" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x0a, 0xC1],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x0a, 0x00, 0x00, 0x02]
+		},
+	"MODE11" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x0b, 0xC0],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x0b, 0x00, 0x00, 0x01]
+		},
+	"MODE12" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x0c, 0xBF],
+				"response" : [0x07, 0x00, 0x00, 0xf1, 0x0c, 0x00, 0x00, 0x00]
+		}
+	}
+
+PICTURE_SIZES = {
+	"SIXTEEN_NINE" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x00, 0xC0],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x00, 0x00, 0x00, 0x0E] },
+	"ZOOM1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x01, 0xBF],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x01, 0x00, 0x00, 0x0D] },
+	"ZOOM2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x02, 0xBE],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x02, 0x00, 0x00, 0x0C] },
+	"WIDE_FIT" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x03, 0xBD],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x03, 0x00, 0x00, 0x0B] },
+	"FOUR_THREE" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x04, 0xBC],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x04, 0x00, 0x00, 0x0A] },
+	"SCREEN_FIT" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x05, 0xBB],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x05, 0x00, 0x00, 0x09] },
+	"SMART_VIEW1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x06, 0xBA],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x06, 0x00, 0x00, 0x08] },
+	"SMART_VIEW2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x07, 0xB9],
+				"response" : [0x05, 0x00, 0x00, 0xF1, 0x07, 0x00, 0x00, 0x07] },
+	#any extra sizes to worry about down here?
+}
+
+SOUND_MODES = {
+	"STANDARD" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x00, 0xCA],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x00, 0x00, 0x00, 0x0B] },
+	"MUSIC" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x01, 0xC9],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x01, 0x00, 0x00, 0x0A] },
+	"MOVIE" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x02, 0xC8],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x02, 0x00, 0x00, 0x09] },
+	"CLEAR_VOICE" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x03, 0xC7],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x03, 0x00, 0x00, 0x08] },
+	"AMPLIFY" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x04, 0xC6],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x04, 0x00, 0x00, 0x07] },
+	#I have no reference for the display names of modes greater than 4.
+	#If you discover any, please let me know
+	"MODE5" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x05, 0xC5],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x05, 0x00, 0x00, 0x06] },
+	"MODE6" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x06, 0xC4],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x06, 0x00, 0x00, 0x05] },
+	"MODE7" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x07, 0xC3],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x07, 0x00, 0x00, 0x04] },
+	"MODE8" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x08, 0xC2],
+				"response" : [0x08, 0x00, 0x00, 0xF1, 0x08, 0x00, 0x00, 0x03] },
+}
+
+THREED_MODES = {
+	"OFF" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x00, 0x00, 0x00, 0x0D] },
+	#My Plasma reports mode "ON" mode when playing 3D BD - might also be "FRAME_SEQUENCE"
+	"ON" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x01, 0x00, 0x00, 0x0C] },
+	"TOP_BOTTOM" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x02, 0x00, 0x00, 0x0B] },
+	#SIDE_BY_SIDE is Half SBS
+	"SIDE_BY_SIDE" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x03, 0x00, 0x00, 0x0A] },
+
+	#I have no reference for the display names of modes 4-7, though they must
+	#include checkerboard, line-by-line, and "vertical line" and maybe "frame sequence"
+	#If you discover any, please let me know
+	"MODE4" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x04, 0x00, 0x00, 0x09] },
+	"MODE5" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x05, 0x00, 0x00, 0x08] },
+	"MODE6" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x06, 0x00, 0x00, 0x07] },
+	"MODE7" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x07, 0x00, 0x00, 0x06] },
+
+	"TWO_TO_THREE" : { "command" : [], #command is defined in enumCommands
+				"response" : [0x06, 0x00, 0x00, 0xF1, 0x08, 0x00, 0x00, 0x05] },
+
+}
+
+#these commands are one-way only (can't read current setting from TV)
+INTEGER_COMMANDS = {
+	"Backlight" : { "command" : [ 0x08, 0x22, 0x0b, 0x01, 0x00],
+						"min" : 0,
+						"max" : 20},
+	"Sharpness" : { "command" : [0x08, 0x22, 0x0b, 0x04, 0x00],
+						"min" : 0,
+						"max" : 100},
+	"Contrast" : { "command" : [0x08, 0x22, 0x0b, 0x02, 0x00],
+						"min" : 0,
+						"max" : 100},
+	"Brightness" : { "command" : [0x08, 0x22, 0x0b, 0x03, 0x00],
+						"min" : 0,
+						"max" : 100},
+	"Color" : { "command" : [0x08, 0x22, 0x0b, 0x05, 0x00],
+						"min" : 0,
+						"max" : 100},
+	"Tint" : { "command" : [0x08, 0x22, 0x0b, 0x06, 0x00],
+						"min" : 0,
+						"max" : 100},
+	"Volume": { "command" : [0x08, 0x22, 0x01, 0x00, 0x00],
+						"min" : 0,
+						"max" : 100},
+	"Channel" : { "command" : [0x08, 0x22, 0x04, 0x00, 0x00],
+						"min" : 1,
+						"max" : 999},
+	"ShadowDetail" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x02],
+						"min" : -2,
+						"max" : 2},
+	"Gamma" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x03],
+						"min" : -2,
+						"max" : 2},
+	"WhiteBalanceROffset" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x07],
+						"min" : 0,
+						"max" : 50},
+	"WhiteBalanceGOffset" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x08],
+						"min" : 0,
+						"max" : 50},
+	"WhiteBalanceBOffset" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x09],
+						"min" : 0,
+						"max" : 50},
+	"WhiteBalanceRGain" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0a],
+						"min" : 0,
+						"max" : 50},
+	"WhiteBalanceGGain" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0b],
+						"min" : 0,
+						"max" : 50},
+	"WhiteBalanceBGain" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0c],
+						"min" : 0,
+						"max" : 50},
+	"FleshTone" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0e],
+						"min" : 0,
+						"max" : 50},
+	"3DViewPoint" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x02],
+						"min" : -5,
+						"max" : 5},
+	"3DDepth" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x03],
+						"min" : 1,
+						"max" : 10},
+	"SoundBalance" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x00],
+						"min" : 0,
+						"max" : 20},
+	"SoundEQ100Hz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x01],
+						"min" : 0,
+						"max" : 20},
+	"SoundEQ300Hz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x02],
+						"min" : 0,
+						"max" : 20},
+	"SoundEQ1kHz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x03],
+						"min" : 0,
+						"max" : 20},
+	"SoundEQ3kHz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x04],
+						"min" : 0,
+						"max" : 20},
+	"SoundEQ10kHz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x05],
+						"min" : 0,
+						"max" : 20}
+}
+
+#This list captures actions that carry more than one integer value
+COMMAND_GROUPS = {
+	"WhiteBalance" : ["WhiteBalanceRGain", "WhiteBalanceROffset", "WhiteBalanceBGain", "WhiteBalanceBOffset",
+						"WhiteBalanceGGain", "WhiteBalanceGOffset"],
+	"SoundEQ" : ["SoundEQ100Hz", "SoundEQ300Hz", "SoundEQ1kHz", "SoundEQ3kHz", "SoundEQ10kHz"]
+}
+
+#these commands are one-way only (can't read current setting from TV)
+ENUM_COMMANDS = {
+	"PowerOff" : { "command" : [0x08, 0x22, 0x00, 0x00, 0x00, 0x01, 0xD5],
+					"name" : "Off"},
+	"PowerOn" : { "command" : [0x08, 0x22, 0x00, 0x00, 0x00, 0x02, 0xD4],
+					"name" : "On"},
+
+	"BlackToneOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x00, 0xC4],
+					"name" : "Off"},
+	"BlackToneDark" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x01, 0xC3],
+					"name" : "Dark"},
+	"BlackToneDarker" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x02, 0xC2],
+					"name" : "Darker"},
+	"BlackToneDarkest" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x03, 0xC1],
+					"name" : "Darkest"},
+
+	"DynamicCtstOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x00, 0xC3],
+					"name" : "Off"},
+	"DynamicCtstLow" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x01, 0xC2],
+					"name" : "Low"},
+	"DynamicCtstMedium" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x02, 0xC1],
+					"name" : "Medium"},
+	"DynamicCtstHigh" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x03, 0xC0],
+					"name" : "High"},
+
+	"RGBOnlyModeOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x00, 0xBF],
+					"name" : "Off"},
+	"RGBOnlyModeRed" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x01, 0xBE],
+					"name" : "Red"},
+	"RGBOnlyModeGreen" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x02, 0xBD],
+					"name" : "Green"},
+	"RGBOnlyModeBlue" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x03, 0xBC],
+					"name" : "Blue"},
+
+	"ClrSpaceAuto" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x06, 0x00, 0xBE],
+					"name" : "Auto"},
+	"ClrSpaceNative" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x06, 0x01, 0xBD],
+					"name" : "Native"},
+	"ClrSpaceCustom" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x06, 0x02, 0xBC],
+					"name" : "Custom"},
+
+	"EdgeEnhancementOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0f, 0x00, 0xB5],
+					"name" : "Off"},
+	"EdgeEnhancementOn" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0f, 0x01, 0xB4],
+					"name" : "On"},
+
+	"xvYCCOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x10, 0x00, 0xB4],
+					"name" : "Off"},
+	"xvYCCOn" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x10, 0x01, 0xB3],
+					"name" : "On"},
+
+	"MotionLightingOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x11, 0x00, 0xB3],
+					"name" : "Off"},
+	"MotionLightingOn" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x11, 0x01, 0xB2],
+					"name" : "On"},
+
+	"LEDMotionPlusOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x00, 0xBA],
+					"name" : "Off"},
+	"LEDMotionPlusNormal" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x01, 0xB9],
+					"name" : "Normal"},
+	"LEDMotionPlusCinema" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x02, 0xB8],
+					"name" : "Cinema"},
+	"LEDMotionPlusTicker" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x03, 0xB7],
+					"name" : "Ticker"},
+	
+	"ClrToneCool" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x00, 0xC1],
+					"name" : "Cool"},
+	"ClrToneNormal" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x01, 0xC0],
+					"name" : "Normal"},
+	"ClrToneWarm1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x02, 0xBF],
+					"name" : "Warm 1"},
+	"ClrToneWarm2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x03, 0xBE],
+					"name" : "Warm 2"},
+	
+	"DigitalNoiseFilterOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x00, 0xBF],
+					"name" : "Off"},
+	"DigitalNoiseFilterLow" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x01, 0xBE],
+					"name" : "Low"},
+	"DigitalNoiseFilterMedium" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x02, 0xBD],
+					"name" : "Medium"},
+	"DigitalNoiseFilterHigh" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x03, 0xBC],
+					"name" : "High"},
+	"DigitalNoiseFilterAuto" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x04, 0xBB],
+					"name" : "Auto"},
+	"DigitalNoiseFilterAutoViz" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x05, 0xBA],
+					"name" : "Auto Visualizer"},
+	
+	"MPEGNoiseFilterOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x00, 0xBE],
+					"name" : "Off"},
+	"MPEGNoiseFilterLow" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x01, 0xBD],
+					"name" : "Low"},
+	"MPEGNoiseFilterMedium" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x02, 0xBC],
+					"name" : "Medium"},
+	"MPEGNoiseFilterHigh" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x03, 0xBB],
+					"name" : "High"},
+	"MPEGNoiseFilterAuto" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x04, 0xBA],
+					"name" : "Auto"},
+	
+	"HDMIBlackLevelNormal" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x04, 0x00, 0xBD],
+					"name" : "Normal"},
+	"HDMIBlackLevelLow" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x04, 0x01, 0xBC],
+					"name" : "Low"},
+	
+	"FilmModeOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x05, 0x00, 0xBC],
+					"name" : "Off"},
+	"FilmModeAuto1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x05, 0x01, 0xBB],
+					"name" : "Auto 1"},
+	"FilmModeAuto2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x05, 0x02, 0xBA],
+					"name" : "Auto 2"},
+	
+	"AutoMotionPlusOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x00, 0xBB],
+					"name" : "Off"},
+	"AutoMotionPlusClear" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x01, 0xBA],
+					"name" : "Clear"},
+	"AutoMotionPlusStandard" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x02, 0xB9],
+					"name" : "Standard"},
+	"AutoMotionPlusSmooth" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x03, 0xB8],
+					"name" : "Smooth"},
+	"AutoMotionPlusCustom" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x04, 0xB7],
+					"name" : "Custom"},
+	"AutoMotionPlusDemo" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x05, 0xB6],
+					"name" : "Demo"},
+	
+	"3DModeOff" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x00, 0xBF],
+					"name" : "Off"},
+	"3DMode2Dto3D" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x01, 0xBE],
+					"name" : "2D to 3D"},
+	"3DModeSideBySide" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x02, 0xBD],
+					"name" : "Side by Side"},
+	"3DModeTopBottom" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x03, 0xBC],
+					"name" : "Top / Bottom"},
+	"3DModeLineByLine" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x04, 0xBB],
+					"name" : "Line by Line"},
+	"3DModeVerticalLine" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x05, 0xBA],
+					"name" : "Vertical Line"},
+	"3DModeCheckerBD" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x06, 0xB9],
+					"name" : "Checkerboard"},
+	"3DModeFrameSequence" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x07, 0xB8],
+					"name" : "Frame Sequence"},
+
+	"3D2DOff" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x01, 0x00, 0xBE],
+					"name" : "Off"},
+	"3D2DOn" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x01, 0x01, 0xBD],
+					"name" : "On"},
+
+	"3DAutoViewOff" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x05, 0x00, 0xBA],
+					"name" : "Off"},
+	"3DAutoViewMessageNotice" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x05, 0x01, 0xB9],
+					"name" : "Message Notice"},
+	"3DAutoViewOn" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x05, 0x02, 0xB8],
+					"name" : "On"},
+
+	"3DPictureCorrection" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x04, 0x00, 0xBB],
+					"name" : "", "OneShot" : True},
+
+	"SRSTruSurroundOff" : { "command" : [0x08, 0x22, 0x0c, 0x02, 0x00, 0x00, 0xC8],
+					"name" : "Off"},
+	"SRSTruSurroundOn" : { "command" : [0x08, 0x22, 0x0c, 0x02, 0x00, 0x01, 0xC7],
+					"name" : "On"},
+	
+	"SRSTruDialogOff" : { "command" : [0x08, 0x22, 0x0c, 0x03, 0x00, 0x00, 0xC7],
+					"name" : "Off"},
+	"SRSTruDialogOn" : { "command" : [0x08, 0x22, 0x0c, 0x03, 0x00, 0x01, 0xC6],
+					"name" : "On"},
+	
+	"LanguageEnglish" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x00, 0xC6],
+					"name" : "English"},
+	"LanguageSpanish" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x01, 0xC5],
+					"name" : "Spanish"},
+	"LanguageFrench" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x02, 0xC4],
+					"name" : "French"},
+	"LanguageKorean" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x03, 0xC3],
+					"name" : "Korean"},
+	"LanguageJapanese" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x04, 0xC2],
+					"name" : "Japanese"},
+	#maybe there are more languages?  dont' know...
+	
+	"MTSMono" : { "command" : [0x08, 0x22, 0x0c, 0x05, 0x00, 0x00, 0xC5],
+					"name" : "Mono"},
+	"MTSStereo" : { "command" : [0x08, 0x22, 0x0c, 0x05, 0x00, 0x01, 0xC4],
+					"name" : "Stereo"},
+	"MTSSAP" : { "command" : [0x08, 0x22, 0x0c, 0x05, 0x00, 0x02, 0xC3],
+					"name" : "SAP"},
+	
+	"AutoVolumeOff" : { "command" : [0x08, 0x22, 0x0c, 0x06, 0x00, 0x00, 0xC4],
+					"name" : "Off"},
+	"AutoVolumeNormal" : { "command" : [0x08, 0x22, 0x0c, 0x06, 0x00, 0x01, 0xC3],
+					"name" : "Normal"},
+	"AutoVolumeNight" : { "command" : [0x08, 0x22, 0x0c, 0x06, 0x00, 0x02, 0xC2],
+					"name" : "Night"},
+	
+	"SpeakerSelectTV" : { "command" : [0x08, 0x22, 0x0c, 0x07, 0x00, 0x00, 0xC3],
+					"name" : "Internal Speakers"},
+	"SpeakerSelectExternal" : { "command" : [0x08, 0x22, 0x0c, 0x07, 0x00, 0x01, 0xC2],
+					"name" : "External Speakers"},
+	
+	"TVModeCable" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x7B, 0x4E],
+					"name" : "Cable"},
+	"TVModeAntenna" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x7D, 0x4C],
+					"name" : "Antenna"},
+
+	"ResetWhiteBalance" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0d, 0x00, 0xB7],
+					"name" : "", "OneShot" : True},
+	"ResetPicture" : { "command" : [0x08, 0x22, 0x0b, 0x0b, 0x00, 0x00, 0xC0],
+					"name" : "", "OneShot" : True},
+	"ResetSound" : { "command" : [0x08, 0x22, 0x0c, 0x09, 0x00, 0x00, 0xC1],
+					"name" : "", "OneShot" : True},
+	"ResetEqualizer" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x06, 0x00, 0xC3],
+					"name" : "", "OneShot" : True}
+}
+
+#remote control keys, sent as-is
+BUTTONS = {
+	"MENU" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x1A, 0xAF],
+	"UP" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x60, 0x69],
+	"DOWN" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x61, 0x68],
+	"LEFT" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x65, 0x64],
+	"RIGHT" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x62, 0x67],
+	"ENTER" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x68, 0x61],
+	"EXIT" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x2D, 0x9C],
+	"MUTE" : [0x08, 0x22, 0x02, 0x00, 0x00, 0x00, 0xD4],
+	"VOLUP" : [0x08, 0x22, 0x01, 0x00, 0x01, 0x00, 0xD4],
+	"VOLDOWN" : [0x08, 0x22, 0x01, 0x00, 0x02, 0x00, 0xD3],
+	"CHUP" : [0x08, 0x22, 0x03, 0x00, 0x01, 0x00, 0xD2],
+	"CHDOWN" : [0x08, 0x22, 0x03, 0x00, 0x02, 0x00, 0xD1],
+	"PRECH" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x13, 0xB6],
+	"FAVCH" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x44, 0x85],
+	"CHADD" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x19, 0xB0],
+	"CAPTION" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x25, 0xA4],
+	"SLEEP" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x03, 0xC6],
+	"GUIDE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4F, 0x7A],
+	"INFO" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x1F, 0xAA],
+	"RETURN" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x58, 0x71],
+	"TOOLS" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4B, 0x7E],
+	"RED" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x6C, 0x5D],
+	"GREEN" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x14, 0xB5],
+	"YELLOW" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x15, 0xB4],
+	"BLUE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x16, 0xB3],
+	"PLAY" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x47, 0x82],
+	"PAUSE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4A, 0x7F],
+	"STOP" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x46, 0x83],
+	"REC" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x49, 0x80],
+	"REW" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x45, 0x84],
+	"FF" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x48, 0x81],
+	"SKIPF" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4E, 0x7B],
+	"SKIPB" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x50, 0x79],
+	"SOURCE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x01, 0xC8],
+	"PICMODE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x28, 0xA1],
+	"SNDMODE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x2B, 0x9E],
+	"CH_LIST" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x6B, 0x5E],
+	"MORE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x9C, 0x2D],
+	"KEY_0" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x11, 0xB8],
+	"KEY_1" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x04, 0xC5],
+	"KEY_2" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x05, 0xC4],
+	"KEY_3" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x06, 0xC3],
+	"KEY_4" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x08, 0xC1],
+	"KEY_5" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x09, 0xC0],
+	"KEY_6" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0A, 0xBF],
+	"KEY_7" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0C, 0xBD],
+	"KEY_8" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0D, 0xBC],
+	"KEY_9" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0E, 0xBB]
+}
+
+################################################################################
+# Precomputed frames
+
+########################################
+def frameTable(table):
+	return dict((name, bytes(bytearray(entry["command"])))
+		for name, entry in table.items() if entry.get("command"))
+
+ACK_FRAME = bytes(bytearray(RESPONSES["ACK"]))
+POWER_REPLY = bytes(bytearray(RESPONSES["POWER"]))
+STATUS_HEADER = bytes(bytearray(RESPONSES["STATUS"]))
+
+QUERY_FRAMES = dict((name, bytes(bytearray(packet))) for name, packet in QUERIES.items())
+BUTTON_FRAMES = dict((name, bytes(bytearray(packet))) for name, packet in BUTTONS.items())
+ENUM_FRAMES = frameTable(ENUM_COMMANDS)
+INPUT_FRAMES = frameTable(INPUTS)
+PICTURE_MODE_FRAMES = frameTable(PICTURE_MODES)
+PICTURE_SIZE_FRAMES = frameTable(PICTURE_SIZES)
+SOUND_MODE_FRAMES = frameTable(SOUND_MODES)
+
+#each integer command is a fixed 5-byte prefix, the value and a checksum.  The
+#prefix and its byte sum are worked out once; encoded frames are memoized since
+#there are only a few hundred possible values per command.
+INTEGER_TEMPLATES = dict((name, (bytes(bytearray(entry["command"])), sum(entry["command"])))
+	for name, entry in INTEGER_COMMANDS.items())
+INTEGER_FRAMES = {}
+
+########################################
+#builds {8-byte reply suffix : (stateName, value)} from the response tables
+def indexResponses(tables):
+	index = {}
+	for state, table in tables:
+		for value in table:
+			for key in ("response", "response2"):
+				response = table[value].get(key)
+				if response:
+					index[bytes(bytearray(response))] = (state, value)
+	return index
+
+#every known reply suffix (including the response2 aliases) mapped to the
+#(stateName, value) it means, so decoding a reply is a single dict lookup
+RESPONSE_INDEX = indexResponses([("input", INPUTS), ("pictureMode", PICTURE_MODES),
+	("pictureSize", PICTURE_SIZES), ("soundMode", SOUND_MODES), ("Mode3D", THREED_MODES)])
+
+################################################################################
+# Encoding and decoding
+
+########################################
+#the byte that makes a frame sum to zero (mod 256)
+def checksum(data):
+	return (0x100 - sum(bytearray(data))) & 0xFF
+
+########################################
+#all Ex-Link frames sum to zero (mod 256) including their checksum byte
+def checksumOK(frame):
+	return len(frame) >= 3 and (sum(bytearray(frame)) & 0xFF) == 0
+
+########################################
+#raises KeyError for an unknown command and ValueError for a value that
+#doesn't fit in the frame's single value byte
+def encodeInteger(command, value):
+	key = (command, value)
+	frame = INTEGER_FRAMES.get(key)
+	if frame is None:
+		prefix, total = INTEGER_TEMPLATES[command]
+		if not 0 <= value <= 0xFF:
+			raise ValueError("%s value %s is out of range" % (command, value))
+		frame = prefix + bytes(bytearray([value, (-(total + value)) & 0xFF]))
+		INTEGER_FRAMES[key] = frame
+	return frame
+
+########################################
+#the status query a frame is the reply to, or None if it isn't a status reply
+#(an ack, say)
+def replyQuery(frame):
+	if len(frame) != RESPONSE_LENGTH or bytes(bytearray(frame)[:3]) != STATUS_HEADER:
+		return None
+	return QUERY_TYPES.get(bytearray(frame)[5])
+
+#a decoded status reply.  It's still a (state, value) tuple at heart, with the
+#query it answers tacked on the end.
+StatusReply = namedtuple("StatusReply", ["state", "value", "query"])
+
+########################################
+#Decodes any 13-byte status reply into a StatusReply, or None if the reply is
+#damaged or isn't one we know.  Table-backed states are a single lookup on the
+#reply's last 8 bytes; the rest carry their value in byte 9.
+def decodeReply(reply):
+	if len(reply) != RESPONSE_LENGTH:
+		return None
+	frame = bytearray(reply)
+	query = QUERY_TYPES.get(frame[5])
+	decoded = RESPONSE_INDEX.get(bytes(frame[-8:]))
+	if decoded is not None:
+		return StatusReply(decoded[0], decoded[1], query)
+	state = VALUE_STATES.get(frame[5])
+	if state is None or not checksumOK(frame):
+		return None
+	if state == "mute":
+		return StatusReply(state, frame[9] == 1, query)
+	return StatusReply(state, int(frame[9]), query)
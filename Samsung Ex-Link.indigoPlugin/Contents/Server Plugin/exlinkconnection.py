@@ -0,0 +1,300 @@
+#! /usr/bin/env python
+
+# Background connection manager for Ex-Link serial ports.
+#
+# Opening a port can be slow: a netSocket or netRfc2217 port behind an
+# Ethernet-to-serial adapter that's down costs a full TCP connect timeout.
+# The manager does all the opening on its own thread, so commands only ever
+# see a port that's ready or fail straight away.  A port that won't open is
+# retried with exponential backoff plus some jitter, so a room full of TVs on
+# one dead adapter don't all hammer it in step.
+#
+# Ports are keyed by whatever the caller uses to tell lines apart (the plugin
+# uses the resolved port URL), and every device using a port is one of its
+# users; the port stays open until the last user releases it.
+#
+# Each port has a health state:
+#   connected  - open and handed out to whoever asks
+#   connecting - an open is due or in progress
+#   down       - the last open failed; waiting to retry
+#
+# A port's settings are never changed once it's open.  Reads that need a
+# timeout go through readBefore() with a deadline instead: it waits on the
+# port's descriptor where there is one, and otherwise reads in READ_SLICE
+# steps (the timeout every port is opened with) until the deadline passes.
+
+import os
+import random
+import select
+import socket
+import threading
+import time
+
+CONNECTED = "connected"
+CONNECTING = "connecting"
+DOWN = "down"
+
+READ_SIZE = 4096
+READ_SLICE = 0.05 #seconds; the read timeout ports are opened with
+
+################################################################################
+class PortEntry(object):
+	def __init__(self, name, portName):
+		self.name = name
+		self.portName = portName
+		self.conn = None
+		self.health = CONNECTING
+		self.retryAt = 0
+		self.delay = 0
+		self.failures = 0
+		self.users = set()
+
+################################################################################
+class ConnectionManager(threading.Thread):
+	#opener(name, portName) returns an open connection or None.  onChange(key,
+	#health) is called from the manager's thread whenever a port's health changes.
+	def __init__(self, opener, logger, onChange=None, baseDelay=1.0, maxDelay=60.0, jitter=0.25):
+		threading.Thread.__init__(self, name="ExLink connection manager")
+		self.daemon = True
+		self.opener = opener
+		self.logger = logger
+		self.onChange = onChange
+		self.baseDelay = baseDelay
+		self.maxDelay = maxDelay
+		self.jitter = jitter
+		self.random = random.Random()
+		self.ports = {}
+		self.wakeup = threading.Condition()
+		self.stopping = False
+
+	########################################
+	#asks for a port to be opened (or kept open) in the background on behalf of user
+	def connect(self, key, name, portName, user=None):
+		with self.wakeup:
+			entry = self.ports.get(key)
+			if entry is not None and entry.portName == portName:
+				entry.users.add(user)
+				return entry.health
+			if entry is not None and entry.conn is not None:
+				self.closeQuietly(entry.conn)
+			entry = self.ports[key] = PortEntry(name, portName)
+			entry.users.add(user)
+			self.wakeup.notify()
+		self.changed(key, CONNECTING)
+		return CONNECTING
+
+	########################################
+	#returns the open connection, or None if it isn't ready; never blocks on I/O
+	def connection(self, key):
+		entry = self.ports.get(key)
+		if entry is None:
+			return None
+		return entry.conn
+
+	########################################
+	def health(self, key):
+		entry = self.ports.get(key)
+		if entry is None:
+			return DOWN
+		return entry.health
+
+	########################################
+	#seconds until the next open attempt (0 if connected or already due)
+	def retryIn(self, key, now=None):
+		if now is None:
+			now = time.time()
+		entry = self.ports.get(key)
+		if entry is None or entry.health == CONNECTED:
+			return 0
+		return max(0, entry.retryAt - now)
+
+	########################################
+	#the connection broke in use; throw it away and start reopening it
+	def lost(self, key):
+		with self.wakeup:
+			entry = self.ports.get(key)
+			if entry is None or entry.conn is None:
+				return
+			self.closeQuietly(entry.conn)
+			entry.conn = None
+			entry.health = CONNECTING
+			entry.retryAt = 0
+			self.wakeup.notify()
+		self.logger.warn(entry.name+": lost connection to "+entry.portName+"; reconnecting")
+		self.changed(key, CONNECTING)
+
+	########################################
+	#user is done with the port; the last one out closes it and forgets about it
+	def release(self, key, user=None):
+		with self.wakeup:
+			entry = self.ports.get(key)
+			if entry is None:
+				return
+			entry.users.discard(user)
+			if len(entry.users) > 0:
+				return
+			del self.ports[key]
+		if entry.conn is not None:
+			self.closeQuietly(entry.conn)
+
+	########################################
+	def stop(self):
+		with self.wakeup:
+			self.stopping = True
+			entries = list(self.ports.values())
+			self.ports = {}
+			self.wakeup.notify()
+		for entry in entries:
+			if entry.conn is not None:
+				self.closeQuietly(entry.conn)
+
+	########################################
+	def run(self):
+		while True:
+			with self.wakeup:
+				if self.stopping:
+					return
+				key, entry, wait = self.nextDue()
+				if entry is None:
+					self.wakeup.wait(wait)
+					continue
+				retrying = entry.health == DOWN
+				entry.health = CONNECTING
+			if retrying:
+				self.changed(key, CONNECTING)
+
+			#the slow part happens outside the lock
+			try:
+				conn = self.opener(entry.name, entry.portName)
+			except Exception:
+				self.logger.exception(entry.name+": Plugin internal error opening "+entry.portName)
+				conn = None
+
+			with self.wakeup:
+				current = self.ports.get(key) is entry
+				if current and conn is not None:
+					entry.conn = conn
+					entry.health = CONNECTED
+					entry.failures = 0
+					entry.delay = 0
+				elif current:
+					entry.failures += 1
+					entry.delay = min(self.maxDelay, max(self.baseDelay, entry.delay * 2))
+					spread = entry.delay * self.jitter
+					entry.retryAt = time.time() + entry.delay + self.random.uniform(-spread, spread)
+					entry.health = DOWN
+			if not current:
+				#released or re-pointed while we were opening it
+				if conn is not None:
+					self.closeQuietly(conn)
+				continue
+
+			if conn is not None:
+				self.logger.info(entry.name+": opened serial port "+entry.portName)
+				self.changed(key, CONNECTED)
+			else:
+				if entry.failures == 1:
+					self.logger.error(u"unable to open serial port for device \""+entry.name+"\"; will keep trying")
+				else:
+					self.logger.debug(entry.name+": still unable to open "+entry.portName+
+						"; next try in %.1f seconds" % (entry.retryAt - time.time()))
+				self.changed(key, DOWN)
+
+	########################################
+	#picks the port whose open is most overdue.  Returns (key, entry, None), or
+	#(None, None, seconds to wait) if nothing is due yet.
+	def nextDue(self):
+		now = time.time()
+		dueKey = None
+		dueEntry = None
+		wait = None
+		for key, entry in self.ports.items():
+			if entry.conn is not None:
+				continue
+			if entry.retryAt <= now:
+				if dueEntry is None or entry.retryAt < dueEntry.retryAt:
+					dueKey, dueEntry = key, entry
+			elif wait is None or entry.retryAt - now < wait:
+				wait = entry.retryAt - now
+		return dueKey, dueEntry, wait
+
+	########################################
+	def changed(self, key, health):
+		if self.onChange is not None:
+			try:
+				self.onChange(key, health)
+			except Exception:
+				self.logger.exception("Plugin internal error reporting connection state")
+
+	########################################
+	def closeQuietly(self, conn):
+		try:
+			conn.close()
+		except Exception:
+			pass
+
+########################################
+#Tunes a network transport (socket:// or rfc2217://) for a chatty request and
+#reply protocol: no Nagle delay on our 7-byte commands, and TCP keepalive so
+#a gateway that vanished without closing the connection is noticed.  Local
+#ports are left alone.
+def tuneSocket(conn, idle=30, interval=10, count=3):
+	sock = getattr(conn, "_socket", None)
+	if sock is None:
+		return False
+	try:
+		sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+		#the keepalive timings have different names (or don't exist) per platform
+		for option, value in (("TCP_KEEPIDLE", idle), ("TCP_KEEPALIVE", idle),
+				("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)):
+			if hasattr(socket, option):
+				sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+	except (socket.error, OSError):
+		return False
+	return True
+
+########################################
+#Returns (fileno, read) for a connection whose descriptor can be waited on
+#with select() and read directly, or None.  pyserial's socket:// and POSIX
+#serial classes don't buffer anything themselves, so reading the descriptor
+#directly loses nothing.  rfc2217 runs its own reader thread over the socket,
+#so it has to be read through pyserial.
+def pollable(conn):
+	if conn is None or "rfc2217" in type(conn).__module__:
+		return None
+	sock = getattr(conn, "_socket", None)
+	if sock is not None:
+		return sock.fileno(), lambda: sock.recv(READ_SIZE)
+	fd = getattr(conn, "fd", None)
+	if isinstance(fd, int):
+		return fd, lambda: os.read(fd, READ_SIZE)
+	return None
+
+########################################
+#Returns whatever the port has to read, waiting for something to arrive until
+#`deadline` (a time.time() value) at the latest; empty if nothing did.  A
+#deadline that's already passed just takes what's waiting.  Raises IOError
+#if the other end has closed the connection.
+def readBefore(conn, deadline):
+	handle = pollable(conn)
+	if handle is not None:
+		fileno, read = handle
+		try:
+			readable = select.select([fileno], [], [], max(0, deadline - time.time()))[0]
+		except select.error as e:
+			raise IOError(str(e))
+		if not readable:
+			return b""
+		data = read()
+		if not data:
+			raise IOError("connection closed")
+		return data
+	#nothing to wait on; each read blocks for at most READ_SLICE
+	while True:
+		waiting = conn.in_waiting
+		if waiting == 0 and time.time() >= deadline:
+			return b""
+		data = conn.read(max(1, waiting))
+		if data:
+			return data
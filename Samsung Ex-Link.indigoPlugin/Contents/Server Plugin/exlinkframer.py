@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+
+# Incremental Ex-Link frame parser.
+#
+# The TV sends two kinds of frame: a 3-byte command ack (03 0C F1) and a
+# 13-byte status reply (03 0C F5 ...) whose last byte makes the whole frame
+# sum to zero.  Bytes are fed in as they arrive, in whatever sized chunks the
+# port hands back, and complete frames come out.  Anything that isn't a frame
+# (line noise, a half-frame left over from a timeout, a reply with a bad
+# checksum) is skipped by hunting for the next header, so one stray byte no
+# longer throws every later read out of alignment.
+
+from exlinkcodec import checksumOK
+
+ACK = bytearray([0x03, 0x0C, 0xF1])
+STATUS_HEADER = bytearray([0x03, 0x0C, 0xF5])
+STATUS_LENGTH = 13
+
+HEADER_START = bytes(bytearray([0x03, 0x0C]))
+
+################################################################################
+class ExLinkFramer(object):
+	def __init__(self):
+		self.buffer = bytearray()
+		self.discarded = 0 #junk bytes skipped since the last reset
+		self.badFrames = 0 #status frames thrown away for a bad checksum
+
+	########################################
+	def feed(self, data):
+		self.buffer += bytearray(data)
+
+	########################################
+	#throws away everything buffered; returns how many bytes that was
+	def reset(self):
+		dropped = len(self.buffer)
+		self.buffer = bytearray()
+		return dropped
+
+	########################################
+	def skip(self, count):
+		del self.buffer[:count]
+		self.discarded += count
+
+	########################################
+	#returns the next complete frame, or None if more bytes are needed
+	def nextFrame(self):
+		while True:
+			start = self.buffer.find(HEADER_START)
+			if start < 0:
+				#hang on to a trailing 03; it may be the start of the next header
+				keep = 1 if self.buffer[-1:] == ACK[:1] else 0
+				self.skip(len(self.buffer) - keep)
+				return None
+			if start > 0:
+				self.skip(start)
+			if len(self.buffer) < len(ACK):
+				return None
+
+			if self.buffer[:3] == ACK:
+				frame = self.buffer[:3]
+				del self.buffer[:3]
+				return frame
+
+			if self.buffer[:3] == STATUS_HEADER:
+				if len(self.buffer) < STATUS_LENGTH:
+					return None
+				frame = self.buffer[:STATUS_LENGTH]
+				if checksumOK(frame):
+					del self.buffer[:STATUS_LENGTH]
+					return frame
+				self.badFrames += 1
+
+			#not a frame we recognise; resync on the next header
+			self.skip(1)
+
+	########################################
+	def frames(self):
+		frame = self.nextFrame()
+		while frame is not None:
+			yield frame
+			frame = self.nextFrame()
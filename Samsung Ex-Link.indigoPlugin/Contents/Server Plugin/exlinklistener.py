@@ -0,0 +1,177 @@
+#! /usr/bin/env python
+
+# Listens to idle Ex-Link ports for output the TV sends on its own.
+#
+# Replies to requests are read by whoever made the request - a port worker or
+# the reactor - while it holds the port's guard lock.  Some sets also send a
+# status frame when something changes at the TV (an input picked with the
+# remote, the volume turned up), which until now sat in the port until the
+# next command threw it away.  The listener watches every idle port from one
+# thread: when select() says a port has something to read and its guard is
+# free, nothing is waiting for a reply, so the listener takes the guard, reads
+# the frames and hands each one to onFrame(portKey, frame) while it still
+# holds the port.  A port whose guard is busy is left to its owner for a
+# moment and looked at again.
+#
+# Like the reactor, only ports with a descriptor that can be select()ed are
+# listened to (see exlinkconnection.pollable); rfc2217 ports are left alone.
+
+import os
+import select
+import socket
+import threading
+import time
+
+from exlinkconnection import READ_SIZE, pollable, readBefore
+from exlinkframer import ExLinkFramer
+
+BUSY_DELAY = 0.05 #seconds before looking at a port that was busy again
+FRAME_WAIT = 0.1 #longest to wait for the rest of a frame that's started arriving
+MAX_HOLD = 0.5 #longest to keep a port from its owner, however much is arriving
+
+################################################################################
+class ListenedPort(object):
+	def __init__(self, portKey, conn, guard, fileno):
+		self.portKey = portKey
+		self.conn = conn
+		self.guard = guard
+		self.fileno = fileno
+		self.busyUntil = 0
+
+################################################################################
+class LineListener(threading.Thread):
+	#onFrame(portKey, frame) gets every complete frame read from an idle port;
+	#onError(portKey, error) is told when a port fails or closes under it
+	def __init__(self, logger, onFrame, onError=None):
+		threading.Thread.__init__(self, name="ExLink listener")
+		self.daemon = True
+		self.logger = logger
+		self.onFrame = onFrame
+		self.onError = onError
+		self.lock = threading.Lock()
+		self.ports = {} #portKey -> ListenedPort
+		self.stopping = False
+		self.wakeRead, self.wakeWrite = os.pipe()
+
+	########################################
+	#returns False if the connection can't be listened to
+	def watch(self, portKey, conn, guard):
+		handle = pollable(conn)
+		if handle is None:
+			self.forget(portKey)
+			return False
+		with self.lock:
+			self.ports[portKey] = ListenedPort(portKey, conn, guard, handle[0])
+		self.wake()
+		return True
+
+	########################################
+	def forget(self, portKey):
+		with self.lock:
+			if self.ports.pop(portKey, None) is None:
+				return
+		self.wake()
+
+	########################################
+	def watching(self, portKey):
+		return portKey in self.ports
+
+	########################################
+	def wake(self):
+		try:
+			os.write(self.wakeWrite, b"x")
+		except OSError:
+			pass
+
+	########################################
+	def stop(self):
+		with self.lock:
+			self.stopping = True
+			self.ports = {}
+		self.wake()
+
+	########################################
+	def run(self):
+		try:
+			while True:
+				with self.lock:
+					if self.stopping:
+						break
+					ports = list(self.ports.values())
+				self.listen(ports)
+		finally:
+			os.close(self.wakeRead)
+			os.close(self.wakeWrite)
+
+	########################################
+	#one wait for any idle port to have something, and a read of each that does
+	def listen(self, ports):
+		now = time.time()
+		idle = dict((port.fileno, port) for port in ports if port.busyUntil <= now)
+		busy = [port.busyUntil for port in ports if port.busyUntil > now]
+		timeout = max(0, min(busy) - now) if busy else None
+		try:
+			readable = select.select([self.wakeRead] + list(idle.keys()), [], [], timeout)[0]
+		except (select.error, socket.error, ValueError, OSError):
+			#a port was closed under us; find it and stop listening to it
+			for port in idle.values():
+				try:
+					select.select([port.fileno], [], [], 0)
+				except (select.error, socket.error, ValueError, OSError) as e:
+					self.failed(port, IOError(str(e)))
+			return
+
+		for fileno in readable:
+			if fileno == self.wakeRead:
+				os.read(self.wakeRead, READ_SIZE)
+				continue
+			port = idle[fileno]
+			if self.ports.get(port.portKey) is not port:
+				continue
+			if not port.guard.acquire(False):
+				#a request is under way; its replies are for it
+				port.busyUntil = time.time() + BUSY_DELAY
+				continue
+			try:
+				self.read(port)
+			finally:
+				port.guard.release()
+
+	########################################
+	#called holding the port's guard
+	def read(self, port):
+		framer = ExLinkFramer()
+		started = deadline = time.time()
+		try:
+			while time.time() - started < MAX_HOLD:
+				data = readBefore(port.conn, deadline)
+				if len(data) == 0:
+					break
+				framer.feed(data)
+				for frame in framer.frames():
+					self.deliver(port, frame)
+				#wait a little for the rest of a frame that's part way in
+				deadline = time.time() + FRAME_WAIT if len(framer.buffer) > 0 else 0
+		except (IOError, OSError, socket.error) as e:
+			self.failed(port, e)
+			return
+		if len(framer.buffer) > 0 or framer.discarded > 0:
+			self.logger.debug(port.portKey+": ignored %d stray bytes" % (len(framer.buffer) + framer.discarded))
+
+	########################################
+	def deliver(self, port, frame):
+		try:
+			self.onFrame(port.portKey, frame)
+		except Exception:
+			self.logger.exception("Plugin internal error handling unsolicited frame")
+
+	########################################
+	def failed(self, port, error):
+		with self.lock:
+			if self.ports.get(port.portKey) is port:
+				del self.ports[port.portKey]
+		if self.onError is not None:
+			try:
+				self.onError(port.portKey, error)
+			except Exception:
+				self.logger.exception("Plugin internal error reporting listener failure")
@@ -0,0 +1,112 @@
+#! /usr/bin/env python
+
+# Which status queries are worth asking, given what's already known about the TV.
+#
+# Some settings only mean anything in some states: the channel only on the
+# tuner, the 3D mode only on an input that can carry 3D, and the picture size
+# not while a Smart Hub app has the screen.  A TV that's off answers nothing
+# but the power query.  Each QueryRule names the queries it holds back, the
+# state it looks at and the query that reads that state, and the values under
+# which the queries are worth asking (`only`) or not (`unless`).  A state
+# that's never been read, or couldn't be decoded, doesn't hold anything back.
+#
+# plan() splits a sweep three ways:
+#   - queries to ask now
+#   - queries whose state is being read in this same sweep, and either holds
+#     them back or isn't known yet; once it's answered, release() says which
+#     of them the new value lets through
+#   - queries held back for the whole sweep
+# so a sweep only asks what can actually have changed, and a sweep that finds
+# the TV has moved to the tuner still reads its channel.
+
+from collections import namedtuple
+
+import exlinkcodec
+
+QueryRule = namedtuple("QueryRule", ["queries", "source", "state", "only", "unless"])
+
+#values that say nothing about what the TV is doing
+UNKNOWN_VALUES = (None, "", "UNKNOWN")
+
+#inputs a Smart Hub app shows up as; every app reports itself as SMARTHUB
+APPS = ("SMARTHUB", "NETFLIX", "AMAZON")
+#inputs that can carry a 3D picture: broadcast 3D on the tuner, and HDMI
+THREED_INPUTS = tuple(sorted(input for input in exlinkcodec.INPUTS if input == "TV" or input.startswith("HDMI")))
+
+RULES = (
+	QueryRule(tuple(sorted(query for query in exlinkcodec.QUERIES if query != "POWER")), "POWER", "onOffState", (True,), ()),
+	QueryRule(("CHANNEL",), "INPUT", "input", ("TV",), ()),
+	QueryRule(("3D_MODE",), "INPUT", "input", THREED_INPUTS, ()),
+	QueryRule(("PICTURE_SIZE", "CHANNEL"), "INPUT", "input", None, APPS),
+)
+
+########################################
+#the first rule that holds a query back, given known(state), or None
+def holding(query, known, rules=RULES):
+	for rule in rules:
+		if query not in rule.queries:
+			continue
+		value = known(rule.state)
+		if value in UNKNOWN_VALUES:
+			continue
+		if (rule.only is not None and value not in rule.only) or value in rule.unless:
+			return rule
+	return None
+
+########################################
+#True if a rule for the query looks at a state that isn't known yet but is
+#read by one of `queries`
+def unsettled(query, queries, known, rules=RULES):
+	return any(query in rule.queries and rule.source in queries and known(rule.state) in UNKNOWN_VALUES
+		for rule in rules)
+
+########################################
+#Returns (ask, waiting, skipped), each in the order given.  known(state) gives
+#the value of a device state.
+def plan(queries, known, rules=RULES):
+	ask = []
+	waiting = []
+	skipped = []
+	for query in queries:
+		rule = holding(query, known, rules)
+		if rule is None and not unsettled(query, queries, known, rules):
+			ask.append(query)
+		elif rule is None or rule.source in queries:
+			waiting.append(query)
+		else:
+			skipped.append(query)
+	return ask, waiting, skipped
+
+########################################
+#`answered`, one of the sweep's `queries`, has just been read; takes the
+#queries in `waiting` that no rule holds back any more, and that aren't still
+#waiting on another answer, out of it and returns them.  Those still held
+#back by a rule whose state is read by `answered` can't be let through in
+#this sweep, so they're dropped from `waiting` too.
+def release(answered, waiting, queries, known, rules=RULES):
+	released = []
+	for query in list(waiting):
+		rule = holding(query, known, rules)
+		if rule is None:
+			if not unsettled(query, [source for source in queries if source != answered], known, rules):
+				released.append(query)
+				waiting.remove(query)
+		elif rule.source == answered:
+			waiting.remove(query)
+	return released
+
+########################################
+#the queries governed by a rule reading the answer to `answered` that were
+#held back when known(state) was before(state), and aren't now
+def releasedBy(answered, known, before, rules=RULES):
+	governed = set()
+	for rule in rules:
+		if rule.source == answered:
+			governed.update(rule.queries)
+	return sorted(query for query in governed
+		if holding(query, before, rules) is not None and holding(query, known, rules) is None)
+
+########################################
+#"input is HDMI1" for the log
+def describe(rule, known):
+	return rule.state+" is "+str(known(rule.state))
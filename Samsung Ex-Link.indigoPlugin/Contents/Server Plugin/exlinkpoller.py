@@ -0,0 +1,209 @@
+#! /usr/bin/env python
+
+# Background status polling for the Ex-Link plugin.
+#
+# Each device has a PollSchedule that decides which status queries are due.
+# Every query has its own interval, which tightens when a poll sees the value
+# change and backs off while it stays the same.  A TV that's off is only asked
+# whether it's on.  Once a TV has been heard reporting a value by itself,
+# that query is only polled as a backstop, at its longest interval.  Devices
+# sharing a serial port also share a LinkBudget, so polling never takes more
+# than a fixed share of the line's time no matter how many TVs are on it.
+#
+# The schedule also keeps when each query was last answered, polled or not,
+# so a refresh can skip anything read recently enough.
+
+import threading
+import time
+
+#seconds between polls of each query while its value isn't changing
+BASE_INTERVALS = {
+	"POWER" : 30,
+	"INPUT" : 60,
+	"VOLUME" : 60,
+	"MUTE" : 60,
+	"CHANNEL" : 60,
+	"PICTURE_MODE" : 300,
+	"PICTURE_SIZE" : 300,
+	"3D_MODE" : 300,
+	"SOUND_MODE" : 300,
+}
+
+MIN_INTERVAL = 5 #fastest any query is polled, right after it's seen a change
+BACKOFF = 1.5 #each unchanged poll stretches the interval by this much...
+MAX_BACKOFF = 4 #...up to this many times its base interval
+OFF_POWER_INTERVAL = 15 #first power poll interval once the TV is seen to be off
+
+#a poll costs a 7-byte query, a 3-byte ack and a 13-byte reply on the wire,
+#plus however long the TV takes to turn it around
+QUERY_BYTES = 7 + 3 + 13
+BITS_PER_BYTE = 10 #8N1
+
+################################################################################
+class PollSchedule(object):
+	def __init__(self, now=None):
+		if now is None:
+			now = time.time()
+		self.lock = threading.Lock()
+		self.intervals = dict(BASE_INTERVALS)
+		#everything is due straight away so we start with a full picture
+		self.due = dict((query, now) for query in BASE_INTERVALS)
+		self.powerOn = None
+		self.reporting = set() #queries the TV has reported without being asked
+		self.readAt = {} #query -> when the TV last gave its value
+
+	########################################
+	#called after every read of a query, whether or not the poller asked for
+	#it.  answered=False reschedules a query that couldn't be read.
+	def record(self, query, changed, now=None, answered=True):
+		if query not in BASE_INTERVALS:
+			return
+		if now is None:
+			now = time.time()
+		base = BASE_INTERVALS[query]
+		with self.lock:
+			if answered:
+				self.readAt[query] = now
+			if query in self.reporting:
+				interval = base * MAX_BACKOFF
+			elif changed:
+				interval = max(MIN_INTERVAL, float(base) / MAX_BACKOFF)
+			else:
+				interval = min(self.intervals[query] * BACKOFF, base * MAX_BACKOFF)
+			self.intervals[query] = interval
+			self.due[query] = now + interval
+
+	########################################
+	#a query that wasn't worth asking (see exlinkplanner) is looked at again
+	#after its usual interval; it hasn't failed, so it isn't backed off
+	def skipped(self, query, now=None):
+		if query not in BASE_INTERVALS:
+			return
+		if now is None:
+			now = time.time()
+		with self.lock:
+			self.intervals[query] = BASE_INTERVALS[query]
+			self.due[query] = now + BASE_INTERVALS[query]
+
+	########################################
+	#the TV sent the value of a query by itself; as good as a poll, and it
+	#will presumably say when it changes again
+	def reported(self, query, now=None):
+		if query not in BASE_INTERVALS:
+			return
+		if now is None:
+			now = time.time()
+		with self.lock:
+			self.readAt[query] = now
+			self.reporting.add(query)
+			self.intervals[query] = BASE_INTERVALS[query] * MAX_BACKOFF
+			self.due[query] = now + self.intervals[query]
+
+	########################################
+	def recordPower(self, on, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			self.readAt["POWER"] = now
+			wasOn = self.powerOn
+			self.powerOn = on
+			if on:
+				interval = BASE_INTERVALS["POWER"]
+				if wasOn is not True:
+					#anything could have changed while it was off, or before
+					#we started
+					for query in self.due:
+						self.due[query] = now
+			elif wasOn is not False:
+				interval = OFF_POWER_INTERVAL
+			else:
+				interval = min(self.intervals["POWER"] * BACKOFF, BASE_INTERVALS["POWER"] * MAX_BACKOFF)
+			self.intervals["POWER"] = interval
+			self.due["POWER"] = now + interval
+
+	########################################
+	#something these queries depend on has changed; they're due now
+	def expedite(self, queries, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			for query in queries:
+				if query in self.due:
+					self.due[query] = min(self.due[query], now)
+
+	########################################
+	#due queries, most overdue first
+	def dueQueries(self, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			if self.powerOn is False:
+				candidates = ["POWER"]
+			else:
+				candidates = self.due.keys()
+			due = [query for query in candidates if self.due[query] <= now]
+			due.sort(key=lambda query: self.due[query])
+			return due
+
+	########################################
+	#seconds since the TV last gave a query's value, or None if it never has
+	def age(self, query, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			readAt = self.readAt.get(query)
+		return None if readAt is None else now - readAt
+
+	########################################
+	#the queries that haven't been answered in the last maxAge seconds
+	def stale(self, queries, maxAge, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			return [query for query in queries if self.readAt.get(query) is None or now - self.readAt[query] > maxAge]
+
+	########################################
+	def nextDue(self):
+		with self.lock:
+			if self.powerOn is False:
+				return self.due["POWER"]
+			return min(self.due.values())
+
+################################################################################
+# Token bucket measured in seconds of line time.  It refills at `share` seconds
+# per second, so polling on one port never uses more than that fraction of it.
+class LinkBudget(object):
+	def __init__(self, baud=9600, share=0.25, burst=2.0):
+		self.lock = threading.Lock()
+		self.wireTime = float(QUERY_BYTES * BITS_PER_BYTE) / baud
+		self.share = share
+		self.burst = burst
+		self.tokens = burst
+		self.turnaround = 0.1 #running estimate of TV think-time per query
+		self.updated = time.time()
+
+	########################################
+	def queryCost(self):
+		return self.wireTime + self.turnaround
+
+	########################################
+	#returns how many of `count` queries may go out now, and charges for them
+	def take(self, count, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.share)
+			self.updated = now
+			cost = self.queryCost()
+			allowed = min(count, int(self.tokens / cost))
+			self.tokens -= allowed * cost
+			return allowed
+
+	########################################
+	#feed back how long `count` queries actually took end to end
+	def measured(self, seconds, count):
+		if count <= 0:
+			return
+		perQuery = max(0.0, float(seconds) / count - self.wireTime)
+		with self.lock:
+			self.turnaround += (perQuery - self.turnaround) * 0.2
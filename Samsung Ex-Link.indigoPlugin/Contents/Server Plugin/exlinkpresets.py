@@ -0,0 +1,154 @@
+#! /usr/bin/env python
+
+# Named presets: many picture and sound settings applied as one transaction.
+#
+# Presets are written as JSON, one object per preset:
+#
+#   {
+#     "Movie" : {
+#       "input" : "HDMI1",
+#       "pictureMode" : "MOVIE",
+#       "pictureSize" : "SIXTEEN_NINE",
+#       "soundMode" : "MOVIE",
+#       "volume" : 20,
+#       "Backlight" : 8,
+#       "WhiteBalanceRGain" : 25,
+#       "commands" : ["ClrToneWarm1", "AutoMotionPlusOff"]
+#     }
+#   }
+#
+# The lower-case keys are the device states the TV can be asked about (input,
+# pictureMode, pictureSize, soundMode, volume, channel), and take the same
+# values those states show.  Any integer command from the codec can be given
+# a value, and "commands" lists enum commands to send, in order.
+#
+# A preset is turned into a plan against what's already known about the TV:
+# settings already at their target are skipped, and the rest come out in an
+# order that makes sense on a Samsung (input first, then the picture mode,
+# whose settings the later values adjust).  The TV keeps its settings per
+# input and per mode, and a reset puts them back to defaults, so once any of
+# those is in the plan nothing after it is skipped.
+
+import json
+from collections import namedtuple
+
+import exlinkcodec
+
+#one frame to send: the preset key it came from, the value it sets, the frame
+#itself, and the status query that reads the result back (or None)
+PresetStep = namedtuple("PresetStep", ["key", "value", "frame", "query"])
+
+#queryable settings, in the order they're applied: key -> (frames, query)
+TABLE_SETTINGS = (
+	("input", exlinkcodec.INPUT_FRAMES, "INPUT"),
+	("pictureMode", exlinkcodec.PICTURE_MODE_FRAMES, "PICTURE_MODE"),
+	("pictureSize", exlinkcodec.PICTURE_SIZE_FRAMES, "PICTURE_SIZE"),
+	("soundMode", exlinkcodec.SOUND_MODE_FRAMES, "SOUND_MODE"),
+)
+#queryable integer settings, applied last: key -> (integer command, query)
+VALUE_SETTINGS = (
+	("volume", "Volume", "VOLUME"),
+	("channel", "Channel", "CHANNEL"),
+)
+COMMANDS_KEY = "commands"
+
+#once one of these is sent, what's known about the rest can't be trusted
+UNSETTLING = ("input", "pictureMode", "soundMode",
+	"ResetPicture", "ResetSound", "ResetWhiteBalance", "ResetEqualizer")
+
+################################################################################
+class PresetError(ValueError):
+	pass
+
+################################################################################
+class Preset(object):
+	#raises PresetError if anything in settings can't be sent
+	def __init__(self, name, settings):
+		if not isinstance(settings, dict):
+			raise PresetError("preset \""+name+"\" must be a JSON object")
+		self.name = name
+		self.steps = [] #every step, in order; plan() picks from these
+		tables = dict((key, frames) for key, frames, query in TABLE_SETTINGS)
+		values = dict((key, command) for key, command, query in VALUE_SETTINGS)
+		for key in settings:
+			if key not in tables and key not in values and key != COMMANDS_KEY and key not in exlinkcodec.INTEGER_COMMANDS:
+				raise PresetError("preset \""+name+"\": unknown setting \""+key+"\"")
+
+		for key, frames, query in TABLE_SETTINGS:
+			if key in settings:
+				value = settings[key]
+				if value not in frames:
+					raise PresetError("preset \""+name+"\": "+key+" can't be set to \""+str(value)+"\"")
+				self.steps.append(PresetStep(key, value, frames[value], query))
+
+		commands = settings.get(COMMANDS_KEY, [])
+		if not isinstance(commands, list):
+			raise PresetError("preset \""+name+"\": \"commands\" must be a list")
+		for command in commands:
+			if command not in exlinkcodec.ENUM_FRAMES or command in ("PowerOn", "PowerOff"):
+				raise PresetError("preset \""+name+"\": unknown command \""+str(command)+"\"")
+			self.steps.append(PresetStep(command, None, exlinkcodec.ENUM_FRAMES[command], None))
+
+		integers = [key for key in settings if key in exlinkcodec.INTEGER_COMMANDS]
+		for key in sorted(integers):
+			self.steps.append(PresetStep(key, settings[key], self.encode(key, settings[key]), None))
+
+		for key, command, query in VALUE_SETTINGS:
+			if key in settings:
+				self.steps.append(PresetStep(key, settings[key], self.encode(command, settings[key]), query))
+
+	########################################
+	def encode(self, command, value):
+		limits = exlinkcodec.INTEGER_COMMANDS[command]
+		try:
+			if isinstance(value, bool) or int(value) != value:
+				raise ValueError()
+			if not limits["min"] <= value <= limits["max"]:
+				raise ValueError()
+			return exlinkcodec.encodeInteger(command, value)
+		except (TypeError, ValueError):
+			raise PresetError("preset \""+self.name+"\": "+command+" must be a whole number from %d to %d" %
+				(limits["min"], limits["max"]))
+
+	########################################
+	#Returns (steps to send, keys skipped).  known(key) gives the value the TV
+	#is known to have for a setting, or None if it isn't known.  Enum commands
+	#have no value to compare, so they're skipped only if known(command) is True.
+	def plan(self, known):
+		steps = []
+		skipped = []
+		trusted = True
+		for step in self.steps:
+			current = known(step.key) if trusted else None
+			if step.value is None:
+				unchanged = current is True
+			else:
+				unchanged = current is not None and current == step.value
+			if unchanged:
+				skipped.append(step.key)
+				continue
+			steps.append(step)
+			if step.key in UNSETTLING:
+				trusted = False
+		return steps, skipped
+
+########################################
+#Parses preset definitions: either JSON text, or the path of a file holding
+#it.  Returns {name : Preset}; raises PresetError if anything is wrong.
+def parsePresets(text):
+	text = (text or "").strip()
+	if not text:
+		return {}
+	if not text.startswith("{"):
+		try:
+			with open(text) as definitions:
+				text = definitions.read()
+		except (IOError, OSError) as e:
+			raise PresetError("can't read presets from "+text+": "+str(e))
+	try:
+		definitions = json.loads(text)
+	except ValueError as e:
+		raise PresetError("presets aren't valid JSON: "+str(e))
+	if not isinstance(definitions, dict):
+		raise PresetError("presets must be a JSON object of named presets")
+	return dict((name, Preset(name, settings)) for name, settings in definitions.items())
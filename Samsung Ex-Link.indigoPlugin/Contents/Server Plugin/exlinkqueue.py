@@ -0,0 +1,313 @@
+#! /usr/bin/env python
+
+# Command queues for the Ex-Link plugin.
+#
+# Every serial line gets one worker thread which is the only thing that
+# touches that line's connection, however many devices share it (apart from
+# the reactor, which takes turns with it through the port's guard lock).  Indigo
+# callbacks put work on the queue and return straight away; anything that
+# needs to know how the command went can wait on the CommandFuture handed
+# back by submit().
+#
+# Commands can also be coalesced while they wait their turn:
+#   submitLatest - a later command with the same key replaces the arguments of
+#                  one that hasn't started yet (absolute setters: only the last
+#                  value matters).  An optional delay holds the command back
+#                  briefly so a burst of values collapses into one.
+#   submitRepeat - a command with the same key as the one at the back of its
+#                  device's queue just bumps its repeat count (relative keys
+#                  like VOLUP sent several times back-to-back).  The count is
+#                  passed to the command as its last argument.
+#
+# Every command has a priority class, and the worker always runs the most
+# urgent ready command first: remote keys and power, then setters, then status
+# read-backs, then background polls.  Within a class the devices take turns and
+# each device's commands run in the order they were queued.  A command can also
+# have a deadline; one that hasn't started by then is dropped rather than run
+# late, and its future finishes with .expired set.  Long low-priority work can
+# ask urgent() between steps whether it should make way.
+#
+# While a command runs, the worker's `current` is that command, whose queuedAt
+# says when it was last asked for.  Work can use it to tell whether an answer
+# it's about to ask the TV for has already come in since then.
+
+import threading
+import time
+from collections import deque
+
+#priority classes, most urgent first
+INTERACTIVE = 0 #remote keys and power
+SETTER = 1 #anything that changes a setting
+READBACK = 2 #reading back the result of a change
+POLL = 3 #background status polling
+
+################################################################################
+class CommandFuture(object):
+	def __init__(self):
+		self.finished = threading.Event()
+		self.value = None
+		self.error = None
+		self.expired = False #dropped because its deadline passed before it started
+		self.lock = threading.Lock()
+		self.callbacks = []
+
+	########################################
+	def setResult(self, value):
+		self.value = value
+		self.finish()
+
+	########################################
+	def setError(self, error):
+		self.error = error
+		self.finish()
+
+	########################################
+	#callbacks run before waiters are woken, so they've had their say by then
+	def finish(self):
+		with self.lock:
+			callbacks = self.callbacks
+			self.callbacks = None
+		for callback in callbacks:
+			callback(self)
+		self.finished.set()
+
+	########################################
+	#callback(future) runs once the command has finished: on whichever thread
+	#finishes it, or straight away if it already has
+	def addCallback(self, callback):
+		with self.lock:
+			if self.callbacks is not None:
+				self.callbacks.append(callback)
+				return
+		callback(self)
+
+	########################################
+	def done(self):
+		return self.finished.is_set()
+
+	########################################
+	#returns True if the command finished within the timeout
+	def wait(self, timeout=None):
+		return self.finished.wait(timeout)
+
+	########################################
+	#returns None on timeout; re-raises whatever the command raised
+	def result(self, timeout=None):
+		if not self.finished.wait(timeout):
+			return None
+		if self.error is not None:
+			raise self.error
+		return self.value
+
+################################################################################
+class QueuedCommand(object):
+	def __init__(self, func, args, kwargs, key=None, readyAt=0, repeat=False, priority=SETTER, deadline=None):
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs
+		self.key = key
+		self.readyAt = readyAt
+		self.repeat = repeat
+		self.priority = priority
+		self.deadline = deadline
+		self.queuedAt = time.time() #moved on when a later caller shares the command
+		self.count = 1
+		self.started = False
+		self.future = CommandFuture()
+
+################################################################################
+# One worker per serial line.  Every device on the line gets its own queue in
+# each priority class and the worker takes turns between them, so a device with
+# a long backlog can't starve the others.
+class PortWorker(threading.Thread):
+	def __init__(self, name, logger, guard=None):
+		threading.Thread.__init__(self, name="ExLink worker: "+name)
+		self.daemon = True
+		self.portName = name
+		self.logger = logger
+		self.guard = guard #held while a command runs, if anything else shares the port
+		self.stopping = False
+		self.busy = False
+		self.blocked = None #priority of a command waiting for the guard
+		self.current = None #the command running now
+		self.lastActive = time.time()
+		self.lock = threading.Condition()
+		self.queues = {} #priority -> {owner : deque of QueuedCommand}
+		self.turns = {} #priority -> owners with queued commands, next turn first
+		self.waiting = {} #(owner, key) -> QueuedCommand not yet started
+
+	########################################
+	def submit(self, owner, func, *args, **kwargs):
+		return self.enqueue(owner, QueuedCommand(func, args, kwargs))
+
+	########################################
+	#deadline is the time by which the command must have started, or None
+	def schedule(self, owner, priority, deadline, func, *args, **kwargs):
+		return self.enqueue(owner, QueuedCommand(func, args, kwargs, priority=priority, deadline=deadline))
+
+	########################################
+	def submitLatest(self, owner, key, delay, priority, func, *args, **kwargs):
+		with self.lock:
+			pending = self.waiting.get((owner, key))
+			if pending is not None and not pending.started:
+				pending.func = func
+				pending.args = args
+				pending.kwargs = kwargs
+				pending.queuedAt = time.time()
+				return pending.future
+		return self.enqueue(owner, QueuedCommand(func, args, kwargs, key, time.time() + delay, priority=priority))
+
+	########################################
+	#repeated keys are remote-control presses, so they're always interactive
+	def submitRepeat(self, owner, key, func, *args, **kwargs):
+		with self.lock:
+			pending = self.waiting.get((owner, key))
+			commands = self.queues.get(INTERACTIVE, {}).get(owner)
+			if (pending is not None and commands and pending is commands[-1] and
+					pending.repeat and not pending.started):
+				pending.count += 1
+				pending.queuedAt = time.time()
+				return pending.future
+		return self.enqueue(owner, QueuedCommand(func, args, kwargs, key, repeat=True, priority=INTERACTIVE))
+
+	########################################
+	def enqueue(self, owner, command):
+		with self.lock:
+			if self.stopping:
+				command.future.setResult(None)
+				return command.future
+			if command.key is not None:
+				self.waiting[(owner, command.key)] = command
+			owners = self.queues.setdefault(command.priority, {})
+			commands = owners.get(owner)
+			if commands is None:
+				commands = owners[owner] = deque()
+				self.turns.setdefault(command.priority, deque()).append(owner)
+			commands.append(command)
+			self.lock.notify()
+		return command.future
+
+	########################################
+	#anything already queued still runs before the worker exits
+	def stop(self):
+		with self.lock:
+			self.stopping = True
+			self.lock.notify()
+
+	########################################
+	#stops the worker if it has had nothing to do for `seconds`; returns True if it did
+	def retireIfIdle(self, seconds, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			if self.busy or self.queues or now - self.lastActive < seconds:
+				return False
+			self.stopping = True
+			self.lock.notify()
+			return True
+
+	########################################
+	def pending(self, owner=None):
+		with self.lock:
+			if owner is not None:
+				return sum(len(owners.get(owner, ())) for owners in self.queues.values())
+			return sum(len(commands) for owners in self.queues.values() for commands in owners.values())
+
+	########################################
+	#True if a command more urgent than `priority` is ready to run or waiting
+	#for the port.  Low-priority work asks this between steps and makes way.
+	def urgent(self, priority, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			blocked = self.blocked
+			if blocked is not None and blocked < priority:
+				return True
+			for level, owners in self.queues.items():
+				if level < priority and any(commands[0].readyAt <= now for commands in owners.values()):
+					return True
+			return False
+
+	########################################
+	def remove(self, priority, owner):
+		del self.queues[priority][owner]
+		self.turns[priority].remove(owner)
+		if not self.queues[priority]:
+			del self.queues[priority]
+			del self.turns[priority]
+
+	########################################
+	#finishes every queued command whose deadline has passed
+	def dropExpired(self, now):
+		for priority, owners in list(self.queues.items()):
+			for owner, commands in list(owners.items()):
+				for command in [command for command in commands if command.deadline is not None and command.deadline < now]:
+					commands.remove(command)
+					if command.key is not None and self.waiting.get((owner, command.key)) is command:
+						del self.waiting[(owner, command.key)]
+					self.logger.debug(self.portName+": dropped a command that didn't start by its deadline")
+					command.future.expired = True
+					command.future.setResult(None)
+				if not commands:
+					self.remove(priority, owner)
+
+	########################################
+	#Takes the next command whose coalescing delay is up: the most urgent class
+	#first, going round the owners in turn within it.  Returns (owner, command,
+	#None), or (None, None, seconds to wait).
+	def nextCommand(self, now):
+		self.dropExpired(now)
+		wait = None
+		for priority in sorted(self.queues):
+			turns = self.turns[priority]
+			for turn in range(len(turns)):
+				owner = turns[0]
+				turns.rotate(-1)
+				commands = self.queues[priority][owner]
+				command = commands[0]
+				if command.readyAt <= now:
+					commands.popleft()
+					if len(commands) == 0:
+						self.remove(priority, owner)
+					return owner, command, None
+				if wait is None or command.readyAt - now < wait:
+					wait = command.readyAt - now
+		return None, None, wait
+
+	########################################
+	def run(self):
+		while True:
+			with self.lock:
+				owner, command, wait = self.nextCommand(time.time())
+				if command is None:
+					if self.stopping and not self.queues:
+						break
+					#a coalescing delay; later submissions can still update the command
+					self.lock.wait(wait)
+					continue
+
+				command.started = True
+				self.busy = True
+				self.current = command
+				if command.key is not None and self.waiting.get((owner, command.key)) is command:
+					del self.waiting[(owner, command.key)]
+				args = command.args
+				if command.repeat:
+					args = args + (command.count,)
+				self.blocked = command.priority
+
+			if self.guard is not None:
+				self.guard.acquire()
+			self.blocked = None
+			try:
+				command.future.setResult(command.func(*args, **command.kwargs))
+			except Exception as e:
+				self.logger.exception(self.portName+": Plugin internal error running queued command")
+				command.future.setError(e)
+			finally:
+				if self.guard is not None:
+					self.guard.release()
+				with self.lock:
+					self.busy = False
+					self.current = None
+					self.lastActive = time.time()
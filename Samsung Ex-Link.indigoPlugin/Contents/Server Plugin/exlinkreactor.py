@@ -0,0 +1,322 @@
+#! /usr/bin/env python
+
+# Single-threaded Ex-Link I/O engine.
+#
+# The thread-per-port workers are simple but cost a thread (and its stack) for
+# every line, mostly spent blocked in a serial read.  The reactor instead runs
+# the ack/reply exchange for every port from one thread: each job is a small
+# generator-based session that writes a frame, yields how long it's prepared
+# to wait, and is handed the next frame (or None on a timeout) when select()
+# says its port is readable.  Indigo-side code submits jobs from any thread
+# and gets a CommandFuture back.
+#
+# A job is a list of steps:
+#   ("query", queryName, ackTimeout, replyTimeout) - send a status query, wait for its ack and reply
+#   ("send", packet, ackTimeout, None)             - send a command frame and wait for its ack
+# The result is a list with one entry per step: the reply frame for a query,
+# True for an acked command, or None if the step (or an earlier one) failed.
+# The job also keeps what it saw along the way for the timing statistics:
+# (name, phase, seconds) for each ack and reply, (name, phase) for each wait
+# that timed out, how many frames were dropped for a bad checksum, and any
+# frames that arrived but weren't what a step was waiting for.
+#
+# A job can have a deadline, and is dropped (with .expired set) if its port
+# doesn't come free before then.  It can also have a yieldTo callable, asked
+# before every step: if it returns True the job stops there,
+# with .preempted set, so something more urgent waiting for the port can go.
+#
+# Ports are shared with the worker threads, so every port has a guard lock.
+# The reactor only ever tries the lock; a port that's busy on a worker is
+# retried shortly afterwards.  Only ports whose file descriptor can be
+# select()ed directly - local ttys and socket:// connections - can be driven
+# this way.  exlinkconnection.pollable() says whether a connection qualifies.
+
+import os
+import select
+import threading
+import time
+from collections import deque
+
+from exlinkcodec import ACK_FRAME, QUERY_FRAMES, RESPONSE_LENGTH, replyQuery
+from exlinkconnection import READ_SIZE, pollable
+from exlinkframer import ExLinkFramer
+from exlinkqueue import CommandFuture
+
+RETRY_DELAY = 0.05 #seconds before trying a port that was busy on a worker again
+
+################################################################################
+#what a job that never ran finishes with once the reactor is stopping
+class ReactorStopped(Exception):
+	pass
+
+################################################################################
+class ReactorJob(object):
+	def __init__(self, portKey, conn, guard, steps, callback, deadline=None, yieldTo=None):
+		self.portKey = portKey
+		self.conn = conn
+		self.guard = guard
+		self.steps = steps
+		self.callback = callback
+		self.deadline = deadline
+		self.yieldTo = yieldTo
+		self.expired = False
+		self.preempted = False
+		self.future = CommandFuture()
+		self.results = []
+		self.timings = [] #(name, "ack" or "reply", seconds)
+		self.timeouts = [] #(name, "ack" or "reply") for each wait that ran out
+		self.badFrames = 0
+		self.strays = [] #frames skipped over, oldest first
+		self.startedAt = None
+		self.finishedAt = None
+
+################################################################################
+class ReactorSession(object):
+	def __init__(self, job, fileno, read):
+		self.job = job
+		self.fileno = fileno
+		self.read = read
+		self.framer = ExLinkFramer()
+		self.protocol = self.exchange()
+		self.deadline = None
+
+	########################################
+	#The ack/reply exchange for one job, as a generator.  Each yield is how
+	#many seconds it will wait; what comes back is the next frame, or None if
+	#that long passed without one.
+	def exchange(self):
+		job = self.job
+		results = job.results
+		for kind, payload, ackTimeout, replyTimeout in job.steps:
+			if job.yieldTo is not None and job.yieldTo():
+				job.preempted = True
+				break
+			packet = QUERY_FRAMES[payload] if kind == "query" else payload
+			name = payload if kind == "query" else "command"
+			job.conn.write(packet)
+			written = time.time()
+			frame = yield ackTimeout
+			#a status reply here is a leftover from an earlier query; skip it
+			while frame is not None and len(frame) == RESPONSE_LENGTH:
+				job.strays.append(frame)
+				frame = yield ackTimeout
+			if frame != ACK_FRAME:
+				job.timeouts.append((name, "ack"))
+				break
+			acked = time.time()
+			job.timings.append((name, "ack", acked - written))
+			if kind == "send":
+				results.append(True)
+				continue
+			reply = yield replyTimeout
+			#skip a late or repeated ack, and any status frame that isn't this reply
+			while reply is not None and replyQuery(reply) != payload:
+				if reply != ACK_FRAME:
+					job.strays.append(reply)
+				reply = yield replyTimeout
+			if reply is None:
+				job.timeouts.append((name, "reply"))
+				break
+			job.timings.append((name, "reply", time.time() - acked))
+			results.append(reply)
+		results.extend([None] * (len(self.job.steps) - len(results)))
+
+	########################################
+	#moves the session on; returns False once it has finished
+	def advance(self, frame=None, first=False):
+		try:
+			if first:
+				timeout = next(self.protocol)
+			else:
+				timeout = self.protocol.send(frame)
+		except StopIteration:
+			return False
+		self.deadline = time.time() + timeout
+		return True
+
+################################################################################
+class ExLinkReactor(threading.Thread):
+	def __init__(self, logger):
+		threading.Thread.__init__(self, name="ExLink reactor")
+		self.daemon = True
+		self.logger = logger
+		self.lock = threading.Lock()
+		self.incoming = deque()
+		self.queued = {} #portKey -> deque of jobs waiting for the port
+		self.sessions = {} #fileno -> ReactorSession
+		self.busyPorts = set() #ports with a running session
+		self.retryAt = None
+		self.stopping = False
+		self.wakeRead, self.wakeWrite = os.pipe()
+
+	########################################
+	#thread-safe; callback(job, error) runs on the reactor thread when the job
+	#ends, or on the caller's if the reactor is already stopping
+	def submit(self, portKey, conn, guard, steps, callback=None, deadline=None, yieldTo=None):
+		job = ReactorJob(portKey, conn, guard, steps, callback, deadline, yieldTo)
+		with self.lock:
+			stopping = self.stopping
+			if not stopping:
+				self.incoming.append(job)
+		if stopping:
+			self.complete(job, ReactorStopped("reactor stopped"))
+			return job.future
+		self.wake()
+		return job.future
+
+	########################################
+	def wake(self):
+		try:
+			os.write(self.wakeWrite, b"x")
+		except OSError:
+			pass
+
+	########################################
+	def stop(self):
+		with self.lock:
+			self.stopping = True
+		self.wake()
+
+	########################################
+	def sessionCount(self):
+		return len(self.sessions)
+
+	########################################
+	def run(self):
+		try:
+			while True:
+				with self.lock:
+					if self.stopping:
+						break
+					while self.incoming:
+						job = self.incoming.popleft()
+						self.queued.setdefault(job.portKey, deque()).append(job)
+				self.startJobs()
+				self.wait()
+		finally:
+			for session in list(self.sessions.values()):
+				self.finish(session, None)
+			#every job still waiting gets its callback, so nobody is left
+			#thinking it's about to run
+			waiting = []
+			for jobs in self.queued.values():
+				waiting.extend(jobs)
+			self.queued = {}
+			with self.lock:
+				waiting.extend(self.incoming)
+				self.incoming.clear()
+			for job in waiting:
+				self.complete(job, ReactorStopped("reactor stopped"))
+			os.close(self.wakeRead)
+			os.close(self.wakeWrite)
+
+	########################################
+	#starts the next job on every idle port whose guard can be had right now
+	def startJobs(self):
+		self.retryAt = None
+		now = time.time()
+		for portKey in list(self.queued.keys()):
+			if portKey in self.busyPorts:
+				continue
+			jobs = self.queued[portKey]
+			while jobs and jobs[0].deadline is not None and jobs[0].deadline < now:
+				job = jobs.popleft()
+				job.expired = True
+				job.results.extend([None] * len(job.steps))
+				self.complete(job, None)
+			if not jobs:
+				del self.queued[portKey]
+				continue
+			job = jobs[0]
+			if not job.guard.acquire(False):
+				#the port is busy on a worker thread
+				self.retryAt = time.time() + RETRY_DELAY
+				continue
+			jobs.popleft()
+			if not jobs:
+				del self.queued[portKey]
+			handle = pollable(job.conn)
+			if handle is None:
+				job.guard.release()
+				self.complete(job, ValueError("port "+portKey+" can't be driven by the reactor"))
+				continue
+			job.startedAt = time.time()
+			session = ReactorSession(job, handle[0], handle[1])
+			self.busyPorts.add(portKey)
+			self.sessions[session.fileno] = session
+			self.step(session, None, first=True)
+
+	########################################
+	def wait(self):
+		deadlines = [session.deadline for session in self.sessions.values()]
+		if self.retryAt is not None:
+			deadlines.append(self.retryAt)
+		timeout = None
+		if deadlines:
+			timeout = max(0, min(deadlines) - time.time())
+		readable = select.select([self.wakeRead] + list(self.sessions.keys()), [], [], timeout)[0]
+
+		for fileno in readable:
+			if fileno == self.wakeRead:
+				os.read(self.wakeRead, READ_SIZE)
+				continue
+			session = self.sessions.get(fileno)
+			if session is None:
+				continue
+			try:
+				data = session.read()
+			except (IOError, OSError) as e:
+				self.finish(session, e)
+				continue
+			if not data:
+				self.finish(session, IOError("connection closed"))
+				continue
+			session.framer.feed(data)
+			for frame in session.framer.frames():
+				if not self.step(session, frame):
+					break
+			session.job.badFrames += session.framer.badFrames
+			session.framer.badFrames = 0
+
+		now = time.time()
+		for session in list(self.sessions.values()):
+			if session.deadline is not None and now >= session.deadline:
+				self.step(session, None)
+
+	########################################
+	#hands a frame (or a timeout) to a session; returns False once it has ended
+	def step(self, session, frame, first=False):
+		try:
+			if session.advance(frame, first):
+				return True
+		except Exception as e:
+			self.finish(session, e)
+			return False
+		self.finish(session, None)
+		return False
+
+	########################################
+	def finish(self, session, error):
+		if self.sessions.get(session.fileno) is not session:
+			return
+		del self.sessions[session.fileno]
+		self.busyPorts.discard(session.job.portKey)
+		#the callback still has the port to itself, so whatever it does with
+		#the results can't interleave with a worker's command
+		try:
+			self.complete(session.job, error)
+		finally:
+			session.job.guard.release()
+
+	########################################
+	def complete(self, job, error):
+		job.finishedAt = time.time()
+		if job.callback is not None:
+			try:
+				job.callback(job, error)
+			except Exception:
+				self.logger.exception("Plugin internal error finishing reactor job")
+		if error is not None:
+			job.future.setError(error)
+		else:
+			job.future.setResult(job.results)
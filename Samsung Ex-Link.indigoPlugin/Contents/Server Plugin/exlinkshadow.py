@@ -0,0 +1,175 @@
+#! /usr/bin/env python
+
+# Shadow register of what's been written to each TV.
+#
+# Most picture and sound settings are one-way: the TV acks them but can't be
+# asked what they're set to.  The register remembers the last value each TV
+# acknowledged for every such setting, so a write that wouldn't change
+# anything can be skipped.  A setting is:
+#   - an integer command (Backlight, WhiteBalanceRGain, ...), whose value is
+#     the number sent
+#   - a family of enum commands that differ only in their value byte
+#     (ClrToneCool, ClrToneWarm1, ...), named for what the commands' names
+#     have in common ("ClrTone") and whose value is the command sent
+# Volume, Channel and the 3D mode can be queried, so they aren't shadowed.
+#
+# What's remembered stops being trusted after `ttl` seconds, when the TV
+# resets some of its settings (the Reset* commands), and whenever the plugin
+# invalidates it: on power changes, and on input or mode changes, since the TV
+# keeps separate picture and sound settings for each.
+#
+# state() and the state argument round-trip through JSON so the register can
+# be kept across plugin restarts.  Devices are keyed by id.
+
+import os
+import threading
+import time
+
+import exlinkcodec
+
+DEFAULT_TTL = 12 * 60 * 60 #seconds
+
+#queryable settings, and commands that do something rather than set something
+QUERYABLE = ("Volume", "Channel", "3DMode")
+NOT_SETTINGS = ("PowerOn", "PowerOff")
+
+#the third frame byte says which menu a command belongs to
+PICTURE = 0x0b
+SOUND = 0x0c
+
+################################################################################
+# Setting tables
+
+########################################
+#{enum command : setting name} for the enum commands that set something
+def enumSettings(commands):
+	families = {}
+	for command, entry in commands.items():
+		if command in NOT_SETTINGS or entry.get("OneShot", False):
+			continue
+		families.setdefault(bytes(bytearray(entry["command"][:5])), []).append(command)
+	settings = {}
+	for family in families.values():
+		name = os.path.commonprefix(family)
+		#don't stop part way through a word ("EdgeEnhancementO" for Off/On)
+		while name and any(len(command) > len(name) and command[len(name)].islower() for command in family):
+			name = name[:-1]
+		if name in QUERYABLE:
+			continue
+		for command in family:
+			settings[command] = name
+	return settings
+
+ENUM_SETTINGS = enumSettings(exlinkcodec.ENUM_COMMANDS)
+INTEGER_SETTINGS = dict((command, entry) for command, entry in exlinkcodec.INTEGER_COMMANDS.items()
+	if command not in QUERYABLE)
+
+########################################
+#every setting whose commands are in the given menu
+def menuSettings(menu):
+	settings = set(command for command, entry in INTEGER_SETTINGS.items() if entry["command"][2] == menu)
+	settings.update(setting for command, setting in ENUM_SETTINGS.items()
+		if exlinkcodec.ENUM_COMMANDS[command]["command"][2] == menu)
+	return settings
+
+PICTURE_SETTINGS = menuSettings(PICTURE)
+SOUND_SETTINGS = menuSettings(SOUND)
+
+#the settings each reset command puts back to the TV's defaults
+RESETS = {
+	"ResetPicture" : PICTURE_SETTINGS,
+	"ResetSound" : SOUND_SETTINGS,
+	"ResetWhiteBalance" : set(exlinkcodec.COMMAND_GROUPS["WhiteBalance"]),
+	"ResetEqualizer" : set(exlinkcodec.COMMAND_GROUPS["SoundEQ"]),
+}
+
+########################################
+#(setting, value) a command writes, or None if it isn't shadowed
+def settingFor(command, value=None):
+	if command in INTEGER_SETTINGS:
+		return (command, value)
+	if command in ENUM_SETTINGS:
+		return (ENUM_SETTINGS[command], command)
+	return None
+
+################################################################################
+class ShadowRegister(object):
+	def __init__(self, ttl=DEFAULT_TTL, state=None):
+		self.ttl = ttl
+		self.lock = threading.Lock()
+		#device id -> {setting : (value, time written)}
+		self.devices = {}
+		for devId, settings in (state or {}).items():
+			self.devices[str(devId)] = dict((setting, (value, written)) for setting, (value, written) in settings.items())
+
+	########################################
+	def fresh(self, written, now):
+		return self.ttl <= 0 or now - written < self.ttl
+
+	########################################
+	#the value last written to a setting, if it's still trusted, else None
+	def known(self, devId, setting, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			entry = self.devices.get(str(devId), {}).get(setting)
+			if entry is None or not self.fresh(entry[1], now):
+				return None
+			return entry[0]
+
+	########################################
+	#True if sending this command would write what's already there
+	def current(self, devId, command, value=None):
+		setting = settingFor(command, value)
+		return setting is not None and self.known(devId, setting[0]) == setting[1]
+
+	########################################
+	#the TV acknowledged a command.  Resets forget what they reset.
+	def written(self, devId, command, value=None):
+		if command in RESETS:
+			self.invalidate(devId, RESETS[command])
+			return
+		setting = settingFor(command, value)
+		if setting is None:
+			return
+		with self.lock:
+			self.devices.setdefault(str(devId), {})[setting[0]] = (setting[1], time.time())
+
+	########################################
+	#a command wasn't acknowledged, so what the TV has now is anyone's guess
+	def forget(self, devId, command, value=None):
+		setting = settingFor(command, value)
+		if setting is not None:
+			self.invalidate(devId, [setting[0]])
+
+	########################################
+	#settings=None forgets everything about the device
+	def invalidate(self, devId, settings=None):
+		with self.lock:
+			if settings is None:
+				self.devices.pop(str(devId), None)
+				return
+			remembered = self.devices.get(str(devId), {})
+			for setting in settings:
+				remembered.pop(setting, None)
+
+	########################################
+	def clear(self):
+		with self.lock:
+			self.devices = {}
+
+	########################################
+	#{setting : value} of everything still trusted for a device
+	def values(self, devId, now=None):
+		if now is None:
+			now = time.time()
+		with self.lock:
+			return dict((setting, value) for setting, (value, written) in self.devices.get(str(devId), {}).items()
+				if self.fresh(written, now))
+
+	########################################
+	def state(self):
+		now = time.time()
+		with self.lock:
+			return dict((devId, dict((setting, [value, written]) for setting, (value, written) in settings.items()
+				if self.fresh(written, now))) for devId, settings in self.devices.items() if settings)
@@ -0,0 +1,222 @@
+#! /usr/bin/env python
+
+# Latency and error instrumentation for the Ex-Link plugin.
+#
+# Every exchange with a TV is timed in two phases: write->ack (how long the
+# TV takes to accept a frame) and ack->reply (how long a status query takes
+# to answer once accepted).  Each phase is kept as a histogram per device and
+# per query or command name, so a report shows which TVs and which queries
+# are eating the time.  Alongside the histograms each device keeps counters:
+#   timeouts         - acks or replies that never came, per name
+#   badCrc           - status frames thrown away for a bad checksum
+#   unknownResponses - well-formed replies the codec doesn't recognise
+#   drainedBytes     - unexpected bytes found waiting before a command
+#   sharedQueries    - queries not sent because an answer read since they
+#                      were asked for could be shared
+#   plannedQueries   - sweep queries not sent because what the TV is doing
+#                      means their answer can't have changed
+#
+# Devices are anything with .id and .name, so this module doesn't need indigo.
+
+import threading
+import time
+
+ACK = "ack"
+REPLY = "reply"
+
+#upper bounds of the histogram buckets, in seconds; anything slower goes in
+#one last overflow bucket
+BUCKET_BOUNDS = (0.005, 0.01, 0.02, 0.03, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3,
+	0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+COUNTERS = ("badCrc", "unknownResponses", "drainedBytes", "sharedQueries", "plannedQueries")
+
+################################################################################
+class LatencyHistogram(object):
+	def __init__(self):
+		self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	########################################
+	def add(self, seconds):
+		index = 0
+		while index < len(BUCKET_BOUNDS) and seconds > BUCKET_BOUNDS[index]:
+			index += 1
+		self.buckets[index] += 1
+		self.count += 1
+		self.total += seconds
+		self.max = max(self.max, seconds)
+
+	########################################
+	#upper bound of the bucket holding the given fraction of samples (the
+	#slowest sample for the overflow bucket), or None with no samples
+	def percentile(self, fraction):
+		if self.count == 0:
+			return None
+		wanted = max(1, int(fraction * self.count + 0.5))
+		seen = 0
+		for index, count in enumerate(self.buckets):
+			seen += count
+			if seen >= wanted:
+				if index < len(BUCKET_BOUNDS):
+					return min(BUCKET_BOUNDS[index], self.max)
+				return self.max
+		return self.max
+
+	########################################
+	def mean(self):
+		if self.count == 0:
+			return None
+		return self.total / self.count
+
+	########################################
+	def snapshot(self):
+		return {
+			"count" : self.count,
+			"mean" : self.mean(),
+			"p50" : self.percentile(0.50),
+			"p95" : self.percentile(0.95),
+			"max" : self.max,
+			"buckets" : dict(zip([str(bound) for bound in BUCKET_BOUNDS] + ["inf"], self.buckets)),
+		}
+
+################################################################################
+class DeviceStats(object):
+	def __init__(self, name):
+		self.name = name
+		self.histograms = {} #(phase, name) -> LatencyHistogram
+		self.timeouts = {} #name -> count
+		self.counters = dict((counter, 0) for counter in COUNTERS)
+
+	########################################
+	#every sample of one phase, whatever it was for
+	def combined(self, phase):
+		combined = LatencyHistogram()
+		for (histPhase, name), histogram in self.histograms.items():
+			if histPhase != phase:
+				continue
+			combined.buckets = [a + b for a, b in zip(combined.buckets, histogram.buckets)]
+			combined.count += histogram.count
+			combined.total += histogram.total
+			combined.max = max(combined.max, histogram.max)
+		return combined
+
+################################################################################
+class ExLinkStats(object):
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.devices = {} #dev.id -> DeviceStats
+		self.since = time.time()
+
+	########################################
+	def device(self, dev):
+		stats = self.devices.get(dev.id)
+		if stats is None:
+			stats = self.devices.setdefault(dev.id, DeviceStats(dev.name))
+		stats.name = dev.name
+		return stats
+
+	########################################
+	def latency(self, dev, phase, name, seconds):
+		with self.lock:
+			histograms = self.device(dev).histograms
+			histogram = histograms.get((phase, name))
+			if histogram is None:
+				histogram = histograms[(phase, name)] = LatencyHistogram()
+			histogram.add(max(0.0, seconds))
+
+	########################################
+	def timeout(self, dev, name):
+		with self.lock:
+			timeouts = self.device(dev).timeouts
+			timeouts[name] = timeouts.get(name, 0) + 1
+
+	########################################
+	def count(self, dev, counter, amount=1):
+		if amount <= 0:
+			return
+		with self.lock:
+			counters = self.device(dev).counters
+			counters[counter] = counters.get(counter, 0) + amount
+
+	########################################
+	def reset(self):
+		with self.lock:
+			self.devices = {}
+			self.since = time.time()
+
+	########################################
+	#a few headline figures for one device, for publishing as device states
+	def summary(self, dev):
+		with self.lock:
+			stats = self.devices.get(dev.id)
+			if stats is None:
+				return {"ackLatency" : 0, "replyLatency" : 0, "timeouts" : 0}
+			ack = stats.combined(ACK).percentile(0.95) or 0.0
+			reply = stats.combined(REPLY).percentile(0.95) or 0.0
+			return {
+				"ackLatency" : int(round(ack * 1000)),
+				"replyLatency" : int(round(reply * 1000)),
+				"timeouts" : sum(stats.timeouts.values()),
+			}
+
+	########################################
+	#everything, as plain data ready for json.dumps; keyed by device name
+	def snapshot(self):
+		with self.lock:
+			devices = {}
+			for devId, stats in self.devices.items():
+				names = {}
+				for (phase, name), histogram in stats.histograms.items():
+					names.setdefault(name, {})[phase] = histogram.snapshot()
+				for name, count in stats.timeouts.items():
+					names.setdefault(name, {})["timeouts"] = count
+				devices[stats.name] = {
+					"id" : devId,
+					"counters" : dict(stats.counters),
+					"timeouts" : sum(stats.timeouts.values()),
+					"ack" : stats.combined(ACK).snapshot(),
+					"reply" : stats.combined(REPLY).snapshot(),
+					"names" : names,
+				}
+			return {"since" : self.since, "taken" : time.time(), "devices" : devices}
+
+	########################################
+	#human-readable report, one line per device and per query/command name,
+	#slowest names first
+	def report(self):
+		snapshot = self.snapshot()
+		lines = ["Ex-Link timing since "+time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot["since"]))]
+		if not snapshot["devices"]:
+			lines.append("  no traffic recorded")
+		for devName in sorted(snapshot["devices"]):
+			device = snapshot["devices"][devName]
+			counters = device["counters"]
+			lines.append("%s: ack %s, reply %s, %d timeouts, %d bad CRC, %d unknown, %d bytes drained, %d queries shared, %d planned out" %
+				(devName, describe(device["ack"]), describe(device["reply"]), device["timeouts"],
+				counters.get("badCrc", 0), counters.get("unknownResponses", 0), counters.get("drainedBytes", 0),
+				counters.get("sharedQueries", 0), counters.get("plannedQueries", 0)))
+			names = device["names"]
+			def cost(name):
+				return sum(names[name][phase]["count"] * (names[name][phase]["mean"] or 0)
+					for phase in (ACK, REPLY) if phase in names[name])
+			for name in sorted(names, key=cost, reverse=True):
+				entry = names[name]
+				parts = []
+				if ACK in entry:
+					parts.append("ack "+describe(entry[ACK]))
+				if REPLY in entry:
+					parts.append("reply "+describe(entry[REPLY]))
+				if entry.get("timeouts"):
+					parts.append("%d timeouts" % entry["timeouts"])
+				lines.append("    %-16s %s" % (name, ", ".join(parts)))
+		return lines
+
+########################################
+def describe(histogram):
+	if histogram["count"] == 0:
+		return "-"
+	return "n=%d p50 %.0f ms p95 %.0f ms max %.0f ms" % (histogram["count"],
+		histogram["p50"] * 1000, histogram["p95"] * 1000, histogram["max"] * 1000)
@@ -0,0 +1,143 @@
+#! /usr/bin/env python
+
+# Self-tuning serial timeouts.
+#
+# A fixed timeout has to be long enough for the slowest TV, so every lost ack
+# on a quick one costs seconds.  Instead each device learns its own timeouts
+# from the latencies it actually shows, one per class of wait:
+#   ack   - a written frame being acked
+#   query - a status reply arriving after its ack
+#   slow  - the same, for queries this TV has been seen to be slow with
+# Each class keeps a window of recent samples and waits for a high percentile
+# of them times a safety margin, kept between a floor and a ceiling.  Until a
+# class has a few samples it waits for the ceiling.  When a wait runs out the
+# class doubles its timeout (up to the ceiling) until it next hears something,
+# so a TV that slows down is given room rather than written off, and a query
+# whose reply runs out under the query timeout is moved to the slow class.
+#
+# state() and the state argument of DeviceTimeouts round-trip through JSON, so
+# what's been learned can be kept across plugin restarts.
+
+import threading
+
+ACK = "ack"
+QUERY = "query"
+SLOW = "slow"
+CLASSES = (ACK, QUERY, SLOW)
+
+DEFAULT_FLOOR = 0.25 #seconds
+DEFAULT_CEILING = 5.0
+
+WINDOW = 50 #samples kept per class
+MIN_SAMPLES = 5 #needed before the learned timeout is trusted
+PERCENTILE = 0.95
+MARGIN = 1.5 #multiplier on the percentile...
+PAD = 0.05 #...plus this many seconds for scheduling and wire jitter
+
+################################################################################
+class AdaptiveTimeout(object):
+	def __init__(self, floor=DEFAULT_FLOOR, ceiling=DEFAULT_CEILING, samples=None):
+		self.floor = floor
+		self.ceiling = ceiling
+		self.samples = list(samples or [])[-WINDOW:]
+		self.widened = None #timeout in force after a wait ran out
+
+	########################################
+	def learned(self):
+		return len(self.samples) >= MIN_SAMPLES
+
+	########################################
+	def timeout(self):
+		if self.widened is not None:
+			return self.widened
+		if not self.learned():
+			return self.ceiling
+		ordered = sorted(self.samples)
+		index = min(len(ordered) - 1, int(PERCENTILE * len(ordered)))
+		return min(self.ceiling, max(self.floor, ordered[index] * MARGIN + PAD))
+
+	########################################
+	def observe(self, seconds):
+		self.samples.append(max(0.0, seconds))
+		del self.samples[:-WINDOW]
+		self.widened = None
+
+	########################################
+	#a wait ran out; give the next one more room
+	def expired(self):
+		self.widened = min(self.ceiling, self.timeout() * 2)
+
+################################################################################
+class DeviceTimeouts(object):
+	def __init__(self, floor=DEFAULT_FLOOR, ceiling=DEFAULT_CEILING, state=None):
+		state = state or {}
+		self.lock = threading.Lock()
+		self.classes = dict((name, AdaptiveTimeout(floor, ceiling, state.get(name)))
+			for name in CLASSES)
+		self.slowQueries = set(state.get("slowQueries", []))
+
+	########################################
+	def setLimits(self, floor, ceiling):
+		with self.lock:
+			for estimator in self.classes.values():
+				estimator.floor = floor
+				estimator.ceiling = ceiling
+				estimator.widened = None
+
+	########################################
+	def replyClass(self, query):
+		return SLOW if query in self.slowQueries else QUERY
+
+	########################################
+	def timeout(self, timeoutClass):
+		with self.lock:
+			return self.classes[timeoutClass].timeout()
+
+	########################################
+	def ackTimeout(self):
+		return self.timeout(ACK)
+
+	########################################
+	def replyTimeout(self, query):
+		return self.timeout(self.replyClass(query))
+
+	########################################
+	#the ack timeout once it's been learned, otherwise `default`.  Used for
+	#power probes, which a TV that's off never answers.
+	def probeTimeout(self, default):
+		with self.lock:
+			ack = self.classes[ACK]
+			if ack.learned() and ack.widened is None:
+				return ack.timeout()
+			return default
+
+	########################################
+	def observeAck(self, seconds):
+		with self.lock:
+			self.classes[ACK].observe(seconds)
+
+	########################################
+	def observeReply(self, query, seconds):
+		with self.lock:
+			self.classes[self.replyClass(query)].observe(seconds)
+
+	########################################
+	def ackExpired(self):
+		with self.lock:
+			self.classes[ACK].expired()
+
+	########################################
+	def replyExpired(self, query):
+		with self.lock:
+			timeoutClass = self.replyClass(query)
+			if timeoutClass == QUERY:
+				self.slowQueries.add(query)
+			else:
+				self.classes[SLOW].expired()
+
+	########################################
+	def state(self):
+		with self.lock:
+			state = dict((name, [round(sample, 3) for sample in estimator.samples]) for name, estimator in self.classes.items())
+			state["slowQueries"] = sorted(self.slowQueries)
+			return state
@@ -4,6 +4,25 @@ import indigo
 import serial
 import threading
 import binascii
+import json
+import os
+import time
+from collections import OrderedDict
+
+import exlinkcodec
+import exlinkplanner
+from exlinkbreaker import CircuitBreaker
+from exlinkcapabilities import CapabilityError, DeviceCapabilities, mergeProfiles, parseProfiles
+from exlinkconnection import CONNECTED, READ_SLICE, ConnectionManager, pollable, readBefore, tuneSocket
+from exlinkframer import ExLinkFramer
+from exlinklistener import LineListener
+from exlinkpoller import LinkBudget, PollSchedule
+from exlinkpresets import PresetError, parsePresets
+from exlinkqueue import INTERACTIVE, POLL, READBACK, SETTER, PortWorker
+from exlinkreactor import ExLinkReactor
+from exlinkshadow import DEFAULT_TTL, PICTURE_SETTINGS, SOUND_SETTINGS, ShadowRegister
+from exlinkstats import ACK, REPLY, ExLinkStats
+from exlinktimeouts import DEFAULT_CEILING, DEFAULT_FLOOR, DeviceTimeouts
 
 ################################################################################
 class Plugin(indigo.PluginBase):
@@ -13,12 +32,79 @@ class Plugin(indigo.PluginBase):
 	def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
 		indigo.PluginBase.__init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs)
 		self.debug = pluginPrefs.get("DebugFlag", False)
-		self.serialLocks = {}
+		#each serial line's connection is owned by its worker thread; nothing
+		#else should touch serialConns[dev.id] directly.  Devices that resolve
+		#to the same port share one worker and one connection.
+		self.workers = {} #keyed by port key
+		self.workersLock = threading.RLock()
+		self.devicePorts = {} #dev.id -> port key
+		self.portGuards = {} #port key -> lock held by whoever is using the line
 		self.serialConns = {}
+		self.framers = {}
+		#devices that turned out not to cope with pipelined status queries
+		self.lockstepDevices = set()
+
+		self.pollingEnabled = pluginPrefs.get("PollingFlag", True)
+		self.pollSchedules = {}
+		self.linkBudgets = {} #keyed by port name; shared by every device on that port
+		self.pollsQueued = set()
+
+		self.breakers = {}
+
+		self.stateCache = {} #last value published for each device state
+		self.pendingStates = {} #changes held back by beginStates
+		self.statesLock = threading.RLock() #guards both, and orders writes to the server
+
+		#ports are opened (and reopened) in the background, never on a worker
+		self.connections = ConnectionManager(self.openPort, self.logger, self.connectionChanged)
+
+		#"threads" polls on the port workers; "reactor" polls every port from
+		#one thread and lets idle workers go
+		self.engine = pluginPrefs.get("engine", "threads")
+		self.reactor = None
+
+		#reads whatever idle ports send unasked, for states changed at the TV
+		self.listening = pluginPrefs.get("ListenFlag", True)
+		self.listener = None
+
+		#write->ack and ack->reply timings, timeouts and line errors per device
+		self.stats = ExLinkStats()
+		self.lastWrites = {} #dev.id -> (name, time) of the last frame written
+		self.lastChanges = {} #dev.id -> time the last frame that wasn't a query was written
+		self.timingStates = pluginPrefs.get("TimingStatesFlag", False)
+		self.timingStatesDue = 0
+
+		#serial timeouts learned from those timings, kept across restarts
+		self.timeouts = {}
+		self.adaptiveTimeouts = pluginPrefs.get("AdaptiveTimeoutsFlag", True)
+		self.timeoutFloor, self.timeoutCeiling = self.timeoutLimits(pluginPrefs)
+		try:
+			self.savedTimeouts = json.loads(pluginPrefs.get("learnedTimeouts", "{}"))
+		except ValueError:
+			self.savedTimeouts = {}
 
-		for dev in indigo.devices.iter("self"):
-			self.serialLocks[dev.id] = threading.Lock()
+		#what each TV answers, learned and kept across restarts, starting from
+		#the profile for its model
+		self.capabilities = {}
+		try:
+			self.savedCapabilities = json.loads(pluginPrefs.get("learnedCapabilities", "{}"))
+		except ValueError:
+			self.savedCapabilities = {}
+		self.capabilityProfiles = {}
+		self.loadCapabilityProfiles(pluginPrefs.get("CapabilityProfiles", ""))
+
+		#the last value each TV acked for its one-way settings, kept across restarts
+		try:
+			writtenSettings = json.loads(pluginPrefs.get("writtenSettings", "{}"))
+		except ValueError:
+			writtenSettings = {}
+		self.shadow = ShadowRegister(self.shadowTTL(pluginPrefs), writtenSettings)
+		self.shadowContext = {} #dev.id -> {state : last real value seen}
+		self.shadowStatesDue = 0
 
+		#named presets, from JSON in the plugin prefs or a file they point to
+		self.presets = {}
+		self.loadPresets(pluginPrefs.get("Presets", ""))
 
 	def __del__(self):
 		indigo.PluginBase.__del__(self)
@@ -26,35 +112,84 @@ class Plugin(indigo.PluginBase):
 	########################################
 	def startup(self):
 		self.logger.debug(u"startup() enter")
+		self.connections.start()
+		self.setEngine(self.engine)
+		self.setListening(self.listening)
 
 	########################################
 	def shutdown(self):
 		self.logger.debug(u"shutdown() enter")
+		with self.workersLock:
+			workers = list(self.workers.values())
+			self.workers = {}
+		for worker in workers:
+			worker.stop()
+		self.setEngine("threads")
+		self.setListening(False)
+		self.connections.stop()
+		self.saveTimeouts()
+		self.saveCapabilities()
+		self.saveShadow()
+
+	########################################
+	def runConcurrentThread(self):
+		try:
+			while True:
+				if self.pollingEnabled:
+					self.pollDevices()
+				if self.reactor is not None:
+					self.retireIdleWorkers()
+				if self.timingStates:
+					self.publishTimingStates()
+				self.publishShadowStates()
+				self.sleep(self.pollTick)
+		except self.StopThread:
+			pass
 		
 	########################################
 	def deviceStartComm(self, dev, blockIfBusy=True):
 		self.logger.debug(dev.name+": deviceStartComm() enter")
-		#handle device upgrade from 1.0 to 1.1
-		if 'Mode3D' not in dev.states:
-			self.logger.info(u"Plugin Upgrade: Adding Mode3D state to Indigo Device \""+dev.name+"\"")
+		#handle device upgrades from older versions
+		if any(state not in dev.states for state in self.addedStates):
+			self.logger.info(u"Plugin Upgrade: Adding new states to Indigo Device \""+dev.name+"\"")
 			dev.stateListOrDisplayStateIdChanged()
 
-		if self.serialLocks[dev.id].acquire(blockIfBusy):
-			self.checkSerial(dev)
-			self.serialLocks[dev.id].release()
-		else:
-			self.logger.debug(u"<<-- skipped deviceStartComm (startStop locked) -->>")
+		with self.statesLock:
+			self.stateCache.pop(dev.id, None)
+		portKey = self.getPortKey(dev)
+		self.devicePorts[dev.id] = portKey
+		self.connections.connect(portKey, dev.name, self.getPortName(dev), dev.id)
 
 	########################################
 	def deviceStopComm(self, dev, blockIfBusy=True):
 		self.logger.debug(dev.name+": deviceStopComm() enter")
-		if self.serialLocks[dev.id].acquire(blockIfBusy):
-			if self.serialConns.get(dev.id) is not None:
-				self.serialConns[dev.id].close()
-				self.serialConns[dev.id] = None
-			self.serialLocks[dev.id].release()
-		else:
-			self.logger.debug(u"<<-- skipped deviceStopComm (startStop locked) -->>")
+		portKey = self.getPortKey(dev)
+		with self.workersLock:
+			self.devicePorts.pop(dev.id, None)
+			worker = self.workers.get(portKey)
+			lastUser = portKey not in self.devicePorts.values()
+			if lastUser:
+				self.workers.pop(portKey, None)
+				if self.listener is not None:
+					self.listener.forget(portKey)
+			if worker is not None:
+				closed = worker.submit(dev.id, self.closeSerial, dev, portKey)
+		self.pollSchedules.pop(dev.id, None)
+		self.breakers.pop(dev.id, None)
+		#its model (and so its profile) may be about to change
+		capabilities = self.capabilities.pop(dev.id, None)
+		if capabilities is not None:
+			self.savedCapabilities[str(dev.id)] = capabilities.state()
+		with self.statesLock:
+			self.stateCache.pop(dev.id, None)
+		if worker is None:
+			self.connections.release(portKey, dev.id)
+			return
+		if lastUser:
+			worker.stop()
+		#give the worker a chance to release the port so a restart can reopen it
+		if blockIfBusy and not closed.wait(self.defaultSerialTimeout):
+			self.logger.debug(u"<<-- deviceStopComm timed out waiting for queued commands -->>")
 
 	########################################
 	def closedPrefsConfigUi(self, valuesDict, userCancelled):
@@ -68,6 +203,47 @@ class Plugin(indigo.PluginBase):
 		else:
 			self.logger.info("Debug logging disabled")
 
+		self.pollingEnabled = valuesDict.get("PollingFlag", True)
+		self.timingStates = valuesDict.get("TimingStatesFlag", False)
+		self.adaptiveTimeouts = valuesDict.get("AdaptiveTimeoutsFlag", True)
+		self.timeoutFloor, self.timeoutCeiling = self.timeoutLimits(valuesDict)
+		for timeouts in list(self.timeouts.values()):
+			timeouts.setLimits(self.timeoutFloor, self.timeoutCeiling)
+		self.setEngine(valuesDict.get("engine", "threads"))
+		self.setListening(valuesDict.get("ListenFlag", True))
+		self.loadPresets(valuesDict.get("Presets", ""))
+		self.shadow.ttl = self.shadowTTL(valuesDict)
+		self.loadCapabilityProfiles(valuesDict.get("CapabilityProfiles", ""))
+
+	########################################
+	def validatePrefsConfigUi(self, valuesDict):
+		errorsDict = indigo.Dict()
+		limits = {}
+		for key in ("TimeoutFloor", "TimeoutCeiling"):
+			try:
+				limits[key] = float(valuesDict.get(key, ""))
+				if limits[key] <= 0:
+					raise ValueError()
+			except ValueError:
+				errorsDict[key] = "Please enter a number of seconds greater than zero"
+		if len(limits) == 2 and limits["TimeoutFloor"] > limits["TimeoutCeiling"]:
+			errorsDict["TimeoutCeiling"] = "The longest wait can't be shorter than the shortest"
+		try:
+			if float(valuesDict.get("ShadowTTL", "")) < 0:
+				raise ValueError()
+		except ValueError:
+			errorsDict["ShadowTTL"] = "Please enter a number of hours, or 0"
+		try:
+			parsePresets(valuesDict.get("Presets", ""))
+		except PresetError as e:
+			errorsDict["Presets"] = str(e)
+		try:
+			parseProfiles(valuesDict.get("CapabilityProfiles", ""))
+		except CapabilityError as e:
+			errorsDict["CapabilityProfiles"] = str(e)
+		if len(errorsDict) > 0:
+			return (False, valuesDict, errorsDict)
+		return (True, valuesDict)
 
 	########################################
 	def validateDeviceConfigUi(self, valuesDict, typeId, devId):
@@ -91,11 +267,6 @@ class Plugin(indigo.PluginBase):
 		if userCancelled:
 			return
 
-		#now that we're sure the device is actually being created,
-		#we can finish variable initialization
-		if self.serialLocks.get(devId) is None:
-			self.serialLocks[devId] = threading.Lock()
-
 	########################################
 	def validateActionConfigUi(self, valuesDict, typeId, devId):
 		self.logger.debug(u"validateActionConfigUi enter")
@@ -128,6 +299,26 @@ class Plugin(indigo.PluginBase):
 						else:
 							self.logger.debug("Group "+commandGroup+" command "+command)
 
+		dev = indigo.devices.get(devId) if devId else None
+		if dev is not None:
+			for field, error in self.unsupportedChoices(dev, typeId, valuesDict).items():
+				errorsDict[field] = error
+
+		if typeId == "applyPreset" and valuesDict.get("Preset", "") not in self.presets:
+			errorsDict["Preset"] = "Please choose a preset"
+
+		if typeId == "groupCommand":
+			self.validateGroupAction(valuesDict, errorsDict)
+
+		if typeId == "refreshStatus":
+			if len(list(valuesDict.get("States", []))) == 0:
+				errorsDict["States"] = "Please choose at least one state"
+			try:
+				if float(valuesDict.get("MaxAge", "")) < 0:
+					raise ValueError()
+			except ValueError:
+				errorsDict["MaxAge"] = "Please give a number of seconds"
+
 		if len(errorsDict) == 0:
 			return (True, valuesDict)
 		return (False, valuesDict, errorsDict)
@@ -137,16 +328,16 @@ class Plugin(indigo.PluginBase):
 		self.logger.debug(dev.name+": actionControlDevice() enter")
 		
 		if action.deviceAction == indigo.kDeviceAction.TurnOn: 
-			self.powerOn(dev)			 
+			self.queueScheduled(dev, INTERACTIVE, None, self.powerOn, dev)
 		
 		if action.deviceAction == indigo.kDeviceAction.TurnOff:
-			self.powerOff(dev)		
+			self.queueScheduled(dev, INTERACTIVE, None, self.powerOff, dev)
 		
 		if action.deviceAction == indigo.kDeviceAction.Toggle:
 			if dev.onState == True:
-				self.powerOff(dev)						
+				self.queueScheduled(dev, INTERACTIVE, None, self.powerOff, dev)
 			elif dev.onState == False:
-				self.powerOn(dev)		   
+				self.queueScheduled(dev, INTERACTIVE, None, self.powerOn, dev)
 			else:			
 				self.logger.error('"' + dev.name + '" in inconsistent state')		
 
@@ -157,26 +348,740 @@ class Plugin(indigo.PluginBase):
 		###### STATUS REQUEST ######
 		if action.deviceAction == indigo.kUniversalAction.RequestStatus:
 			self.logger.info(dev.name+": Sending status request")
-			self.serialLocks[dev.id].acquire()
-			if self.checkSerial(dev) and self.isPowerOn(dev):
-				self.logger.debug(dev.name+": Serial is OK and device is ON: querying additional status info")
-				dev.updateStateOnServer("onOffState", True)
-				self.updateInput(dev)
-				if dev.states["input"] == "TV":
-					self.updateChannel(dev)
-				self.updateVolume(dev)
-				self.updateMute(dev)
-				self.updatePictureMode(dev)
-				self.updatePictureSize(dev)
-				self.update3dMode(dev)
-				self.updateSoundMode(dev)
-			else:
-				dev.updateStateOnServer("onOffState", False)
-
-			self.serialLocks[dev.id].release()
+			self.queueScheduled(dev, READBACK, None, self.requestStatus, dev)
 		else:
 			self.logger.info(u"EX-Link devices cannot beep and have no energy counters")
 
+	########################################
+	# Command queue
+	# Indigo callbacks must never do serial I/O themselves.  Each serial line
+	# has a worker thread that owns its connection and takes turns between the
+	# devices on it; callbacks validate their input, queue the real work and
+	# return.  queueCommand hands back a CommandFuture for callers that want to
+	# wait for (or inspect) the outcome.  Remote keys and power jump ahead of
+	# setters, which go ahead of read-backs, with polls last (see exlinkqueue).
+
+	########################################
+	def getWorker(self, dev):
+		portKey = self.getPortKey(dev)
+		with self.workersLock:
+			worker = self.workers.get(portKey)
+			if worker is None:
+				worker = PortWorker(self.getPortName(dev), self.logger, self.getPortGuard(portKey))
+				self.workers[portKey] = worker
+				worker.start()
+			return worker
+
+	########################################
+	def getPortGuard(self, portKey):
+		with self.workersLock:
+			return self.portGuards.setdefault(portKey, threading.Lock())
+
+	########################################
+	#submits under workersLock so an idle worker can't be retired in between
+	def submitWork(self, dev, method, *args):
+		with self.workersLock:
+			return getattr(self.getWorker(dev), method)(dev.id, *args)
+
+	########################################
+	def queueCommand(self, dev, func, *args):
+		return self.submitWork(dev, "submit", func, *args)
+
+	########################################
+	#queues at another priority than a setter's; deadline is when the command
+	#has to have started by, or None
+	def queueScheduled(self, dev, priority, deadline, func, *args):
+		return self.submitWork(dev, "schedule", priority, deadline, func, *args)
+
+	#how long an absolute setter waits for a newer value before it's sent
+	coalesceWindow = 0.15
+
+	########################################
+	#for absolute setters: a newer value for the same key replaces one still queued
+	def queueLatest(self, dev, key, func, *args):
+		return self.submitWork(dev, "submitLatest", key, self.coalesceWindow, SETTER, func, *args)
+
+	########################################
+	#for repeated keys: identical presses still queued are sent back-to-back
+	def queueRepeat(self, dev, key, func, *args):
+		return self.submitWork(dev, "submitRepeat", key, func, *args)
+
+	########################################
+	#a status read-back after a change; several changes share one read-back
+	def queueReadback(self, dev, query):
+		return self.submitWork(dev, "submitLatest", "readback "+query, 0, READBACK, self.readBack, dev, query, time.time())
+
+	########################################
+	# Query planning
+	# What a TV is doing decides which of its states can change: there's no
+	# channel off the tuner, no 3D on an input that can't carry it, and nothing
+	# at all while it's off.  The rules are in exlinkplanner; every sweep, poll
+	# and read-back asks the planner rather than deciding for itself.
+
+	########################################
+	def plannerKnown(self, dev):
+		return lambda state: self.getState(dev, state)
+
+	########################################
+	#(ask, waiting, skipped) for a sweep of these queries; see exlinkplanner.plan
+	def planQueries(self, dev, queries):
+		known = self.plannerKnown(dev)
+		ask, waiting, skipped = exlinkplanner.plan(queries, known)
+		if skipped:
+			self.stats.count(dev, "plannedQueries", len(skipped))
+			reasons = OrderedDict()
+			for query in skipped:
+				reasons.setdefault(exlinkplanner.describe(exlinkplanner.holding(query, known), known), []).append(query)
+			for reason, held in reasons.items():
+				self.logger.debug(dev.name+": not asking "+", ".join(held)+" while "+reason)
+		return ask, waiting, skipped
+
+	########################################
+	#the queries in `waiting` that the answer to `query`, one of the sweep's
+	#`queries`, has let through
+	def releaseQueries(self, dev, query, waiting, queries):
+		released = exlinkplanner.release(query, waiting, queries, self.plannerKnown(dev))
+		if released:
+			self.logger.debug(dev.name+": "+query+" answer lets "+", ".join(released)+" through")
+		return released
+
+	########################################
+	#called by updateState for every state that changes.  Whatever the new
+	#value lets through may have changed too while it wasn't being asked, so
+	#it's due straight away.
+	def planChanged(self, dev, state, previous):
+		query = self.stateQueries.get(state)
+		if query is None:
+			return
+		known = self.plannerKnown(dev)
+		before = lambda key: previous if key == state else known(key)
+		released = exlinkplanner.releasedBy(query, known, before)
+		if released:
+			self.getPollSchedule(dev).expedite(released)
+
+	########################################
+	# Background polling
+	# runConcurrentThread wakes every pollTick seconds and queues a poll for any
+	# device with status queries due, as far as its port's LinkBudget allows.
+	# Every status read, polled or not, reports back to the device's
+	# PollSchedule so intervals track how often things actually change.  Polls
+	# are the least urgent work on a port: one that can't start within
+	# pollDeadline is dropped, and a sweep makes way between queries for
+	# anything more urgent.  Queries it didn't get to are still due next tick.
+
+	pollTick = 1
+	pollLinkShare = 0.25 #fraction of each port's time polling may use
+	pollDeadline = 5 #seconds a poll may wait to start
+
+	########################################
+	def getPollSchedule(self, dev):
+		schedule = self.pollSchedules.get(dev.id)
+		if schedule is None:
+			schedule = self.pollSchedules.setdefault(dev.id, PollSchedule())
+		return schedule
+
+	########################################
+	def getLinkBudget(self, dev):
+		portKey = self.getPortKey(dev)
+		budget = self.linkBudgets.get(portKey)
+		if budget is None:
+			budget = self.linkBudgets.setdefault(portKey, LinkBudget(9600, self.pollLinkShare))
+		return budget
+
+	########################################
+	def pollDevices(self):
+		now = time.time()
+		candidates = []
+		for dev in indigo.devices.iter("self"):
+			if not dev.enabled or not dev.configured or dev.id in self.pollsQueued:
+				continue
+			if self.connections.connection(self.getPortKey(dev)) is None:
+				continue
+			schedule = self.getPollSchedule(dev)
+			queries = schedule.dueQueries(now)
+			for query in self.planQueries(dev, queries)[2]:
+				#can't have changed; look again in the usual time
+				schedule.skipped(query, now)
+				queries.remove(query)
+			for query in [query for query in queries if not self.supports(dev, query)]:
+				#the TV won't answer; look again when it's next due
+				schedule.record(query, False, now, answered=False)
+				queries.remove(query)
+			if len(queries) > 0:
+				candidates.append((schedule.nextDue(), dev, queries))
+
+		#most overdue device gets first call on its port's budget
+		candidates.sort(key=lambda candidate: candidate[0])
+		for due, dev, queries in candidates:
+			allowed = self.getLinkBudget(dev).take(len(queries), now)
+			if allowed > 0:
+				self.pollsQueued.add(dev.id)
+				if self.reactor is None or self.reactorPoll(dev, queries[:allowed]) is None:
+					future = self.queueScheduled(dev, POLL, now + self.pollDeadline, self.pollStatus, dev, queries[:allowed])
+					future.addCallback(lambda future, dev=dev: self.pollDropped(dev, future))
+
+	########################################
+	#a poll dropped for missing its deadline never ran to say it's finished
+	def pollDropped(self, dev, future):
+		if future.expired:
+			self.logger.debug(dev.name+": poll didn't start in time; dropped")
+			self.pollsQueued.discard(dev.id)
+
+	########################################
+	#True if something more urgent than polling is waiting for the device's port
+	def pollPreempted(self, dev):
+		worker = self.workers.get(self.getPortKey(dev))
+		if worker is None or not worker.urgent(POLL):
+			return False
+		self.logger.debug(dev.name+": poll making way for a more urgent command")
+		return True
+
+	########################################
+	def pollStatus(self, dev, queries):
+		batched = self.beginStates(dev)
+		try:
+			if not self.checkSerial(dev):
+				return
+			start = time.time()
+			count = len(queries)
+			queries = list(queries)
+			if "POWER" in queries:
+				queries.remove("POWER")
+				on = self.isPowerOn(dev)
+				self.updateState(dev, "onOffState", on)
+				if not on:
+					return
+			if len(queries) > 0:
+				self.logger.debug(dev.name+": polling "+", ".join(queries))
+				self.queryStatus(dev, queries, lambda: self.pollPreempted(dev))
+			self.getLinkBudget(dev).measured(time.time() - start, count)
+		finally:
+			if batched:
+				self.commitStates(dev)
+			self.pollsQueued.discard(dev.id)
+
+	########################################
+	# Reactor engine
+	# With the "reactor" engine, polls for ports the reactor can drive (local
+	# ttys and socket:// connections) run on its single thread instead of the
+	# port workers.  Workers are still used for actions, and are let go once
+	# they've been idle for workerIdleTimeout seconds, so thread count follows
+	# how many ports are actually busy rather than how many TVs there are.
+
+	workerIdleTimeout = 60
+
+	########################################
+	def setEngine(self, engine):
+		self.engine = engine
+		if engine == "reactor" and self.reactor is None:
+			self.logger.info("Polling all TVs from a single I/O thread")
+			self.reactor = ExLinkReactor(self.logger)
+			self.reactor.start()
+		elif engine != "reactor" and self.reactor is not None:
+			self.reactor.stop()
+			self.reactor = None
+
+	########################################
+	def retireIdleWorkers(self):
+		with self.workersLock:
+			for portKey, worker in list(self.workers.items()):
+				if worker.retireIfIdle(self.workerIdleTimeout):
+					self.logger.debug(worker.portName+": worker idle; stopping it")
+					del self.workers[portKey]
+
+	########################################
+	#Hands a poll to the reactor.  Returns its CommandFuture, or None if this
+	#port has to be polled by its worker instead.
+	def reactorPoll(self, dev, queries):
+		reactor = self.reactor
+		portKey = self.getPortKey(dev)
+		conn = self.connections.connection(portKey)
+		if reactor is None or pollable(conn) is None:
+			return None
+		#a reactor job can't change course part way, so anything waiting on an
+		#answer in this poll is left due; if the answer lets it through it's
+		#made due straight away (see planChanged)
+		queries = self.planQueries(dev, queries)[0]
+		if "POWER" in queries:
+			#power comes first; there's no point asking a TV that's off anything else
+			queries.remove("POWER")
+			queries.insert(0, "POWER")
+		steps = []
+		for query in queries:
+			ackTimeout = self.probeTimeout(dev) if query in self.probeCommands else self.ackTimeout(dev)
+			steps.append(("query", query, ackTimeout, self.replyTimeout(dev, query)))
+		self.logger.debug(dev.name+": polling "+", ".join(queries)+" from the reactor")
+		return reactor.submit(portKey, conn, self.getPortGuard(portKey), steps,
+			lambda job, error: self.finishReactorPoll(dev, queries, job, error),
+			time.time() + self.pollDeadline, lambda: self.pollPreempted(dev))
+
+	########################################
+	#runs on the reactor thread, still holding the port (unless the poll expired)
+	def finishReactorPoll(self, dev, queries, job, error):
+		try:
+			if job.expired:
+				self.logger.debug(dev.name+": poll didn't start in time; dropped")
+				return
+			for name, phase, seconds in job.timings:
+				self.recordLatency(dev, phase, name, seconds)
+			for name, phase in job.timeouts:
+				#an unanswered power query just means the TV is off
+				if name not in self.probeCommands or phase != ACK:
+					self.recordTimeout(dev, phase, name)
+			self.stats.count(dev, "badCrc", job.badFrames)
+			for frame in job.strays:
+				self.unsolicitedFrame(dev, frame)
+			if error is not None:
+				self.logger.debug(dev.name+": reactor poll failed: "+str(error))
+				if isinstance(error, (IOError, OSError)):
+					self.connections.lost(self.getPortKey(dev))
+				return
+			batched = self.beginStates(dev)
+			try:
+				for query, reply in zip(queries, job.results):
+					if query == "POWER":
+						on = self.powerReply(dev, reply or bytearray())
+						self.updateState(dev, "onOffState", on)
+						if not on:
+							break
+					elif reply is None and job.preempted:
+						#made way for something more urgent; the rest are still due
+						break
+					elif reply is None:
+						#try again later rather than straight away
+						self.logger.debug(dev.name+": no reply to polled query \""+query+"\"")
+						self.getPollSchedule(dev).record(query, False, answered=False)
+					else:
+						self.updateStatus(dev, query, reply)
+				self.getLinkBudget(dev).measured(job.finishedAt - job.startedAt, len(queries))
+			finally:
+				if batched:
+					self.commitStates(dev)
+		finally:
+			self.pollsQueued.discard(dev.id)
+
+	########################################
+	# Unsolicited output
+	# Frames nobody was waiting for - reports some sets send when something
+	# changes at the TV, or replies that turned up after their request gave up
+	# - are still the TV's word on its state, so they go straight into the
+	# device states.  The listener (see exlinklistener) picks them up from
+	# idle ports; requests hand on any they skip over.
+
+	########################################
+	def setListening(self, listening):
+		self.listening = listening
+		if listening and self.listener is None:
+			self.listener = LineListener(self.logger, self.heardFrame, self.listenerFailed)
+			self.listener.start()
+			for portKey in set(self.devicePorts.values()):
+				self.listenTo(portKey)
+		elif not listening and self.listener is not None:
+			self.listener.stop()
+			self.listener = None
+
+	########################################
+	def listenTo(self, portKey):
+		listener = self.listener
+		conn = self.connections.connection(portKey)
+		if listener is not None and conn is not None:
+			listener.watch(portKey, conn, self.getPortGuard(portKey))
+
+	########################################
+	#runs on the listener thread, holding the port
+	def heardFrame(self, portKey, frame):
+		for devId, devicePort in list(self.devicePorts.items()):
+			dev = indigo.devices.get(devId) if devicePort == portKey else None
+			if dev is not None:
+				self.unsolicitedFrame(dev, frame)
+
+	########################################
+	def listenerFailed(self, portKey, error):
+		self.logger.debug(portKey+": listener lost the port: "+str(error))
+		self.connections.lost(portKey)
+
+	########################################
+	#returns True if the frame told us something about the TV
+	def unsolicitedFrame(self, dev, frame):
+		if frame == exlinkcodec.ACK_FRAME:
+			return False
+		if frame == exlinkcodec.POWER_REPLY:
+			self.updateState(dev, "onOffState", self.powerReply(dev, frame))
+			return True
+		decoded = self.decodeReply(frame)
+		if decoded is None or self.statusStates.get(decoded.query, (None,))[0] != decoded.state:
+			self.logger.debug(dev.name+": ignoring unsolicited frame "+binascii.hexlify(bytearray(frame)))
+			return False
+		state, label = self.statusStates[decoded.query]
+		if self.updateState(dev, state, decoded.value):
+			self.logger.info(dev.name+": TV reports "+label+" is now "+str(decoded.value))
+		self.getPollSchedule(dev).reported(decoded.query)
+		return True
+
+	########################################
+	# Timing statistics
+	# Every exchange is timed (see exlinkstats); the plugin menu can log a
+	# report, save a JSON snapshot or start the figures afresh.  With the
+	# TimingStatesFlag pref set, each device's headline figures are also
+	# published as device states every timingStatesInterval seconds.
+
+	timingStatesInterval = 60
+
+	########################################
+	def publishTimingStates(self, now=None):
+		if now is None:
+			now = time.time()
+		if now < self.timingStatesDue:
+			return
+		self.timingStatesDue = now + self.timingStatesInterval
+		for dev in indigo.devices.iter("self"):
+			if not dev.enabled or "timeouts" not in dev.states:
+				continue
+			batched = self.beginStates(dev)
+			try:
+				for key, value in self.stats.summary(dev).items():
+					self.updateState(dev, key, value)
+			finally:
+				if batched:
+					self.commitStates(dev)
+
+	########################################
+	#every timed exchange goes through these two, for the stats and the timeouts
+	def recordLatency(self, dev, phase, name, seconds):
+		self.stats.latency(dev, phase, name, seconds)
+		if phase == REPLY or name not in self.queries:
+			self.learnedSupport(dev, name)
+		else:
+			self.getCapabilities(dev).heard()
+		if phase == ACK:
+			self.getTimeouts(dev).observeAck(seconds)
+		else:
+			self.getTimeouts(dev).observeReply(name, seconds)
+
+	########################################
+	def recordTimeout(self, dev, phase, name):
+		self.stats.timeout(dev, name)
+		if name not in self.essentialNames and self.getCapabilities(dev).unanswered(name):
+			self.logger.warn(dev.name+": TV doesn't seem to support "+name+"; not trying it again for a day")
+		if phase == ACK:
+			self.getTimeouts(dev).ackExpired()
+		else:
+			self.getTimeouts(dev).replyExpired(name)
+
+	########################################
+	def timingSnapshot(self):
+		return json.dumps(self.stats.snapshot(), indent=2, sort_keys=True)
+
+	########################################
+	def logTimingReport(self):
+		for line in self.stats.report():
+			self.logger.info(line)
+
+	########################################
+	def saveTimingSnapshot(self):
+		path = os.path.join(indigo.server.getInstallFolderPath(), "Logs", self.pluginDisplayName+" timing.json")
+		try:
+			with open(path, "w") as snapshot:
+				snapshot.write(self.timingSnapshot())
+			self.logger.info("Timing snapshot saved to "+path)
+		except (IOError, OSError) as e:
+			self.logger.error("Unable to save timing snapshot to "+path+": "+str(e))
+
+	########################################
+	def resetTimingStats(self):
+		self.stats.reset()
+		self.logger.info("Timing statistics reset")
+
+	########################################
+	# Adaptive timeouts
+	# Each device learns how long to wait for an ack and for a status reply
+	# from the latencies recordLatency sees (see exlinktimeouts), between the
+	# floor and ceiling set in the plugin config.  With AdaptiveTimeoutsFlag
+	# off, the fixed defaultSerialTimeout and powerSerialTimeout are used.
+
+	#commands a TV that's off won't answer; a missing ack isn't a failure
+	probeCommands = ("POWER", "PowerOff")
+
+	########################################
+	def timeoutLimits(self, prefs):
+		try:
+			floor = float(prefs.get("TimeoutFloor", DEFAULT_FLOOR))
+			ceiling = float(prefs.get("TimeoutCeiling", DEFAULT_CEILING))
+		except ValueError:
+			return DEFAULT_FLOOR, DEFAULT_CEILING
+		return floor, max(floor, ceiling)
+
+	########################################
+	def getTimeouts(self, dev):
+		timeouts = self.timeouts.get(dev.id)
+		if timeouts is None:
+			timeouts = DeviceTimeouts(self.timeoutFloor, self.timeoutCeiling, self.savedTimeouts.get(str(dev.id)))
+			timeouts = self.timeouts.setdefault(dev.id, timeouts)
+		return timeouts
+
+	########################################
+	def ackTimeout(self, dev):
+		if not self.adaptiveTimeouts:
+			return self.defaultSerialTimeout
+		return self.getTimeouts(dev).ackTimeout()
+
+	########################################
+	def replyTimeout(self, dev, query):
+		if not self.adaptiveTimeouts:
+			return self.defaultSerialTimeout
+		return self.getTimeouts(dev).replyTimeout(query)
+
+	########################################
+	#how long to wait for a TV that may be off to ack
+	def probeTimeout(self, dev):
+		if not self.adaptiveTimeouts:
+			return self.powerSerialTimeout
+		return self.getTimeouts(dev).probeTimeout(self.powerSerialTimeout)
+
+	########################################
+	def saveTimeouts(self):
+		for devId, timeouts in list(self.timeouts.items()):
+			self.savedTimeouts[str(devId)] = timeouts.state()
+		self.pluginPrefs["learnedTimeouts"] = json.dumps(self.savedTimeouts)
+
+	########################################
+	# Capabilities
+	# Each device learns which status queries, commands and selections its TV
+	# deals with from the exchanges recordLatency and recordTimeout see (see
+	# exlinkcapabilities), starting from the profile for its model if the
+	# plugin config has one.  Sweeps and polls leave out queries the TV is known
+	# not to answer, commands it doesn't take are refused up front, and action
+	# dialogs for a TV won't accept them.
+
+	#never learned as unsupported: a TV that's off doesn't answer these either
+	essentialNames = ("POWER", "PowerOn", "PowerOff", "unnamed")
+
+	#what selections are called: "Input HDMI1", "PictureMode MOVIE", ...
+	selectionKinds = {
+		"input" : "Input",
+		"pictureMode" : "PictureMode",
+		"pictureSize" : "PictureSize",
+		"soundMode" : "SoundMode",
+	}
+
+	########################################
+	#logs and keeps the profiles we had if the new ones are bad
+	def loadCapabilityProfiles(self, text):
+		try:
+			profiles = parseProfiles(text)
+		except CapabilityError as e:
+			self.logger.error(u"Capability profiles not loaded: "+str(e))
+			return
+		if profiles != self.capabilityProfiles:
+			self.saveCapabilities()
+			self.capabilities = {}
+			self.capabilityProfiles = profiles
+
+	########################################
+	def getCapabilities(self, dev):
+		capabilities = self.capabilities.get(dev.id)
+		if capabilities is None:
+			profile = self.capabilityProfiles.get(dev.pluginProps.get("model", ""))
+			capabilities = DeviceCapabilities(profile, self.savedCapabilities.get(str(dev.id)))
+			capabilities = self.capabilities.setdefault(dev.id, capabilities)
+		return capabilities
+
+	########################################
+	def supports(self, dev, name):
+		return self.getCapabilities(dev).allows(name)
+
+	########################################
+	def learnedSupport(self, dev, name):
+		if self.getCapabilities(dev).answered(name):
+			self.logger.info(dev.name+": TV answers "+name+" after all")
+
+	########################################
+	def saveCapabilities(self):
+		for devId, capabilities in list(self.capabilities.items()):
+			self.savedCapabilities[str(devId)] = capabilities.state()
+		self.pluginPrefs["learnedCapabilities"] = json.dumps(self.savedCapabilities)
+
+	########################################
+	#one line per model, ready to paste into the plugin config; TVs with no
+	#model set are listed under their own names
+	def logCapabilityProfiles(self):
+		models = {}
+		for dev in indigo.devices.iter("self"):
+			profile = self.getCapabilities(dev).profile()
+			if profile["unsupported"]:
+				self.logger.info(dev.name+": doesn't support "+", ".join(profile["unsupported"]))
+			models.setdefault(dev.pluginProps.get("model", "") or dev.name, []).append(profile)
+		profiles = dict((model, mergeProfiles(profiles)) for model, profiles in models.items())
+		self.logger.info(u"Capability profiles: "+json.dumps(profiles, sort_keys=True))
+
+	########################################
+	def forgetCapabilities(self):
+		for capabilities in list(self.capabilities.values()):
+			capabilities.forget()
+		self.savedCapabilities = {}
+		self.capabilities = {}
+		self.saveCapabilities()
+		self.logger.info("Forgot what every TV has been found to support")
+
+	########################################
+	#error messages for anything in an action's settings the TV doesn't support
+	def unsupportedChoices(self, dev, typeId, valuesDict):
+		choices = []
+		if typeId in self.selectionActions:
+			field, kind = self.selectionActions[typeId]
+			choices.append((field, kind+" "+valuesDict.get(field, "")))
+		if valuesDict.get("Command", "") in self.enumCommands:
+			choices.append(("Command", valuesDict["Command"]))
+		choices.extend((key, key) for key in valuesDict if key in self.integerCommands)
+		return dict((field, "This TV doesn't support "+name) for field, name in choices if not self.supports(dev, name))
+
+	#selection actions: typeId -> (field, kind of selection)
+	selectionActions = {
+		"selectInput" : ("Input", "Input"),
+		"setPictureMode" : ("Mode", "PictureMode"),
+		"setPictureSize" : ("Size", "PictureSize"),
+		"setSoundMode" : ("Mode", "SoundMode"),
+	}
+
+	########################################
+	# Shadow register
+	# The TV can't be asked about most picture and sound settings, so the
+	# register (see exlinkshadow) remembers what each one last acknowledged,
+	# and sendIntegerCommand and sendEnumCommand skip writes that wouldn't
+	# change anything unless forced.  A device's register is invalidated when
+	# it's turned on or off, and the picture or sound part of it when the
+	# input or mode it belongs to changes.  What's remembered is published in
+	# the writtenSettings state and kept across restarts.
+
+	#states whose change invalidates settings: None for all of them
+	shadowContexts = {
+		"onOffState" : None,
+		"input" : None,
+		"pictureMode" : PICTURE_SETTINGS,
+		"soundMode" : SOUND_SETTINGS,
+	}
+	shadowStatesInterval = 60
+
+	########################################
+	#hours in the prefs, seconds here; 0 means settings never go stale
+	def shadowTTL(self, prefs):
+		try:
+			return max(0.0, float(prefs.get("ShadowTTL", DEFAULT_TTL / 3600.0)) * 3600)
+		except ValueError:
+			return DEFAULT_TTL
+
+	########################################
+	#called by updateState for every state that changes; UNKNOWN (a reply
+	#that couldn't be decoded) isn't a change of input or mode
+	def shadowContextChanged(self, dev, key, previous, value):
+		if key not in self.shadowContexts or value in ("", "UNKNOWN"):
+			return
+		seen = self.shadowContext.setdefault(dev.id, {})
+		if previous not in (None, "", "UNKNOWN"):
+			seen.setdefault(key, previous)
+		if seen.get(key, value) != value:
+			self.logger.debug(dev.name+": "+key+" changed; forgetting settings it affects")
+			self.shadow.invalidate(dev.id, self.shadowContexts[key])
+			self.publishShadow(dev)
+		seen[key] = value
+
+	########################################
+	def describeShadow(self, dev):
+		values = self.shadow.values(dev.id)
+		described = []
+		for setting in sorted(values):
+			value = values[setting]
+			if value in self.enumCommands:
+				value = self.enumCommands[value]["name"]
+			described.append(setting+" "+str(value))
+		return ", ".join(described)
+
+	########################################
+	def publishShadow(self, dev):
+		if "writtenSettings" in dev.states:
+			self.updateState(dev, "writtenSettings", self.describeShadow(dev))
+
+	########################################
+	#catches settings that have gone stale since they were last published
+	def publishShadowStates(self, now=None):
+		if now is None:
+			now = time.time()
+		if now < self.shadowStatesDue:
+			return
+		self.shadowStatesDue = now + self.shadowStatesInterval
+		for dev in indigo.devices.iter("self"):
+			if dev.enabled:
+				self.publishShadow(dev)
+
+	########################################
+	def saveShadow(self):
+		self.pluginPrefs["writtenSettings"] = json.dumps(self.shadow.state())
+
+	########################################
+	def logWrittenSettings(self):
+		for dev in indigo.devices.iter("self"):
+			self.logger.info(dev.name+": "+(self.describeShadow(dev) or "no settings remembered"))
+
+	########################################
+	def forgetWrittenSettings(self):
+		self.shadow.clear()
+		for dev in indigo.devices.iter("self"):
+			self.publishShadow(dev)
+		self.logger.info("Forgot the settings sent to every TV; the next of each will be sent")
+
+	########################################
+	# Device state cache
+	# Every state the plugin publishes goes through updateState, which keeps a
+	# shadow copy of what the server already has and drops writes that
+	# wouldn't change anything.  Between beginStates and commitStates, changes
+	# are held back and go to the server in a single updateStatesOnServer call.
+	# Workers, the reactor, the listener and the connection manager all publish
+	# states, so the cache and batches are only touched holding statesLock,
+	# which is also held while writing to the server: a write can't overtake a
+	# batch that's being committed, or land in one that's already gone.
+
+	########################################
+	def getState(self, dev, key):
+		with self.statesLock:
+			cache = self.stateCache.get(dev.id)
+			if cache is not None and key in cache:
+				return cache[key]
+		return dev.states.get(key)
+
+	########################################
+	#returns True if the value changed
+	def updateState(self, dev, key, value):
+		with self.statesLock:
+			previous = self.getState(dev, key)
+			self.stateCache.setdefault(dev.id, {})[key] = value
+			if previous == value:
+				return False
+			pending = self.pendingStates.get(dev.id)
+			if pending is not None:
+				pending[key] = value
+			else:
+				dev.updateStateOnServer(key, value)
+		#these can publish states of their own
+		self.shadowContextChanged(dev, key, previous, value)
+		self.planChanged(dev, key, previous)
+		return True
+
+	########################################
+	#returns False if a batch was already open for this device
+	def beginStates(self, dev):
+		with self.statesLock:
+			if dev.id in self.pendingStates:
+				return False
+			self.pendingStates[dev.id] = OrderedDict()
+			return True
+
+	########################################
+	def commitStates(self, dev):
+		with self.statesLock:
+			pending = self.pendingStates.pop(dev.id, None)
+			if pending:
+				dev.updateStatesOnServer([{"key" : key, "value" : value} for key, value in pending.items()])
+
 	########################################
 	# Begin EX-Link specific functionality #
 	########################################
@@ -190,543 +1095,158 @@ class Plugin(indigo.PluginBase):
 	defaultSerialTimeout = 5
 	powerSerialTimeout = 0.5
 
-	queries = {
-		"POWER" : [0x08, 0x22, 0xF0, 0x00, 0x00, 0x00, 0xE6],
-		"VOLUME" : [0x08, 0x22, 0xF0, 0x01, 0x00, 0x00, 0xE5],
-		"MUTE" : [0x08, 0x22, 0xF0, 0x02, 0x00, 0x00, 0xE4],
-		"CHANNEL" : [0x08, 0x22, 0xF0, 0x03, 0x00, 0x00, 0xE3],
-		"INPUT" : [0x08, 0x22, 0xF0, 0x04, 0x00, 0x00, 0xE2],
-		"PICTURE_SIZE" : [0x08, 0x22, 0xF0, 0x05, 0x00, 0x00, 0xE1],
-		"3D_MODE" : [0x08, 0x22, 0xF0, 0x06, 0x00, 0x00, 0xE0],
-		"PICTURE_MODE" : [0x08, 0x22, 0xF0, 0x07, 0x00, 0x00, 0xDF],
-		"SOUND_MODE" : [0x08, 0x22, 0xF0, 0x08, 0x00, 0x00, 0xDE],
-		#one might expect that other settings could be queried via successive
-		#values of byte 4, but that doesn't seem to be the case on my TV
+	#the protocol tables live in exlinkcodec; these aliases keep the names the
+	#rest of the plugin (and the action menus) have always used
+	queries = exlinkcodec.QUERIES
+	queryTypes = exlinkcodec.QUERY_TYPES
+	valueStates = exlinkcodec.VALUE_STATES
+	responses = exlinkcodec.RESPONSES
+	responseDataLength = exlinkcodec.RESPONSE_LENGTH
+	responseIndex = exlinkcodec.RESPONSE_INDEX
+	inputs = exlinkcodec.INPUTS
+	pictureModes = exlinkcodec.PICTURE_MODES
+	pictureSizes = exlinkcodec.PICTURE_SIZES
+	soundModes = exlinkcodec.SOUND_MODES
+	ThreeDmodes = exlinkcodec.THREED_MODES
+	integerCommands = exlinkcodec.INTEGER_COMMANDS
+	commandGroups = exlinkcodec.COMMAND_GROUPS
+	enumCommands = exlinkcodec.ENUM_COMMANDS
+	buttons = exlinkcodec.BUTTONS
+
+	#status queries other than POWER, and the state each one feeds.  Which of
+	#them a sweep actually asks is up to the query planner; the input comes
+	#first since several of the others depend on it
+	statusQueries = ["INPUT", "CHANNEL", "VOLUME", "MUTE", "PICTURE_MODE", "PICTURE_SIZE", "3D_MODE", "SOUND_MODE"]
+	statusStates = {
+		"INPUT" : ("input", "Input"),
+		"CHANNEL" : ("channel", "Channel"),
+		"VOLUME" : ("volume", "Volume"),
+		"MUTE" : ("mute", "Mute"),
+		"PICTURE_MODE" : ("pictureMode", "Picture Mode"),
+		"PICTURE_SIZE" : ("pictureSize", "Picture Size"),
+		"3D_MODE" : ("Mode3D", "3D Mode"),
+		"SOUND_MODE" : ("soundMode", "Sound Mode"),
 	}
 
-	responses = {
-		"ACK" : [0x03, 0x0C, 0xF1],
-		"POWER" : [0x03, 0x0C, 0xF5, 0x08, 0xf0, 0x00, 0x00, 0x00, 0xf1, 0x05, 0x00, 0x00, 0x0e],
-	}
+	#states that are set to UNKNOWN when a query can't be decoded
+	unknownStates = ("input", "pictureMode", "soundMode", "pictureSize")
 
-	responseDataLength = 13 #all response messages (except command ack) are 13 bytes long
-	#the responses below all omit the 030CF508F0 header
-	#I could be smarter about constructing and parsing these on the fly, but I won't
-	inputs = {
-		#input responses don't seem to have any rhyme or reason to them
-		"TV" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x00, 0x00, 0xCC],
-				 "response" : [0x04, 0x00, 0x00, 0xf1, 0x00, 0x00, 0x00, 0x0f]
-			},
-		"AV1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x01, 0x00, 0xCB],
-				  "response" : [0x04, 0x00, 0x00, 0xf1, 0x1c, 0x00, 0x00, 0xf3]
-			},
-		"AV2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x01, 0x01, 0xCA],
-				  "response" : [0x04, 0x00, 0x00, 0xf1, 0x1d, 0x00, 0x00, 0xf2]
-			},
-		"AV3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x01, 0x02, 0xC9],
-				  "response" : [0x04, 0x00, 0x00, 0xf1, 0x1e, 0x00, 0x00, 0xf1]
-			},
-		"SVID1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x02, 0x00, 0xCA],
-					"response" : [] #no idea.  please email if you find it
-			},
-		"SVID2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x02, 0x01, 0xC9],
-					"response" : [] #no idea.  please email if you find it
-			},
-		"SVID3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x02, 0x02, 0xC8],
-					"response" : [] #no idea.  please email if you find it
-			},
-		"COMP1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x03, 0x00, 0xC9],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x29, 0x00, 0x00, 0xe6]
-			},
-		"COMP2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x03, 0x01, 0xC8],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x2a, 0x00, 0x00, 0xe5]
-			},
-		"COMP3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x03, 0x02, 0xC7],
-				 	"response" : [0x04, 0x00, 0x00, 0xf1, 0x2b, 0x00, 0x00, 0xe4]
-			},
-		"PC1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x04, 0x00, 0xC8],
-				  "response" :  [] #no idea.  please email if you find it
-			},
-		"PC2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x04, 0x01, 0xC7],
-				  "response" :  [] #no idea.  please email if you find it
-			},
-		"PC3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x04, 0x02, 0xC6],
-				  "response" :  [] #no idea.  please email if you find it
-			},
-		"HDMI1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x00, 0xC7],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x39, 0x00, 0x00, 0xd6],
-					"response2" : [0x04, 0x00, 0x00, 0xf1, 0x47, 0x00, 0x00, 0xc8]
-			},
-		"HDMI2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x01, 0xC6],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x3a, 0x00, 0x00, 0xd5],
-					"response2" : [0x04, 0x00, 0x00, 0xf1, 0x48, 0x00, 0x00, 0xc7]
-			},
-		"HDMI3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x02, 0xC5],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x3b, 0x00, 0x00, 0xd4],
-					"response2" : [0x04, 0x00, 0x00, 0xf1, 0x49, 0x00, 0x00, 0xc6]
-			},
-		"HDMI4" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x03, 0xC4],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x3c, 0x00, 0x00, 0xd3],
-					"response2" : [0x04, 0x00, 0x00, 0xf1, 0x4a, 0x00, 0x00, 0xc5]
-			},
-		"HDMI5" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x04, 0xC3],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x3d, 0x00, 0x00, 0xd2],
-					"response2" : [0x04, 0x00, 0x00, 0xf1, 0x4b, 0x00, 0x00, 0xc4]
-			},
-		"HDMI6" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x05, 0x05, 0xC2],
-					"response" : [0x04, 0x00, 0x00, 0xf1, 0x3e, 0x00, 0x00, 0xd1],
-					"response2" : [0x04, 0x00, 0x00, 0xf1, 0x4c, 0x00, 0x00, 0xc3]
-			},
-		"DVI1" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x06, 0x00, 0xC6],
-				   "response" :  [] #no idea.  please email if you find it
-			},
-		"DVI2" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x06, 0x01, 0xC5],
-				   "response" :  [] #no idea.  please email if you find it
-			},
-		"DVI3" : { "command" : [0x08, 0x22, 0x0a, 0x00, 0x06, 0x02, 0xC4],
-				   "response" :  [] #no idea.  please email if you find it
-			},
-		"SMARTHUB" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x8C, 0x3D],
-				#note this response is sent for any app but not for the smarthub menu screen
-				 "response" : [0x04, 0x00, 0x00, 0xf1, 0x59, 0x00, 0x00, 0xb6]
-			},
-		"NETFLIX" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0xF3, 0xD6]
-					  #netflix sends the generic smarthub response
-			},
-		"AMAZON" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0xF4, 0xD5]
-					 #amazon sends the generic smarthub response
-			}
-		#I'm not sure why Netflix and Amazon are so special, but my TV doesn't have
-		#direct access to any other smarthub apps.  Perhaps newer TVs do.
-		}
-
-	pictureModes = {
-		"DYNAMIC" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x00, 0xCB],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x00, 0x00, 0x00, 0x0c]
-			},
-		"STANDARD" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x01, 0xCA],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x01, 0x00, 0x00, 0x0b]
-			},
-		"MOVIE" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x02, 0xC9],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x02, 0x00, 0x00, 0x0a]
-			},
-		"NATURAL" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x03, 0xC8],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x03, 0x00, 0x00, 0x09]
-			},
-		"CAL_NIGHT" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x04, 0xC7],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x04, 0x00, 0x00, 0x08]
-			},
-		"CAL_DAY" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x05, 0xC6],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x05, 0x00, 0x00, 0x07]
-			},
-		"BD_WISE" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x06, 0xC5],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x06, 0x00, 0x00, 0x06]
-			},
-		#I have no reference for the display names of modes 7-9, 11-12.
-		#If you discover any, please let me know
-		"MODE7" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x07, 0xC4],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x07, 0x00, 0x00, 0x05]
-			},
-		"MODE8" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x08, 0xC3],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x08, 0x00, 0x00, 0x04]
-			},
-		"MODE9" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x09, 0xC2],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x09, 0x00, 0x00, 0x03]
-			},
-		"RELAX" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x0a, 0xC1],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x0a, 0x00, 0x00, 0x02]
-			},
-		"MODE11" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x0b, 0xC0],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x0b, 0x00, 0x00, 0x01]
-			},
-		"MODE12" : { "command" : [0x08, 0x22, 0x0b, 0x00, 0x00, 0x0c, 0xBF],
-					"response" : [0x07, 0x00, 0x00, 0xf1, 0x0c, 0x00, 0x00, 0x00]
-			}
-		}
-
-	pictureSizes = {
-		"SIXTEEN_NINE" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x00, 0xC0],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x00, 0x00, 0x00, 0x0E] },
-		"ZOOM1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x01, 0xBF],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x01, 0x00, 0x00, 0x0D] },
-		"ZOOM2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x02, 0xBE],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x02, 0x00, 0x00, 0x0C] },
-		"WIDE_FIT" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x03, 0xBD],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x03, 0x00, 0x00, 0x0B] },
-		"FOUR_THREE" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x04, 0xBC],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x04, 0x00, 0x00, 0x0A] },
-		"SCREEN_FIT" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x05, 0xBB],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x05, 0x00, 0x00, 0x09] },
-		"SMART_VIEW1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x06, 0xBA],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x06, 0x00, 0x00, 0x08] },
-		"SMART_VIEW2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x01, 0x07, 0xB9],
-					"response" : [0x05, 0x00, 0x00, 0xF1, 0x07, 0x00, 0x00, 0x07] },
-		#any extra sizes to worry about down here?
-	}
-	
-	soundModes = {
-		"STANDARD" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x00, 0xCA],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x00, 0x00, 0x00, 0x0B] },
-		"MUSIC" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x01, 0xC9],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x01, 0x00, 0x00, 0x0A] },
-		"MOVIE" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x02, 0xC8],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x02, 0x00, 0x00, 0x09] },
-		"CLEAR_VOICE" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x03, 0xC7],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x03, 0x00, 0x00, 0x08] },
-		"AMPLIFY" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x04, 0xC6],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x04, 0x00, 0x00, 0x07] },
-		#I have no reference for the display names of modes greater than 4.
-		#If you discover any, please let me know
-		"MODE5" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x05, 0xC5],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x05, 0x00, 0x00, 0x06] },
-		"MODE6" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x06, 0xC4],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x06, 0x00, 0x00, 0x05] },
-		"MODE7" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x07, 0xC3],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x07, 0x00, 0x00, 0x04] },
-		"MODE8" : { "command" : [0x08, 0x22, 0x0c, 0x00, 0x00, 0x08, 0xC2],
-					"response" : [0x08, 0x00, 0x00, 0xF1, 0x08, 0x00, 0x00, 0x03] },
-	}
-
-	ThreeDmodes = {
-		"OFF" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x00, 0x00, 0x00, 0x0D] },
-		#My Plasma reports mode "ON" mode when playing 3D BD - might also be "FRAME_SEQUENCE"
-		"ON" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x01, 0x00, 0x00, 0x0C] },
-		"TOP_BOTTOM" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x02, 0x00, 0x00, 0x0B] },
-		#SIDE_BY_SIDE is Half SBS
-		"SIDE_BY_SIDE" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x03, 0x00, 0x00, 0x0A] },
-
-		#I have no reference for the display names of modes 4-7, though they must
-		#include checkerboard, line-by-line, and "vertical line" and maybe "frame sequence"
-		#If you discover any, please let me know
-		"MODE4" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x04, 0x00, 0x00, 0x09] },
-		"MODE5" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x05, 0x00, 0x00, 0x08] },
-		"MODE6" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x06, 0x00, 0x00, 0x07] },
-		"MODE7" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x07, 0x00, 0x00, 0x06] },
-
-		"TWO_TO_THREE" : { "command" : [], #command is defined in enumCommands
-					"response" : [0x06, 0x00, 0x00, 0xF1, 0x08, 0x00, 0x00, 0x05] },
+	#states added since the first release; older devices need their state list refreshed
+	addedStates = ("Mode3D", "connection", "timeouts", "preset", "writtenSettings")
 
-	}
-
-	#these commands are one-way only (can't read current setting from TV)
-	integerCommands = {
-		"Backlight" : { "command" : [ 0x08, 0x22, 0x0b, 0x01, 0x00],
-							"min" : 0,
-							"max" : 20},
-		"Sharpness" : { "command" : [0x08, 0x22, 0x0b, 0x04, 0x00],
-							"min" : 0,
-							"max" : 100},
-		"Contrast" : { "command" : [0x08, 0x22, 0x0b, 0x02, 0x00],
-							"min" : 0,
-							"max" : 100},
-		"Brightness" : { "command" : [0x08, 0x22, 0x0b, 0x03, 0x00],
-							"min" : 0,
-							"max" : 100},
-		"Color" : { "command" : [0x08, 0x22, 0x0b, 0x05, 0x00],
-							"min" : 0,
-							"max" : 100},
-		"Tint" : { "command" : [0x08, 0x22, 0x0b, 0x06, 0x00],
-							"min" : 0,
-							"max" : 100},
-		"Volume": { "command" : [0x08, 0x22, 0x01, 0x00, 0x00],
-							"min" : 0,
-							"max" : 100},
-		"Channel" : { "command" : [0x08, 0x22, 0x04, 0x00, 0x00],
-							"min" : 1,
-							"max" : 999},
-		"ShadowDetail" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x02],
-							"min" : -2,
-							"max" : 2},
-		"Gamma" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x03],
-							"min" : -2,
-							"max" : 2},
-		"WhiteBalanceROffset" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x07],
-							"min" : 0,
-							"max" : 50},
-		"WhiteBalanceGOffset" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x08],
-							"min" : 0,
-							"max" : 50},
-		"WhiteBalanceBOffset" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x09],
-							"min" : 0,
-							"max" : 50},
-		"WhiteBalanceRGain" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0a],
-							"min" : 0,
-							"max" : 50},
-		"WhiteBalanceGGain" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0b],
-							"min" : 0,
-							"max" : 50},
-		"WhiteBalanceBGain" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0c],
-							"min" : 0,
-							"max" : 50},
-		"FleshTone" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0e],
-							"min" : 0,
-							"max" : 50},
-		"3DViewPoint" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x02],
-							"min" : -5,
-							"max" : 5},
-		"3DDepth" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x03],
-							"min" : 1,
-							"max" : 10},
-		"SoundBalance" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x00],
-							"min" : 0,
-							"max" : 20},
-		"SoundEQ100Hz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x01],
-							"min" : 0,
-							"max" : 20},
-		"SoundEQ300Hz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x02],
-							"min" : 0,
-							"max" : 20},
-		"SoundEQ1kHz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x03],
-							"min" : 0,
-							"max" : 20},
-		"SoundEQ3kHz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x04],
-							"min" : 0,
-							"max" : 20},
-		"SoundEQ10kHz" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x05],
-							"min" : 0,
-							"max" : 20}
-	}
-	
-	#This list captures actions that carry more than one integer value
-	commandGroups = {
-		"WhiteBalance" : ["WhiteBalanceRGain", "WhiteBalanceROffset", "WhiteBalanceBGain", "WhiteBalanceBOffset",
-							"WhiteBalanceGGain", "WhiteBalanceGOffset"],
-		"SoundEQ" : ["SoundEQ100Hz", "SoundEQ300Hz", "SoundEQ1kHz", "SoundEQ3kHz", "SoundEQ10kHz"]
-	}
-	
-	#these commands are one-way only (can't read current setting from TV)
-	enumCommands = {
-		"PowerOff" : { "command" : [0x08, 0x22, 0x00, 0x00, 0x00, 0x01, 0xD5],
-						"name" : "Off"},
-		"PowerOn" : { "command" : [0x08, 0x22, 0x00, 0x00, 0x00, 0x02, 0xD4],
-						"name" : "On"},
-
-		"BlackToneOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x00, 0xC4],
-						"name" : "Off"},
-		"BlackToneDark" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x01, 0xC3],
-						"name" : "Dark"},
-		"BlackToneDarker" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x02, 0xC2],
-						"name" : "Darker"},
-		"BlackToneDarkest" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x00, 0x03, 0xC1],
-						"name" : "Darkest"},
-
-		"DynamicCtstOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x00, 0xC3],
-						"name" : "Off"},
-		"DynamicCtstLow" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x01, 0xC2],
-						"name" : "Low"},
-		"DynamicCtstMedium" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x02, 0xC1],
-						"name" : "Medium"},
-		"DynamicCtstHigh" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x01, 0x03, 0xC0],
-						"name" : "High"},
-
-		"RGBOnlyModeOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x00, 0xBF],
-						"name" : "Off"},
-		"RGBOnlyModeRed" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x01, 0xBE],
-						"name" : "Red"},
-		"RGBOnlyModeGreen" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x02, 0xBD],
-						"name" : "Green"},
-		"RGBOnlyModeBlue" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x05, 0x03, 0xBC],
-						"name" : "Blue"},
-
-		"ClrSpaceAuto" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x06, 0x00, 0xBE],
-						"name" : "Auto"},
-		"ClrSpaceNative" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x06, 0x01, 0xBD],
-						"name" : "Native"},
-		"ClrSpaceCustom" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x06, 0x02, 0xBC],
-						"name" : "Custom"},
-
-		"EdgeEnhancementOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0f, 0x00, 0xB5],
-						"name" : "Off"},
-		"EdgeEnhancementOn" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0f, 0x01, 0xB4],
-						"name" : "On"},
-
-		"xvYCCOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x10, 0x00, 0xB4],
-						"name" : "Off"},
-		"xvYCCOn" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x10, 0x01, 0xB3],
-						"name" : "On"},
-
-		"MotionLightingOff" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x11, 0x00, 0xB3],
-						"name" : "Off"},
-		"MotionLightingOn" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x11, 0x01, 0xB2],
-						"name" : "On"},
-
-		"LEDMotionPlusOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x00, 0xBA],
-						"name" : "Off"},
-		"LEDMotionPlusNormal" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x01, 0xB9],
-						"name" : "Normal"},
-		"LEDMotionPlusCinema" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x02, 0xB8],
-						"name" : "Cinema"},
-		"LEDMotionPlusTicker" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x07, 0x03, 0xB7],
-						"name" : "Ticker"},
-		
-		"ClrToneCool" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x00, 0xC1],
-						"name" : "Cool"},
-		"ClrToneNormal" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x01, 0xC0],
-						"name" : "Normal"},
-		"ClrToneWarm1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x02, 0xBF],
-						"name" : "Warm 1"},
-		"ClrToneWarm2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x00, 0x03, 0xBE],
-						"name" : "Warm 2"},
-		
-		"DigitalNoiseFilterOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x00, 0xBF],
-						"name" : "Off"},
-		"DigitalNoiseFilterLow" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x01, 0xBE],
-						"name" : "Low"},
-		"DigitalNoiseFilterMedium" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x02, 0xBD],
-						"name" : "Medium"},
-		"DigitalNoiseFilterHigh" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x03, 0xBC],
-						"name" : "High"},
-		"DigitalNoiseFilterAuto" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x04, 0xBB],
-						"name" : "Auto"},
-		"DigitalNoiseFilterAutoViz" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x02, 0x05, 0xBA],
-						"name" : "Auto Visualizer"},
-		
-		"MPEGNoiseFilterOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x00, 0xBE],
-						"name" : "Off"},
-		"MPEGNoiseFilterLow" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x01, 0xBD],
-						"name" : "Low"},
-		"MPEGNoiseFilterMedium" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x02, 0xBC],
-						"name" : "Medium"},
-		"MPEGNoiseFilterHigh" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x03, 0xBB],
-						"name" : "High"},
-		"MPEGNoiseFilterAuto" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x03, 0x04, 0xBA],
-						"name" : "Auto"},
-		
-		"HDMIBlackLevelNormal" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x04, 0x00, 0xBD],
-						"name" : "Normal"},
-		"HDMIBlackLevelLow" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x04, 0x01, 0xBC],
-						"name" : "Low"},
-		
-		"FilmModeOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x05, 0x00, 0xBC],
-						"name" : "Off"},
-		"FilmModeAuto1" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x05, 0x01, 0xBB],
-						"name" : "Auto 1"},
-		"FilmModeAuto2" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x05, 0x02, 0xBA],
-						"name" : "Auto 2"},
-		
-		"AutoMotionPlusOff" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x00, 0xBB],
-						"name" : "Off"},
-		"AutoMotionPlusClear" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x01, 0xBA],
-						"name" : "Clear"},
-		"AutoMotionPlusStandard" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x02, 0xB9],
-						"name" : "Standard"},
-		"AutoMotionPlusSmooth" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x03, 0xB8],
-						"name" : "Smooth"},
-		"AutoMotionPlusCustom" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x04, 0xB7],
-						"name" : "Custom"},
-		"AutoMotionPlusDemo" : { "command" : [0x08, 0x22, 0x0b, 0x0a, 0x06, 0x05, 0xB6],
-						"name" : "Demo"},
-		
-		"3DModeOff" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x00, 0xBF],
-						"name" : "Off"},
-		"3DMode2Dto3D" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x01, 0xBE],
-						"name" : "2D to 3D"},
-		"3DModeSideBySide" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x02, 0xBD],
-						"name" : "Side by Side"},
-		"3DModeTopBottom" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x03, 0xBC],
-						"name" : "Top / Bottom"},
-		"3DModeLineByLine" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x04, 0xBB],
-						"name" : "Line by Line"},
-		"3DModeVerticalLine" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x05, 0xBA],
-						"name" : "Vertical Line"},
-		"3DModeCheckerBD" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x06, 0xB9],
-						"name" : "Checkerboard"},
-		"3DModeFrameSequence" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x00, 0x07, 0xB8],
-						"name" : "Frame Sequence"},
-
-		"3D2DOff" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x01, 0x00, 0xBE],
-						"name" : "Off"},
-		"3D2DOn" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x01, 0x01, 0xBD],
-						"name" : "On"},
-
-		"3DAutoViewOff" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x05, 0x00, 0xBA],
-						"name" : "Off"},
-		"3DAutoViewMessageNotice" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x05, 0x01, 0xB9],
-						"name" : "Message Notice"},
-		"3DAutoViewOn" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x05, 0x02, 0xB8],
-						"name" : "On"},
-
-		"3DPictureCorrection" : { "command" : [0x08, 0x22, 0x0b, 0x0c, 0x04, 0x00, 0xBB],
-						"name" : "", "OneShot" : True},
-
-		"SRSTruSurroundOff" : { "command" : [0x08, 0x22, 0x0c, 0x02, 0x00, 0x00, 0xC8],
-						"name" : "Off"},
-		"SRSTruSurroundOn" : { "command" : [0x08, 0x22, 0x0c, 0x02, 0x00, 0x01, 0xC7],
-						"name" : "On"},
-		
-		"SRSTruDialogOff" : { "command" : [0x08, 0x22, 0x0c, 0x03, 0x00, 0x00, 0xC7],
-						"name" : "Off"},
-		"SRSTruDialogOn" : { "command" : [0x08, 0x22, 0x0c, 0x03, 0x00, 0x01, 0xC6],
-						"name" : "On"},
-		
-		"LanguageEnglish" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x00, 0xC6],
-						"name" : "English"},
-		"LanguageSpanish" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x01, 0xC5],
-						"name" : "Spanish"},
-		"LanguageFrench" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x02, 0xC4],
-						"name" : "French"},
-		"LanguageKorean" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x03, 0xC3],
-						"name" : "Korean"},
-		"LanguageJapanese" : { "command" : [0x08, 0x22, 0x0c, 0x04, 0x00, 0x04, 0xC2],
-						"name" : "Japanese"},
-		#maybe there are more languages?  dont' know...
-		
-		"MTSMono" : { "command" : [0x08, 0x22, 0x0c, 0x05, 0x00, 0x00, 0xC5],
-						"name" : "Mono"},
-		"MTSStereo" : { "command" : [0x08, 0x22, 0x0c, 0x05, 0x00, 0x01, 0xC4],
-						"name" : "Stereo"},
-		"MTSSAP" : { "command" : [0x08, 0x22, 0x0c, 0x05, 0x00, 0x02, 0xC3],
-						"name" : "SAP"},
-		
-		"AutoVolumeOff" : { "command" : [0x08, 0x22, 0x0c, 0x06, 0x00, 0x00, 0xC4],
-						"name" : "Off"},
-		"AutoVolumeNormal" : { "command" : [0x08, 0x22, 0x0c, 0x06, 0x00, 0x01, 0xC3],
-						"name" : "Normal"},
-		"AutoVolumeNight" : { "command" : [0x08, 0x22, 0x0c, 0x06, 0x00, 0x02, 0xC2],
-						"name" : "Night"},
-		
-		"SpeakerSelectTV" : { "command" : [0x08, 0x22, 0x0c, 0x07, 0x00, 0x00, 0xC3],
-						"name" : "Internal Speakers"},
-		"SpeakerSelectExternal" : { "command" : [0x08, 0x22, 0x0c, 0x07, 0x00, 0x01, 0xC2],
-						"name" : "External Speakers"},
-		
-		"TVModeCable" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x7B, 0x4E],
-						"name" : "Cable"},
-		"TVModeAntenna" : { "command" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x7D, 0x4C],
-						"name" : "Antenna"},
-
-		"ResetWhiteBalance" : { "command" : [0x08, 0x22, 0x0b, 0x07, 0x0d, 0x00, 0xB7],
-						"name" : "", "OneShot" : True},
-		"ResetPicture" : { "command" : [0x08, 0x22, 0x0b, 0x0b, 0x00, 0x00, 0xC0],
-						"name" : "", "OneShot" : True},
-		"ResetSound" : { "command" : [0x08, 0x22, 0x0c, 0x09, 0x00, 0x00, 0xC1],
-						"name" : "", "OneShot" : True},
-		"ResetEqualizer" : { "command" : [0x08, 0x22, 0x0c, 0x01, 0x06, 0x00, 0xC3],
-						"name" : "", "OneShot" : True}
-	}
+	#how many status queries a pipelined sweep keeps outstanding at once
+	statusPipelineDepth = 3
 
 	########################################
 	# Communication utility functions
 
 	######################
 	def checkSerial(self, dev):
-		if self.serialConns.get(dev.id) is not None:
-			junk = []
-			while self.serialConns[dev.id].in_waiting:
-				junk += self.serialConns[dev.id].read(1)
+		#the connection manager does the opening; all we do is pick up a port
+		#once it's ready, so a dead adapter fails the command straight away.
+		#Another device on the same port may have picked up a newer connection.
+		portKey = self.getPortKey(dev)
+		conn = self.connections.connection(portKey)
+		if conn is not None and self.serialConns.get(dev.id) is conn:
+			#anything waiting now arrived outside a request; take it without waiting
+			junk = bytearray(self.framers[dev.id].buffer)
+			try:
+				data = readBefore(conn, 0)
+				while len(data) > 0:
+					junk += bytearray(data)
+					data = readBefore(conn, 0)
+			except (serial.SerialException, IOError, OSError) as e:
+				self.connectionLost(dev, e)
+				return False
+			self.framers[dev.id].reset()
 			if len(junk) > 0:
+				self.stats.count(dev, "drainedBytes", len(junk))
 				length = str(len(junk))
-				self.logger.debug(dev.name+": Received "+length+" unexpected bytes: "+binascii.hexlify(bytearray(junk)))
+				self.logger.debug(dev.name+": Received "+length+" unexpected bytes: "+binascii.hexlify(junk))
+				framer = ExLinkFramer()
+				framer.feed(junk)
+				for frame in framer.frames():
+					self.unsolicitedFrame(dev, frame)
 			return True
 
+		if conn is None:
+			self.serialConns[dev.id] = None
+			health = self.connections.connect(portKey, dev.name, self.getPortName(dev), dev.id)
+			self.logger.info(dev.name+": serial port is "+health+"; command skipped")
+			return False
+		try:
+			conn.flushInput() # abundance of caution
+			conn.flushOutput() # abundance of caution
+		except (serial.SerialException, IOError, OSError) as e:
+			#closed again before we got to it
+			self.connectionLost(dev, e)
+			return False
+		self.serialConns[dev.id] = conn
+		self.framers[dev.id] = ExLinkFramer()
+
+		return True
+
+	######################
+	#called on the connection manager's thread
+	def openPort(self, name, portName):
+		self.logger.debug(name+": opening serial port "+portName)
+		#the port's settings never change after this; reads time out by deadline
+		conn = self.openSerial(name, portName, 9600, timeout=READ_SLICE)
+		if conn is not None and tuneSocket(conn):
+			self.logger.debug(name+": tuned network transport for "+portName)
+		return conn
+
+	######################
+	def connectionChanged(self, portKey, health):
+		if health == CONNECTED:
+			self.listenTo(portKey)
+		elif self.listener is not None:
+			self.listener.forget(portKey)
+		for devId, devicePort in list(self.devicePorts.items()):
+			if devicePort != portKey:
+				continue
+			dev = indigo.devices.get(devId)
+			if dev is not None and "connection" in dev.states:
+				self.updateState(dev, "connection", health)
+
+	######################
+	#the port failed in use; hand it back to the connection manager to reopen
+	def connectionLost(self, dev, error):
+		self.logger.error(dev.name+": serial port error: "+str(error))
+		self.serialConns[dev.id] = None
+		self.framers.pop(dev.id, None)
+		self.connections.lost(self.getPortKey(dev))
+
+	######################
+	# Like checkSerial, but also refuses straight away if the device's circuit
+	# breaker says the TV is off or not answering.  Once the breaker has cooled
+	# down, the short power query is used to see whether it's back.
+	def checkDevice(self, dev):
+		if not self.checkSerial(dev):
+			return False
+		breaker = self.getBreaker(dev)
+		if breaker.allow():
+			return True
+		if breaker.probeDue():
+			self.logger.debug(dev.name+": probing whether the TV is responding again")
+			if self.isPowerOn(dev):
+				return True
+		self.logger.info(dev.name+": TV is off or not responding; command skipped")
+		return False
+
+	######################
+	def getBreaker(self, dev):
+		breaker = self.breakers.get(dev.id)
+		if breaker is None:
+			breaker = CircuitBreaker()
+			#a TV we already believe is off starts out tripped
+			if self.getState(dev, "onOffState") is False:
+				breaker.failure()
+			breaker = self.breakers.setdefault(dev.id, breaker)
+		return breaker
+
+	######################
+	def getPortName(self, dev):
 		#we need to figure out the serial type to find the port path
 		portType = dev.pluginProps.get(u"devicePortFieldId_serialConnType", u"")
 		portName = dev.pluginProps.get(u"devicePortFieldId_serialPortLocal", u"")
@@ -734,28 +1254,98 @@ class Plugin(indigo.PluginBase):
 			portName = dev.pluginProps.get(u"devicePortFieldId_serialPortNetRfc2217", u"")
 		elif portType == "netSocket":
 			portName = dev.pluginProps.get(u"devicePortFieldId_serialPortNetSocket", u"")
-		self.logger.info(dev.name+": opening serial port "+portName)
-		self.serialConns[dev.id] = self.openSerial(dev.name, portName, 9600,
-			timeout=self.defaultSerialTimeout)
-		if self.serialConns[dev.id] is None:
-			self.logger.error(u"unable to open serial port for device \""+dev.name+"\"")
+		return portName
+
+	######################
+	#Identifies the physical line behind a device, so that devices configured
+	#with the same port (however it's spelled) share one connection.
+	def getPortKey(self, dev):
+		portKey = self.devicePorts.get(dev.id)
+		if portKey is not None:
+			return portKey
+		portName = self.getPortName(dev).strip()
+		if "://" not in portName:
+			return os.path.realpath(portName) if portName else portName
+		#scheme://host:port; options after the ? don't change which line it is
+		scheme, address = portName.split("://", 1)
+		address = address.split("?", 1)[0].rstrip("/")
+		return scheme.lower()+"://"+address.lower()
+
+	######################
+	def closeSerial(self, dev, portKey=None):
+		if portKey is None:
+			portKey = self.getPortKey(dev)
+		self.serialConns[dev.id] = None
+		self.framers.pop(dev.id, None)
+		self.connections.release(portKey, dev.id)
+
+	######################
+	#name is the query or command being sent, for the timing statistics
+	def writeFrame(self, dev, packet, name=None):
+		try:
+			self.serialConns[dev.id].write(packet)
+			now = time.time()
+			self.lastWrites[dev.id] = (name, now)
+			if name not in self.queries:
+				self.lastChanges[dev.id] = now
+			return True
+		except (serial.SerialException, IOError, OSError) as e:
+			self.connectionLost(dev, e)
 			return False
-		else:
-			self.serialConns[dev.id].flushInput() # abundance of caution
-			self.serialConns[dev.id].flushOutput() # abundance of caution
 
-		return True
+	########################################
+	#Returns the next complete, checksum-checked frame (ack or status reply) from
+	#the device, or an empty bytearray if `deadline` (a time.time() value) passed
+	#first.  Each read waits for data to arrive and takes all of it in one go.
+	#The port itself is never reconfigured, so waits of different lengths cost
+	#the same and can share one port.
+	def readFrame(self, dev, deadline):
+		conn = self.serialConns.get(dev.id)
+		if conn is None:
+			return bytearray()
+		framer = self.framers[dev.id]
+		frame = framer.nextFrame()
+		while frame is None:
+			try:
+				data = readBefore(conn, deadline)
+			except (serial.SerialException, IOError, OSError) as e:
+				self.connectionLost(dev, e)
+				return bytearray()
+			if len(data) == 0:
+				return bytearray()
+			framer.feed(data)
+			frame = framer.nextFrame()
+		if framer.badFrames:
+			self.stats.count(dev, "badCrc", framer.badFrames)
+			framer.badFrames = 0
+		return frame
 
 	########################################
 	def waitForAck(self, dev):
+		name, written = self.lastWrites.get(dev.id, (None, None))
+		probe = name in self.probeCommands
+		timeout = self.probeTimeout(dev) if probe else self.ackTimeout(dev)
 		if self.serialConns.get(dev.id) is not None:
-			reply = []
-			reply += self.serialConns[dev.id].read(3)
-			if bytearray(reply) == bytearray(self.responses["ACK"]):
-				self.logger.debug(dev.name+": Command ack received: "+binascii.hexlify(bytearray(reply)))
+			deadline = (written or time.time()) + timeout
+			reply = self.readFrame(dev, deadline)
+			#a status reply here is a leftover from an earlier query; skip it
+			while len(reply) == self.responseDataLength:
+				self.logger.debug(dev.name+": stale reply "+binascii.hexlify(reply))
+				self.unsolicitedFrame(dev, reply)
+				reply = self.readFrame(dev, deadline)
+			if reply == exlinkcodec.ACK_FRAME:
+				self.logger.debug(dev.name+": Command ack received: "+binascii.hexlify(reply))
+				if name is not None:
+					self.recordLatency(dev, ACK, name, time.time() - written)
+				self.getBreaker(dev).success()
 				return True
-		if self.serialConns[dev.id].timeout != self.powerSerialTimeout:
+		if self.serialConns.get(dev.id) is None:
+			#the port went away; that's not the TV's fault
+			return False
+		if not probe:
 			self.logger.warn(dev.name+": Command not acknowledged")
+			self.recordTimeout(dev, ACK, name or "unnamed")
+			self.getBreaker(dev).failure()
 		else:
 			self.logger.debug(dev.name+": Power query not acknowleged; device must be off.")
 
@@ -768,268 +1358,510 @@ class Plugin(indigo.PluginBase):
 			return
 			
 		if self.serialConns.get(dev.id) is not None:
-			length = str(len(self.queries[query]))
-			self.logger.debug(dev.name+": writing "+length+" bytes: "+
-						binascii.hexlify(bytearray(self.queries[query])))
-			self.serialConns[dev.id].write(bytearray(self.queries[query]))
-			if self.waitForAck(dev):
-				reply = []
-				reply += self.serialConns[dev.id].read(self.responseDataLength)
+			packet = exlinkcodec.QUERY_FRAMES[query]
+			self.logger.debug(dev.name+": writing "+str(len(packet))+" bytes: "+binascii.hexlify(packet))
+			if self.writeFrame(dev, packet, query) and self.waitForAck(dev):
+				acked = time.time()
+				deadline = acked + self.replyTimeout(dev, query)
+				reply = self.readFrame(dev, deadline)
+				#skip anything that isn't the reply to this query: a late or
+				#repeated ack, or a status frame meant for someone else
+				while len(reply) > 0 and exlinkcodec.replyQuery(reply) != query:
+					if reply == exlinkcodec.ACK_FRAME:
+						self.logger.debug(dev.name+": stale ack "+binascii.hexlify(reply))
+					else:
+						self.logger.debug(dev.name+": unexpected frame "+binascii.hexlify(reply))
+						self.unsolicitedFrame(dev, reply)
+					reply = self.readFrame(dev, deadline) if time.time() < deadline else bytearray()
+				if len(reply) > 0:
+					self.recordLatency(dev, REPLY, query, time.time() - acked)
+				elif self.serialConns.get(dev.id) is not None:
+					self.recordTimeout(dev, REPLY, query)
 				length = str(len(reply))
 				self.logger.debug(dev.name+": query \""+query+"\" returned "+length+" bytes: "+
-							binascii.hexlify(bytearray(reply)))
+							binascii.hexlify(reply))
 				return reply
 
+		return bytearray()
+
+	########################################
+	#Writes up to statusPipelineDepth queries before waiting on any reply, and
+	#matches replies to queries by their type byte rather than by arrival order.
+	#Returns the queries that didn't get a usable answer; any left unsent because
+	#yieldTo() asked to make way don't count.  Queries in `waiting` are added as
+	#the answers they wait on let them through (see exlinkplanner.release).
+	def pipelineQueries(self, dev, queries, yieldTo=None, waiting=None):
+		if waiting is None:
+			waiting = []
+		pending = list(queries)
+		inFlight = []
+		#the TV acks in the order it was written to, so each ack belongs to the
+		#oldest query that hasn't had one yet.  It works through them one at a
+		#time, so an ack is timed from its write or the frame before it,
+		#whichever came later.
+		unacked = []
+		acked = {}
+		lastFrame = 0
+		while pending or inFlight:
+			while pending and len(inFlight) < self.statusPipelineDepth:
+				if yieldTo is not None and yieldTo():
+					#what's in flight is still read; the rest just isn't sent
+					del pending[:]
+					break
+				query = pending.pop(0)
+				packet = exlinkcodec.QUERY_FRAMES[query]
+				self.logger.debug(dev.name+": pipelining query \""+query+"\": "+binascii.hexlify(packet))
+				if not self.writeFrame(dev, packet, query):
+					return [query] + inFlight + pending
+				inFlight.append(query)
+				unacked.append((query, time.time()))
+			if not inFlight:
+				break
+
+			timeout = max([self.ackTimeout(dev)] + [self.replyTimeout(dev, query) for query in inFlight])
+			frame = self.readFrame(dev, time.time() + timeout)
+			now = time.time()
+			if frame == exlinkcodec.ACK_FRAME:
+				if unacked:
+					query, written = unacked.pop(0)
+					acked[query] = now
+					self.recordLatency(dev, ACK, query, now - max(written, lastFrame))
+				lastFrame = now
+				continue
+			if len(frame) == 0:
+				self.logger.debug(dev.name+": pipelined sweep timed out waiting on "+", ".join(inFlight))
+				if self.serialConns.get(dev.id) is not None:
+					for query in inFlight:
+						self.recordTimeout(dev, REPLY if query in acked else ACK, query)
+				return inFlight + pending
+			lastFrame = now
+
+			query = self.queryTypes.get(frame[5])
+			if query not in inFlight:
+				self.logger.debug(dev.name+": unexpected reply "+binascii.hexlify(frame))
+				self.unsolicitedFrame(dev, frame)
+				continue
+			inFlight.remove(query)
+			if query in acked:
+				self.recordLatency(dev, REPLY, query, now - acked.pop(query))
+			self.logger.debug(dev.name+": query \""+query+"\" returned "+binascii.hexlify(frame))
+			self.updateStatus(dev, query, frame)
+			pending.extend(self.releaseQueries(dev, query, waiting, queries))
+
 		return []
 
+	########################################
+	#Sends a run of (name, frame) commands, keeping up to statusPipelineDepth
+	#written ahead of their acks when the TV copes with pipelining.  Commands
+	#are acked in the order they're written, and the run stops at the first
+	#one that isn't.  Returns (names acked, names that failed or weren't sent).
+	def pipelineCommands(self, dev, commands):
+		depth = self.statusPipelineDepth if self.canPipeline(dev) else 1
+		pending = list(commands)
+		unacked = []
+		acked = []
+		lastFrame = 0
+		while pending or unacked:
+			while pending and len(unacked) < depth:
+				name, packet = pending.pop(0)
+				self.logger.debug(dev.name+": sending "+name+": "+binascii.hexlify(packet))
+				if not self.writeFrame(dev, packet, name):
+					return acked, [name for name, written in unacked] + [name] + [name for name, packet in pending]
+				unacked.append((name, time.time()))
+
+			name, written = unacked[0]
+			frame = self.readFrame(dev, max(written, lastFrame) + self.ackTimeout(dev))
+			now = time.time()
+			if frame == exlinkcodec.ACK_FRAME:
+				unacked.pop(0)
+				acked.append(name)
+				self.recordLatency(dev, ACK, name, now - max(written, lastFrame))
+				lastFrame = now
+				continue
+			if len(frame) > 0:
+				#a status reply left over from an earlier query
+				self.logger.debug(dev.name+": stale reply "+binascii.hexlify(frame))
+				self.unsolicitedFrame(dev, frame)
+				continue
+
+			failed = [name for name, written in unacked] + [name for name, packet in pending]
+			if self.serialConns.get(dev.id) is not None:
+				self.logger.warn(dev.name+": Command "+name+" not acknowledged")
+				self.recordTimeout(dev, ACK, name)
+				self.getBreaker(dev).failure()
+			return acked, failed
+
+		if acked:
+			self.getBreaker(dev).success()
+		return acked, []
+
 	########################################
 	def calculateChecksum(self, commandArray):
-		sum = 0
-		for i in commandArray:
-			sum += i
-		CRC = (0x100 - sum) & 0xFF
-		return CRC
+		return exlinkcodec.checksum(commandArray)
 		
 	########################################
 	def validateChecksum(self, response):
-		if len(response) < 3:
-			return False
-		checksum = ord(response[-1])
-		sum = 0
-		for i in response[0:-1]:
-			sum = (sum + ord(i)) & 0xFF
-
-		if ord(response[-1]) == ((0x100 - sum) & 0xFF):
-			return True
-
-		return False
+		return exlinkcodec.checksumOK(response)
 		
 	########################################
-	def sendIntegerCommand(self, dev, command, value):
+	#force sends it even if the shadow register says the TV already has it
+	def sendIntegerCommand(self, dev, command, value, force=False):
 		if command not in self.integerCommands:
 			self.logger.error(dev.name+": Invalid integer command "+command)
 			return
-			
-		cmdPacket = list(self.integerCommands[command]["command"])
-		if self.checkSerial(dev):
-			cmdPacket.append(value)
-			cmdPacket.append(self.calculateChecksum(cmdPacket))
+
+		if not force and self.shadow.current(dev.id, command, value):
+			self.logger.debug(dev.name+": %s is already %s; not sent" % (command, str(value)))
+			return True
+
+		if not self.supports(dev, command):
+			self.logger.warn(dev.name+": TV doesn't support "+command+"; not sent")
+			return False
+
+		if self.checkDevice(dev):
+			cmdPacket = exlinkcodec.encodeInteger(command, value)
 			self.logger.info(dev.name+": Sending %s = %s " % (command, str(value)))
-			self.logger.debug(dev.name+": writing "+str(len(cmdPacket))+" bytes: "+binascii.hexlify(bytearray(cmdPacket)))
-			self.serialConns[dev.id].write(bytearray(cmdPacket))
-			if self.waitForAck(dev):
+			self.logger.debug(dev.name+": writing "+str(len(cmdPacket))+" bytes: "+binascii.hexlify(cmdPacket))
+			if self.writeFrame(dev, cmdPacket, command) and self.waitForAck(dev):
+				self.shadow.written(dev.id, command, value)
+				self.publishShadow(dev)
 				return True
 			else:
+				self.shadow.forget(dev.id, command, value)
 				self.logger.error(dev.name+": Command "+command+" not acknowledged")
 				return False
 				
 	########################################
-	def sendEnumCommand(self, dev, command):
+	def sendEnumCommand(self, dev, command, force=False):
 		if command not in self.enumCommands:
 			self.logger.error(dev.name+": Invalid enum command "+command)
 			return
-			
-		if self.checkSerial(dev):
+
+		if not force and self.shadow.current(dev.id, command):
+			self.logger.debug(dev.name+": "+command+" is already set; not sent")
+			return True
+
+		if not self.supports(dev, command):
+			self.logger.warn(dev.name+": TV doesn't support "+command+"; not sent")
+			return False
+
+		#power commands have to get through to a TV that's off
+		if command in ("PowerOn", "PowerOff"):
+			ready = self.checkSerial(dev)
+		else:
+			ready = self.checkDevice(dev)
+		if ready:
+			packet = exlinkcodec.ENUM_FRAMES[command]
 			self.logger.info(dev.name+": Sending "+command)
-			self.logger.debug(dev.name+": writing "+str(len(self.enumCommands[command]["command"]))+
-						" bytes: "+binascii.hexlify(bytearray(self.enumCommands[command]["command"])))
-			self.serialConns[dev.id].write(bytearray(self.enumCommands[command]["command"]))
-			if self.waitForAck(dev):
+			self.logger.debug(dev.name+": writing "+str(len(packet))+" bytes: "+binascii.hexlify(packet))
+			if self.writeFrame(dev, packet, command) and self.waitForAck(dev):
+				acked = time.time()
+				self.shadow.written(dev.id, command)
+				self.publishShadow(dev)
 				#Do we need a delay here ?
 				if (command.startswith("3D")):
-					self.update3dMode(dev);
+					self.readBack(dev, "3D_MODE", acked);
 
 				return True
 			else:
+				self.shadow.forget(dev.id, command)
 				self.logger.error(dev.name+": Command "+command+" not acknowledged")
 				return False
 
 
 	########################################
 	# Device state inquiries/updaters
-	# Many of these are quite similar; perhaps they should be refactored
+	# All replies go through decodeReply/updateStatus; the updateX methods are
+	# kept as shorthand for callers.  The updaters take an optional reply so a
+	# pipelined sweep can hand them one it has already read; otherwise they
+	# send their own query.  Every answer is timestamped by the device's
+	# PollSchedule, so refreshStates and readBack only ask for what hasn't been
+	# heard recently.
+	#
+	# Queries are also single-flight: work that was queued while the same query
+	# was in flight or waiting to go shares its answer instead of asking again
+	# (see answeredSince).
+
+	#state name -> the query that reads it
+	stateQueries = dict([(state, query) for query, (state, label) in statusStates.items()] + [("onOffState", "POWER")])
+
+	########################################
+	#when the command running on this thread was asked for; now if this isn't
+	#a port worker
+	def askedAt(self):
+		worker = threading.current_thread()
+		if isinstance(worker, PortWorker):
+			command = worker.current
+			if command is not None:
+				return command.queuedAt
+		return time.time()
+
+	########################################
+	#True if the TV answered `query` after the running command was asked for
+	#and nothing that could change the answer has been sent since, so that
+	#answer can be shared rather than asked for again
+	def answeredSince(self, dev, query):
+		since = max(self.askedAt(), self.lastChanges.get(dev.id, 0))
+		if self.getPollSchedule(dev).stale([query], time.time() - since):
+			return False
+		self.logger.debug(dev.name+": sharing the "+query+" answer read since this was asked for")
+		self.stats.count(dev, "sharedQueries")
+		return True
+
+	########################################
+	def requestStatus(self, dev):
+		batched = self.beginStates(dev)
+		try:
+			if self.checkSerial(dev) and self.isPowerOn(dev):
+				self.logger.debug(dev.name+": Serial is OK and device is ON: querying additional status info")
+				self.updateState(dev, "onOffState", True)
+				self.queryStatus(dev, self.statusQueries)
+			else:
+				self.updateState(dev, "onOffState", False)
+		finally:
+			if batched:
+				self.commitStates(dev)
+
+	########################################
+	def refreshStatus(self, action):
+		dev = indigo.devices[action.deviceId]
+		states = action.props.get("States", [])
+		if isinstance(states, basestring):
+			states = [state.strip() for state in states.split(",")]
+		unknown = [state for state in states if state not in self.stateQueries]
+		if unknown:
+			self.logger.error(dev.name+": can't refresh "+", ".join(unknown))
+			return
+		try:
+			maxAge = float(action.props.get("MaxAge", 0))
+		except ValueError:
+			self.logger.error(dev.name+": \""+str(action.props.get("MaxAge"))+"\" is not a number of seconds")
+			return
+
+		self.queueScheduled(dev, READBACK, None, self.refreshStates, dev, list(states), maxAge)
+
+	########################################
+	#Queries whichever of the given states weren't read in the last maxAge
+	#seconds.  Returns the queries it sent.
+	def refreshStates(self, dev, states, maxAge):
+		queries = self.getPollSchedule(dev).stale(set(self.stateQueries[state] for state in states), maxAge)
+		if not queries:
+			self.logger.debug(dev.name+": "+", ".join(states)+" read in the last %g s; nothing to refresh" % maxAge)
+			return []
+		batched = self.beginStates(dev)
+		try:
+			if "POWER" in queries:
+				queries.remove("POWER")
+				if not self.checkSerial(dev):
+					return []
+				on = self.isPowerOn(dev)
+				self.updateState(dev, "onOffState", on)
+				if not on:
+					return ["POWER"]
+				queries.insert(0, "POWER")
+			others = [query for query in self.statusQueries if query in queries]
+			if others and self.checkDevice(dev):
+				self.logger.debug(dev.name+": refreshing "+", ".join(others))
+				self.queryStatus(dev, others)
+			return queries
+		finally:
+			if batched:
+				self.commitStates(dev)
+
+	########################################
+	#Reads a state back after a change made at `since`, unless it has been
+	#heard since (the TV reported it, or another read got there first)
+	def readBack(self, dev, query, since):
+		if not self.supports(dev, query) or self.planQueries(dev, [query])[2]:
+			return None
+		if not self.getPollSchedule(dev).stale([query], time.time() - since):
+			self.logger.debug(dev.name+": "+query+" already read since the change")
+			self.stats.count(dev, "sharedQueries")
+			return self.getState(dev, self.statusStates[query][0])
+		#the port may have gone, or been reopened, since this was queued
+		if not self.checkSerial(dev):
+			return None
+		#an answer from before `since` mustn't be shared, so always ask
+		return self.updateStatus(dev, query, self.sendQuery(dev, query))
+
+	########################################
+	#yieldTo, if given, is asked before each query is sent; once it returns
+	#True the rest aren't
+	def queryStatus(self, dev, queries, yieldTo=None):
+		queries = [query for query in queries if self.supports(dev, query) and not self.answeredSince(dev, query)]
+		queries, waiting, skipped = self.planQueries(dev, queries)
+		if not queries:
+			return
+		if self.canPipeline(dev):
+			self.pipelinedStatus(dev, queries, yieldTo, waiting)
+		else:
+			self.lockstepStatus(dev, queries, yieldTo, waiting)
+
+	########################################
+	def canPipeline(self, dev):
+		if dev.id in self.lockstepDevices:
+			return False
+		return dev.pluginProps.get("pipelineStatus", True)
+
+	########################################
+	def pipelinedStatus(self, dev, queries, yieldTo=None, waiting=None):
+		waiting = list(waiting or [])
+		unanswered = self.pipelineQueries(dev, queries, yieldTo, waiting)
+		if len(unanswered) == 0:
+			return
+
+		#let any stragglers arrive, throw them away and finish the job one query
+		#at a time.  If that works where pipelining didn't, the TV can't take it.
+		time.sleep(self.powerSerialTimeout)
+		if not self.checkSerial(dev):
+			return
+		if self.lockstepStatus(dev, unanswered, yieldTo, waiting) > 0:
+			self.logger.info(dev.name+": TV does not handle pipelined status queries; using lock-step")
+			self.lockstepDevices.add(dev.id)
+
+	########################################
+	#one query at a time, each waiting for its reply.  Returns the number that were answered.
+	def lockstepStatus(self, dev, queries, yieldTo=None, waiting=None):
+		answered = 0
+		sweep = list(queries)
+		queries = list(queries)
+		waiting = list(waiting or [])
+		while queries:
+			if yieldTo is not None and yieldTo():
+				break
+			query = queries.pop(0)
+			reply = self.sendQuery(dev, query)
+			if len(reply) > 0:
+				answered += 1
+			self.updateStatus(dev, query, reply)
+			queries[0:0] = self.releaseQueries(dev, query, waiting, sweep)
+		return answered
 
 	########################################
 	def isPowerOn(self, dev):
-		#reduce serial read timeout before querying power so we don't wait forever
-		#when the device is off
-		self.serialConns[dev.id].timeout = self.powerSerialTimeout
+		#power is a probe (see probeCommands), so a TV that's off doesn't
+		#keep us waiting long
+		if self.answeredSince(dev, "POWER"):
+			return self.getPollSchedule(dev).powerOn is True
 		reply = self.sendQuery(dev, "POWER")
-		self.serialConns[dev.id].timeout = self.defaultSerialTimeout
-		if bytearray(reply) == bytearray(self.responses["POWER"]):
+		return self.powerReply(dev, reply)
+
+	########################################
+	#what a power query's reply (empty if there was none) says about the TV
+	def powerReply(self, dev, reply):
+		if reply == exlinkcodec.POWER_REPLY:
 			self.logger.info(dev.name+": Acknowledges power ON")
+			self.getPollSchedule(dev).recordPower(True)
+			self.getBreaker(dev).success()
 			return True
 		elif len(reply) > 0:
 			self.logger.info(dev.name+": unexpected response, but it must be on")
+			self.getPollSchedule(dev).recordPower(True)
+			self.getBreaker(dev).success()
 			return True;
 		else:
+			self.getPollSchedule(dev).recordPower(False)
+			self.getBreaker(dev).failure()
 			return False
 
 	########################################
-	def updateInput(self, dev):
-		reply = self.sendQuery(dev, "INPUT")
-		for input in self.inputs:
-			if self.inputs[input].get("response") is not None and bytearray(reply[-8:]) == bytearray(self.inputs[input]["response"]):
-				self.logger.info(dev.name+": Active input is "+input)
-				dev.updateStateOnServer("input", input)
-				return
-			#this whole response architecture could be a lot less unwieldy, but I'm not
-			#going to do a major refactor for a point release.
-			#TODO: make less dumb
-			if self.inputs[input].get("response2") is not None and bytearray(reply[-8:]) == bytearray(self.inputs[input]["response2"]):
-				self.logger.info(dev.name+": Active input is "+input)
-				dev.updateStateOnServer("input", input)
-				return
-		
-		if self.validateChecksum(reply):
-			self.logger.warn(u"Input query of \""+dev.name+"\" returned unrecognized response "+binascii.hexlify(bytearray(reply)))
-			self.logger.warn(u"Please let the author know what input this is!")
-			self.logger.warn(u"Send details to jon@oldefortran.com")
-		else:
-			self.logger.error(dev.name+": Input query response bad CRC: "+binascii.hexlify(bytearray(reply)))
-
-			dev.updateStateOnServer("input", "UNKNOWN")		
+	#Decodes any 13-byte status reply into a StatusReply(state, value, query),
+	#or None if the reply is damaged or isn't one we know
+	def decodeReply(self, reply):
+		return exlinkcodec.decodeReply(reply)
 
 	########################################
-	def updatePictureMode(self, dev):
-		reply = self.sendQuery(dev, "PICTURE_MODE")
-		for mode in self.pictureModes:
-			if bytearray(reply[-8:]) == bytearray(self.pictureModes[mode]["response"]):
-				if mode.startswith("MODE"):
-					self.logger.warn(u"Current Picture Mode on \""+dev.name+"\" is "+mode)
-					self.logger.warn(u"Please let the author know what your TV calls this mode!")
-					self.logger.warn(u"Send details to jon@oldefortran.com")
-				else:
-					self.logger.info(dev.name+": Current Picture Mode is "+mode)
-				dev.updateStateOnServer("pictureMode", mode)
-				return
-		
+	def updateStatus(self, dev, query, reply=None):
+		if reply is None:
+			if not self.supports(dev, query):
+				return None
+			if self.answeredSince(dev, query):
+				return self.getState(dev, self.statusStates[query][0])
+			reply = self.sendQuery(dev, query)
+		state, label = self.statusStates[query]
+		if not reply:
+			#the TV didn't answer (sendQuery has counted the timeout), so there's
+			#nothing to say about the state
+			self.logger.debug(dev.name+": no reply to "+label+" query")
+			return None
+		decoded = self.decodeReply(reply)
+		if decoded is not None and decoded.state == state:
+			value = decoded.value
+			if state in self.selectionKinds:
+				self.learnedSupport(dev, self.selectionKinds[state]+" "+str(value))
+			if str(value).startswith("MODE"):
+				self.logger.warn(u"Current "+label+" on \""+dev.name+"\" is "+value)
+				self.logger.warn(u"Please let the author know what your TV calls this mode!")
+				self.logger.warn(u"Send details to jon@oldefortran.com")
+			else:
+				self.logger.info(dev.name+": Current "+label+" is "+str(value))
+			self.getPollSchedule(dev).record(query, self.updateState(dev, state, value))
+			return value
+
 		if self.validateChecksum(reply):
-			#unknown mode
-			self.logger.warn(dev.name+": Picture Mode returned unknown response "+binascii.hexlify(bytearray(reply)))
+			self.stats.count(dev, "unknownResponses")
+			self.logger.warn(dev.name+": "+label+" query returned unrecognized response "+binascii.hexlify(bytearray(reply)))
+			if state == "input":
+				self.logger.warn(u"Please let the author know what input this is!")
+				self.logger.warn(u"Send details to jon@oldefortran.com")
 		else:
-			self.logger.error(dev.name+": Picture Mode query response bad CRC: "+binascii.hexlify(bytearray(reply)))
+			self.logger.error(dev.name+": "+label+" query response bad CRC: "+binascii.hexlify(bytearray(reply)))
 
-		dev.updateStateOnServer("pictureMode", "UNKNOWN")
+		#Should we add placeholders for unknown sizes?
+		if state in self.unknownStates:
+			self.updateState(dev, state, "UNKNOWN")
+		return None
 
 	########################################
-	def updateSoundMode(self, dev):
-		reply = self.sendQuery(dev, "SOUND_MODE")
-		for mode in self.soundModes:
-			if bytearray(reply[-8:]) == bytearray(self.soundModes[mode]["response"]):
-				if mode.startswith("MODE"):
-					self.logger.warn(u"Current Sound Mode on \""+dev.name+"\" is "+mode)
-					self.logger.warn(u"Please let the author know what your TV calls this mode!")
-					self.logger.warn(u"Send details to jon@oldefortran.com")
-				else:
-					self.logger.info(dev.name+": Current Sound Mode is "+mode)
-				dev.updateStateOnServer("soundMode", mode)
-				return
-		
-		if self.validateChecksum(reply):
-			#unknown mode
-			self.logger.warn(dev.name+": Sound Mode returned unknown response "+binascii.hexlify(bytearray(reply)))
-		else:
-			self.logger.error(dev.name+": Sound Mode query response bad CRC: "+binascii.hexlify(bytearray(reply)))
-
-		dev.updateStateOnServer("soundMode", "UNKNOWN")
+	def updateInput(self, dev, reply=None):
+		return self.updateStatus(dev, "INPUT", reply)
 
 	########################################
-	def updatePictureSize(self, dev):
-		reply = self.sendQuery(dev, "PICTURE_SIZE")
-		for mode in self.pictureSizes:
-			if bytearray(reply[-8:]) == bytearray(self.pictureSizes[mode]["response"]):
-				self.logger.info(dev.name+": Current Picture Size is "+mode)
-				#Should we add placeholders for unknown sizes?
-				dev.updateStateOnServer("pictureSize", mode)
-				return
-		
-		if self.validateChecksum(reply):
-			#unknown mode
-			self.logger.warn(dev.name+": Picture Size returned unknown response "+binascii.hexlify(bytearray(reply)))
-		else:
-			self.logger.error(dev.name+": Picture Size query response bad CRC: "+binascii.hexlify(bytearray(reply)))
+	def updatePictureMode(self, dev, reply=None):
+		return self.updateStatus(dev, "PICTURE_MODE", reply)
 
-		dev.updateStateOnServer("pictureSize", "UNKNOWN")
+	########################################
+	def updateSoundMode(self, dev, reply=None):
+		return self.updateStatus(dev, "SOUND_MODE", reply)
 
 	########################################
-	def update3dMode(self, dev):
-		reply = self.sendQuery(dev, "3D_MODE")
-		for mode in self.ThreeDmodes:
-			if bytearray(reply[-8:]) == bytearray(self.ThreeDmodes[mode]["response"]):
-				if mode.startswith("MODE"):
-					self.logger.warn(u"Current 3D Mode on \""+dev.name+"\" is "+mode)
-					self.logger.warn(u"Please let the author know what your TV calls this mode!")
-					self.logger.warn(u"Send details to jon@oldefortran.com")
-				else:
-					self.logger.info(dev.name+": Current 3D Mode on is "+mode)
-				dev.updateStateOnServer("Mode3D", mode)
-				return
+	def updatePictureSize(self, dev, reply=None):
+		return self.updateStatus(dev, "PICTURE_SIZE", reply)
 
-		if self.validateChecksum(reply):
-			#unknown mode
-			self.logger.warn(dev.name+": 3D Mode returned unknown response "+binascii.hexlify(bytearray(reply)))
-		else:
-			self.logger.error(dev.name+": 3D Mode query response bad CRC: "+binascii.hexlify(bytearray(reply)))
+	########################################
+	def update3dMode(self, dev, reply=None):
+		return self.updateStatus(dev, "3D_MODE", reply)
 
 	########################################
-	def updateChannel(self, dev):
-		reply = self.sendQuery(dev, "CHANNEL")
-		if self.validateChecksum(reply):
-			#value is in byte 9
-			val = str(ord(reply[9]))
-			self.logger.info(dev.name+": Current Channel on is "+val)
-			#value is an integer state
-			dev.updateStateOnServer("channel", val)
-		else:
-			self.logger.error(dev.name+": Channel query response bad CRC: "+binascii.hexlify(bytearray(reply)))
+	def updateChannel(self, dev, reply=None):
+		return self.updateStatus(dev, "CHANNEL", reply)
 
 	########################################
-	def updateVolume(self, dev):
-		reply = self.sendQuery(dev, "VOLUME")
-		if self.validateChecksum(reply):
-			#value is in byte 9
-			val = str(ord(reply[9]))
-			self.logger.info(dev.name+": Current Volume is "+val)
-			#value is an integer state
-			dev.updateStateOnServer("volume", val)
-		else:
-			self.logger.error(dev.name+": Volume query response bad CRC: "+binascii.hexlify(bytearray(reply)))
+	def updateVolume(self, dev, reply=None):
+		return self.updateStatus(dev, "VOLUME", reply)
 
 	########################################
-	def updateMute(self, dev):
-		reply = self.sendQuery(dev, "MUTE")
-		if self.validateChecksum(reply):
-			#value is in byte 9
-			val = (ord(reply[9]) == 1)
-			self.logger.info(dev.name+": Current Mute is "+str(val))
-			#mute is a boolean state
-			dev.updateStateOnServer("mute", val)
-		else:
-			self.logger.error(dev.name+": Mute query response bad CRC: "+binascii.hexlify(bytearray(reply)))
+	def updateMute(self, dev, reply=None):
+		return self.updateStatus(dev, "MUTE", reply)
 
 	########################################
 	# Device commands : two-way synchronized
+	# These run on the device's worker thread; see queueCommand
 
 	########################################
 	def powerOff(self, dev):
-		self.serialLocks[dev.id].acquire()
 		if self.checkSerial(dev):
-			#reduce serial read timeout because if the TV is already off it won't
-			#  ack the command and we don't want to hang the server
-			self.serialConns[dev.id].timeout = self.powerSerialTimeout
+			#if the TV is already off it won't ack; PowerOff is a probe (see
+			#probeCommands) so that doesn't hang the worker
 			self.sendEnumCommand(dev, "PowerOff")
-			dev.updateStateOnServer("onOffState", False)
-			self.serialConns[dev.id].timeout = self.defaultSerialTimeout
-		self.serialLocks[dev.id].release()
+			self.updateState(dev, "onOffState", False)
+			self.getBreaker(dev).failure()
 			
 	########################################
 	def powerOn(self, dev):
-		self.serialLocks[dev.id].acquire()
 		if self.checkSerial(dev):
 			if self.sendEnumCommand(dev, "PowerOn"):
-				dev.updateStateOnServer("onOffState", True)
-		self.serialLocks[dev.id].release()
+				self.updateState(dev, "onOffState", True)
 	
 	########################################
 	def selectInput(self, action):
@@ -1039,17 +1871,23 @@ class Plugin(indigo.PluginBase):
 			self.logger.error(input+" is not a valid input")
 			return
 			
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
+		self.queueCommand(dev, self.runSelectInput, dev, input)
+
+	########################################
+	def runSelectInput(self, dev, input):
+		if not self.supports(dev, "Input "+input):
+			self.logger.warn(dev.name+": TV doesn't support input "+input)
+			return
+		if self.checkDevice(dev):
 			try:
 				self.logger.debug(dev.name+": selecting input "+input)
-				self.serialConns[dev.id].write(bytearray(self.inputs[input]["command"]))
-				self.waitForAck(dev)
-				self.updateInput(dev)
+				if self.writeFrame(dev, exlinkcodec.INPUT_FRAMES[input], "Input "+input):
+					self.waitForAck(dev)
+					acked = time.time()
+					self.readBack(dev, "INPUT", acked)
 			except:
 				self.logger.error("Plugin internal error changing input")
 				pass
-		self.serialLocks[dev.id].release()
 
 	########################################
 	def setPictureMode(self, action):
@@ -1059,19 +1897,24 @@ class Plugin(indigo.PluginBase):
 			self.logger.error(mode+" is not a valid picture mode")
 			return
 			
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
+		self.queueCommand(dev, self.runSetPictureMode, dev, mode)
+
+	########################################
+	def runSetPictureMode(self, dev, mode):
+		if not self.supports(dev, "PictureMode "+mode):
+			self.logger.warn(dev.name+": TV doesn't support picture mode "+mode)
+			return
+		if self.checkDevice(dev):
 			try:
 				self.logger.debug(dev.name+": selecting picture mode "+mode)
-				self.serialConns[dev.id].write(bytearray(self.pictureModes[mode]["command"]))
-				self.waitForAck(dev)
-				self.updatePictureMode(dev)
+				if self.writeFrame(dev, exlinkcodec.PICTURE_MODE_FRAMES[mode], "PictureMode "+mode):
+					self.waitForAck(dev)
+					acked = time.time()
+					self.readBack(dev, "PICTURE_MODE", acked)
 			except:
 				self.logger.error("Plugin internal error updating picture mode")
 				pass
 
-		self.serialLocks[dev.id].release()
-
 	########################################
 	def setPictureSize(self, action):
 		dev = indigo.devices[action.deviceId]
@@ -1080,19 +1923,24 @@ class Plugin(indigo.PluginBase):
 			self.logger.error(size+" is not a valid picture size")
 			return
 			
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
+		self.queueCommand(dev, self.runSetPictureSize, dev, size)
+
+	########################################
+	def runSetPictureSize(self, dev, size):
+		if not self.supports(dev, "PictureSize "+size):
+			self.logger.warn(dev.name+": TV doesn't support picture size "+size)
+			return
+		if self.checkDevice(dev):
 			try:
 				self.logger.debug(dev.name+": selecting picture size "+size)
-				self.serialConns[dev.id].write(bytearray(self.pictureSizes[size]["command"]))
-				self.waitForAck(dev)
-				self.updatePictureSize(dev)
+				if self.writeFrame(dev, exlinkcodec.PICTURE_SIZE_FRAMES[size], "PictureSize "+size):
+					self.waitForAck(dev)
+					acked = time.time()
+					self.readBack(dev, "PICTURE_SIZE", acked)
 			except:
 				self.logger.error("Plugin internal error changing picture size")
 				pass
 
-		self.serialLocks[dev.id].release()
-
 	########################################
 	def setSoundMode(self, action):
 		dev = indigo.devices[action.deviceId]
@@ -1101,19 +1949,24 @@ class Plugin(indigo.PluginBase):
 			self.logger.error(mode+" is not a valid sound mode")
 			return
 			
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
+		self.queueCommand(dev, self.runSetSoundMode, dev, mode)
+
+	########################################
+	def runSetSoundMode(self, dev, mode):
+		if not self.supports(dev, "SoundMode "+mode):
+			self.logger.warn(dev.name+": TV doesn't support sound mode "+mode)
+			return
+		if self.checkDevice(dev):
 			try:
 				self.logger.debug(dev.name+": selecting sound mode "+mode)
-				self.serialConns[dev.id].write(bytearray(self.soundModes[mode]["command"]))
-				self.waitForAck(dev)
-				self.updateSoundMode(dev)
+				if self.writeFrame(dev, exlinkcodec.SOUND_MODE_FRAMES[mode], "SoundMode "+mode):
+					self.waitForAck(dev)
+					acked = time.time()
+					self.readBack(dev, "SOUND_MODE", acked)
 			except:
 				self.logger.error("Plugin internal error changing sound mode")
 				pass
 
-		self.serialLocks[dev.id].release()
-
 	########################################
 	def setChannel(self, action):
 		dev = indigo.devices[action.deviceId]
@@ -1124,15 +1977,17 @@ class Plugin(indigo.PluginBase):
 			self.logger.error('''"'''+action.props["Channel"]+'''" is not a valid channel''')
 			return
 
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
+		self.queueLatest(dev, "Channel", self.runSetChannel, dev, channel)
+
+	########################################
+	def runSetChannel(self, dev, channel):
+		if self.checkDevice(dev):
 			try:
-				self.sendIntegerCommand(dev, "Channel", channel)
-				self.updateChannel(dev)
+				if self.sendIntegerCommand(dev, "Channel", channel):
+					self.queueReadback(dev, "CHANNEL")
 			except:
 				self.logger.error("Plugin internal error changing channel")
 				pass				
-		self.serialLocks[dev.id].release()
 
 	########################################
 	def setVolume(self, action):
@@ -1144,15 +1999,17 @@ class Plugin(indigo.PluginBase):
 			self.logger.error('''"'''+action.props["Volume"]+'''" is not a valid volume''')
 			return
 		
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
+		self.queueLatest(dev, "Volume", self.runSetVolume, dev, volume)
+
+	########################################
+	def runSetVolume(self, dev, volume):
+		if self.checkDevice(dev):
 			try:
-				self.sendIntegerCommand(dev, "Volume", volume)
-				self.updateVolume(dev)
+				if self.sendIntegerCommand(dev, "Volume", volume):
+					self.queueReadback(dev, "VOLUME")
 			except:
 				self.logger.error("Plugin internal error changing volume")
 				pass				
-		self.serialLocks[dev.id].release()
 
 	########################################
 	# Device commands : one-shot
@@ -1160,102 +2017,56 @@ class Plugin(indigo.PluginBase):
 	########################################
 	# note *some* of the button events trigger status inquiries
 	def sendSingleButton(self, action):
-		buttons = {
-			"MENU" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x1A, 0xAF],
-			"UP" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x60, 0x69],
-			"DOWN" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x61, 0x68],
-			"LEFT" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x65, 0x64],
-			"RIGHT" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x62, 0x67],
-			"ENTER" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x68, 0x61],
-			"EXIT" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x2D, 0x9C],
-			"MUTE" : [0x08, 0x22, 0x02, 0x00, 0x00, 0x00, 0xD4],
-			"VOLUP" : [0x08, 0x22, 0x01, 0x00, 0x01, 0x00, 0xD4],
-			"VOLDOWN" : [0x08, 0x22, 0x01, 0x00, 0x02, 0x00, 0xD3],
-			"CHUP" : [0x08, 0x22, 0x03, 0x00, 0x01, 0x00, 0xD2],
-			"CHDOWN" : [0x08, 0x22, 0x03, 0x00, 0x02, 0x00, 0xD1],
-			"PRECH" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x13, 0xB6],
-			"FAVCH" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x44, 0x85],
-			"CHADD" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x19, 0xB0],
-			"CAPTION" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x25, 0xA4],
-			"SLEEP" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x03, 0xC6],
-			"GUIDE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4F, 0x7A],
-			"INFO" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x1F, 0xAA],
-			"RETURN" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x58, 0x71],
-			"TOOLS" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4B, 0x7E],
-			"RED" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x6C, 0x5D],
-			"GREEN" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x14, 0xB5],
-			"YELLOW" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x15, 0xB4],
-			"BLUE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x16, 0xB3],
-			"PLAY" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x47, 0x82],
-			"PAUSE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4A, 0x7F],
-			"STOP" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x46, 0x83],
-			"REC" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x49, 0x80],
-			"REW" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x45, 0x84],
-			"FF" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x48, 0x81],
-			"SKIPF" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x4E, 0x7B],
-			"SKIPB" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x50, 0x79],
-			"SOURCE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x01, 0xC8],
-			"PICMODE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x28, 0xA1],
-			"SNDMODE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x2B, 0x9E],
-			"CH_LIST" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x6B, 0x5E],
-			"MORE" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x9C, 0x2D],
-			"KEY_0" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x11, 0xB8],
-			"KEY_1" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x04, 0xC5],
-			"KEY_2" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x05, 0xC4],
-			"KEY_3" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x06, 0xC3],
-			"KEY_4" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x08, 0xC1],
-			"KEY_5" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x09, 0xC0],
-			"KEY_6" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0A, 0xBF],
-			"KEY_7" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0C, 0xBD],
-			"KEY_8" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0D, 0xBC],
-			"KEY_9" : [0x08, 0x22, 0x0d, 0x00, 0x00, 0x0E, 0xBB]
-		}
-		
 		dev = indigo.devices[action.deviceId]
 		button = action.props["Button"]
-		if button not in buttons:
+		if button not in self.buttons:
 			self.logger.error(button+" is not a valid key")
 			return
 
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
+		self.queueRepeat(dev, button, self.runButton, dev, button, exlinkcodec.BUTTON_FRAMES[button])
+
+	#status queries - volume, mute, channel, picture mode, sound mode, input
+	#Should we do an updateChannel every time a digit is pressed?  that seems too chatty.
+	buttonReadbacks = {
+		"VOLUP" : "VOLUME",
+		"VOLDOWN" : "VOLUME",
+		"MUTE" : "MUTE",
+		"CHUP" : "CHANNEL",
+		"CHDOWN" : "CHANNEL",
+		"PRECH" : "CHANNEL",
+		"FAVCH" : "CHANNEL",
+		"SOURCE" : "INPUT",
+		"PICMODE" : "PICTURE_MODE",
+		"SNDMODE" : "SOUND_MODE",
+	}
+
+	########################################
+	#count is how many identical presses were coalesced into this one
+	def runButton(self, dev, button, packet, count=1):
+		if self.checkDevice(dev):
 			try:
-				self.logger.debug(dev.name+": sending button "+button)
-				self.serialConns[dev.id].write(bytearray(buttons[button]))
-				if self.waitForAck(dev):
-					#status queries - volume, mute, channel, picture mode, sound mode, input
-					#there's sometimes a delay before the new state is reflected in a query.
-					#maybe sleep here, but it'd probably better to throw off an update thread
-					if button == "VOLUP" or button == "VOLDOWN":
-						self.updateVolume(dev)
-					elif button == "MUTE":
-						self.updateMute(dev)
-					elif button == "CHUP" or button == "CHDOWN" or button == "PRECH" or button == "FAVCH":
-						#Should we do an updateChannel every time a digit is pressed?  that seems too chatty.
-						self.updateChannel(dev)
-					elif button == "SOURCE":
-						self.updateInput(dev)
-					elif button == "PICMODE":
-						self.updatePictureMode(dev)
-					elif button == "SNDMODE":
-						self.updateSoundMode(dev)
-				else:
-					self.logger.error(dev.name+": Button "+button+" not acknowledged")
+				for press in range(count):
+					self.logger.debug(dev.name+": sending button "+button)
+					if not self.writeFrame(dev, packet, button) or not self.waitForAck(dev):
+						self.logger.error(dev.name+": Button "+button+" not acknowledged")
+						return
+				#there's sometimes a delay before the new state is reflected in a query.
+				#the read-back goes to the back of the queue, so any presses that
+				#arrived meanwhile go out first and share it
+				if button in self.buttonReadbacks:
+					self.queueReadback(dev, self.buttonReadbacks[button])
 			except:
 				self.logger.error("Plugin internal error sending "+button)
 				pass					
-		self.serialLocks[dev.id].release()
 
 	########################################
 	#This handles actions with any number of integer fields
 	def integerAction(self, action):
 		dev = indigo.devices[action.deviceId]
-		for command in props:
+		for command in action.props:
 			try:
 				value = int(action.props[command])
-				self.serialLocks[dev.id].acquire()
-				self.sendIntegerCommand(dev, command, value)
-				self.serialLocks[dev.id].release()
+				self.queueCommand(dev, self.sendIntegerCommand, dev, command, value)
 			except:
 				self.logger.error("Plugin internal error processing command "+command)
 				pass
@@ -1264,71 +2075,357 @@ class Plugin(indigo.PluginBase):
 	def enumAction(self, action):
 		dev = indigo.devices[action.deviceId]
 		command = action.props["Command"]
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
-			self.sendEnumCommand(dev, command)
-		self.serialLocks[dev.id].release()
+		self.queueCommand(dev, self.runEnumCommand, dev, command, action.props.get("Force", False))
 
 	########################################
 	def oneshotAction(self, action):
 		dev = indigo.devices[action.deviceId]
-		self.serialLocks[dev.id].acquire()
-		if self.checkSerial(dev):
-			self.sendEnumCommand(dev, str(action.pluginTypeId))
-		self.serialLocks[dev.id].release()
+		self.queueCommand(dev, self.runEnumCommand, dev, str(action.pluginTypeId))
+
+	########################################
+	#sendEnumCommand checks the device itself, once it knows there's something to send
+	def runEnumCommand(self, dev, command, force=False):
+		self.sendEnumCommand(dev, command, force)
 		
 	########################################
 	def compoundAction(self, action):
 		self.logger.debug("compoundAction enter")
 		dev = indigo.devices[action.deviceId]
-		group = action.props.get("CommandGroup", "")
-		if (action.props.get("Command", "") != ""):
- 			self.serialLocks[dev.id].acquire()
-			self.logger.debug("This is enum action "+action.props["Command"])
+		#copy the props; the action object isn't ours once we return
+		props = dict(action.props)
+		group = props.get("CommandGroup", "")
+		if props.get("Command", "") == "" and (group in self.commandGroups or group in self.integerCommands):
+			#integer settings only care about the latest value
+			self.queueLatest(dev, group, self.runCompound, dev, props)
+		else:
+			self.queueCommand(dev, self.runCompound, dev, props)
+
+	########################################
+	def runCompound(self, dev, props):
+		group = props.get("CommandGroup", "")
+		force = props.get("Force", False)
+		if (props.get("Command", "") != ""):
+			self.logger.debug("This is enum action "+props["Command"])
 			try:
-				self.sendEnumCommand(dev, action.props["Command"])
- 			except:
- 				self.logger.error("Plugin internal error processing command "+action.props["Command"])
- 				pass
- 			self.serialLocks[dev.id].release()
+				self.sendEnumCommand(dev, props["Command"], force)
+			except:
+				self.logger.error("Plugin internal error processing command "+props["Command"])
+				pass
 			return
 
 		for cmdGroup in self.commandGroups:
 			if cmdGroup == group:
-				self.serialLocks[dev.id].acquire()
 				self.logger.debug("This is an integer group "+group)
 				for element in self.commandGroups[cmdGroup]:
 					self.logger.debug("Sending element "+element)
 					try:
-						value = int(action.props[element])
-						self.sendIntegerCommand(dev, element, value)
+						value = int(props[element])
+						self.sendIntegerCommand(dev, element, value, force)
 					except:
 						self.logger.error("Plugin internal error processing command "+element)
 						pass
-				self.serialLocks[dev.id].release()
 		
 		for cmd in self.integerCommands:
 			if cmd == group:
-				self.serialLocks[dev.id].acquire()
 				self.logger.debug("This is a single integer command "+group)
 				try:
-					value = int(action.props[cmd])
-					self.sendIntegerCommand(dev, cmd, value)
+					value = int(props[cmd])
+					self.sendIntegerCommand(dev, cmd, value, force)
 				except:
 					self.logger.error("Plugin internal error processing command "+cmd)
 					pass
-				self.serialLocks[dev.id].release()
 
 		for cmd in self.enumCommands:
 			if cmd == group:
-				self.serialLocks[dev.id].acquire()
 				self.logger.debug("This is one-shot command "+group)
 				try:
-					self.sendEnumCommand(dev, cmd)
+					self.sendEnumCommand(dev, cmd, force)
 				except:
 					self.logger.error("Plugin internal error processing command "+cmd)
 					pass
-				self.serialLocks[dev.id].release()
+
+	########################################
+	# Presets
+	# A preset is a named set of settings applied as one transaction: only the
+	# settings that would change are sent, back to back, and one status sweep
+	# at the end confirms what the TV ended up with.  See exlinkpresets.
+
+	########################################
+	#logs and keeps the presets we had if the new definitions are bad
+	def loadPresets(self, text):
+		try:
+			self.presets = parsePresets(text)
+		except PresetError as e:
+			self.logger.error(u"Presets not loaded: "+str(e))
+
+	########################################
+	def applyPreset(self, action):
+		dev = indigo.devices[action.deviceId]
+		name = action.props.get("Preset", "")
+		if name not in self.presets:
+			self.logger.error(dev.name+": there is no preset called \""+name+"\"")
+			return
+
+		self.queueCommand(dev, self.runPreset, dev, name, action.props.get("Force", False))
+
+	########################################
+	#what the TV is known to have for a preset setting, or None.  One-way
+	#settings come from the shadow register; for an enum command that's True
+	#if it was the last one sent for its setting.
+	def presetKnown(self, dev, key):
+		if key in self.integerCommands:
+			return self.shadow.known(dev.id, key)
+		if key in self.enumCommands:
+			return True if self.shadow.current(dev.id, key) else None
+		if key not in self.presetStates:
+			return None
+		value = self.getState(dev, key)
+		if value in (None, "", "UNKNOWN"):
+			return None
+		return value
+
+	#preset settings that are read back by a status query
+	presetStates = ("input", "pictureMode", "pictureSize", "soundMode", "volume", "channel")
+
+	########################################
+	#Returns a dict summarising the whole preset: what was sent, skipped
+	#because it was already set, not acknowledged, or read back different.
+	#force sends every setting, whatever the TV is thought to have.
+	def runPreset(self, dev, name, force=False):
+		started = time.time()
+		preset = self.presets.get(name)
+		result = {"preset" : name, "sent" : [], "skipped" : [], "failed" : [], "mismatched" : [], "ok" : False}
+		if preset is None or not self.checkDevice(dev):
+			result["seconds"] = time.time() - started
+			return result
+
+		if force:
+			steps, result["skipped"] = preset.plan(lambda key: None)
+		else:
+			steps, result["skipped"] = preset.plan(lambda key: self.presetKnown(dev, key))
+		result["sent"], result["failed"] = self.pipelineCommands(dev, [(step.key, step.frame) for step in steps])
+
+		#one sweep over whatever was sent that can be read back
+		sent = set(result["sent"])
+		checked = [step for step in steps if step.key in sent and step.query is not None]
+		queries = [step.query for step in checked]
+		if any(key.startswith("3D") for key in sent):
+			queries.append("3D_MODE")
+		batched = self.beginStates(dev)
+		try:
+			if queries and self.serialConns.get(dev.id) is not None:
+				self.queryStatus(dev, queries)
+			for step in checked:
+				state, label = self.statusStates[step.query]
+				if self.getState(dev, state) != step.value:
+					result["mismatched"].append(step.key)
+			#after the sweep, which forgets settings if the input or a mode changed
+			for step in steps:
+				if step.key in sent:
+					self.shadow.written(dev.id, step.key, step.value)
+				else:
+					self.shadow.forget(dev.id, step.key, step.value)
+			self.publishShadow(dev)
+			result["ok"] = not result["failed"] and not result["mismatched"]
+			self.updateState(dev, "preset", name if result["ok"] else "")
+		finally:
+			if batched:
+				self.commitStates(dev)
+
+		result["seconds"] = time.time() - started
+		summary = "%s: preset \"%s\" %s in %.2f s: %d sent, %d already set" % (dev.name, name,
+			"applied" if result["ok"] else "incomplete", result["seconds"], len(result["sent"]), len(result["skipped"]))
+		if result["ok"]:
+			self.logger.info(summary)
+		else:
+			if result["failed"]:
+				summary += ", not acknowledged: "+", ".join(result["failed"])
+			if result["mismatched"]:
+				summary += ", didn't take: "+", ".join(result["mismatched"])
+			self.logger.warn(summary)
+		return result
+
+	########################################
+	# Group actions
+	# One command sent to many TVs at once.  Each TV's share goes on its own
+	# port's worker like any other command, so TVs on different ports all run
+	# at the same time and the group takes about as long as its slowest TV.  A
+	# thread of the action's own waits for them all, giving each TV until its
+	# deadline, and logs one summary of what happened.
+
+	#how many TVs one group action keeps queued at once
+	groupParallel = 64
+	groupDeadline = 10 #seconds
+
+	#Command menu value -> (what the summary calls it, table the Value menu
+	#chooses from, or None if it takes no value).  Presets come from self.presets.
+	groupCommands = OrderedDict([
+		("PowerOn", ("turn on", None)),
+		("PowerOff", ("turn off", None)),
+		("Input", ("input", exlinkcodec.INPUT_FRAMES)),
+		("PictureMode", ("picture mode", exlinkcodec.PICTURE_MODE_FRAMES)),
+		("PictureSize", ("picture size", exlinkcodec.PICTURE_SIZE_FRAMES)),
+		("SoundMode", ("sound mode", exlinkcodec.SOUND_MODE_FRAMES)),
+		("Enum", ("command", exlinkcodec.ENUM_FRAMES)),
+		("Integer", ("set", exlinkcodec.INTEGER_COMMANDS)),
+		("Preset", ("preset", None)),
+	])
+
+	#selections that are read back: Command -> (runner, status query)
+	groupSelections = {
+		"Input" : ("runSelectInput", "INPUT"),
+		"PictureMode" : ("runSetPictureMode", "PICTURE_MODE"),
+		"PictureSize" : ("runSetPictureSize", "PICTURE_SIZE"),
+		"SoundMode" : ("runSetSoundMode", "SOUND_MODE"),
+	}
+
+	########################################
+	#what the Value field can hold for a command, or None if it takes no value
+	def groupChoices(self, command):
+		if command == "Preset":
+			return self.presets
+		return self.groupCommands[command][1]
+
+	########################################
+	def validateGroupAction(self, valuesDict, errorsDict):
+		if len(list(valuesDict.get("Devices", []))) == 0:
+			errorsDict["Devices"] = "Please choose at least one TV"
+		command = valuesDict.get("Command", "")
+		if command not in self.groupCommands:
+			errorsDict["Command"] = "Please choose a command"
+		else:
+			choices = self.groupChoices(command)
+			value = valuesDict.get("Value", "")
+			if choices is not None and value not in choices:
+				errorsDict["Value"] = "Please choose a value"
+			elif command == "Integer":
+				limits = self.integerCommands[value]
+				try:
+					number = int(valuesDict.get("Number", ""))
+					if number < limits["min"] or number > limits["max"]:
+						raise ValueError()
+				except ValueError:
+					errorsDict["Number"] = "%s must be an integer between %i and %i" % (value, limits["min"], limits["max"])
+		try:
+			if float(valuesDict.get("Deadline", "")) <= 0:
+				raise ValueError()
+		except ValueError:
+			errorsDict["Deadline"] = "Please give a number of seconds"
+
+	########################################
+	def groupCommand(self, action):
+		props = action.props
+		command = props.get("Command", "")
+		if command not in self.groupCommands:
+			self.logger.error(u"Group action: please choose a command")
+			return
+		value = props.get("Value", "")
+		number = None
+		try:
+			if command == "Integer":
+				number = int(props.get("Number", ""))
+			deadline = float(props.get("Deadline", self.groupDeadline))
+		except ValueError:
+			self.logger.error(u"Group action: invalid number")
+			return
+
+		devices = []
+		for devId in props.get("Devices", []):
+			dev = indigo.devices.get(int(devId))
+			if dev is not None:
+				devices.append(dev)
+		if not devices:
+			self.logger.error(u"Group action: none of its TVs exist any more")
+			return
+
+		description = self.groupCommands[command][0]
+		if command != "PowerOn" and command != "PowerOff":
+			description += " "+value
+		if number is not None:
+			description += " = %d" % number
+		#wait for the outcome on a thread of our own; Indigo's shouldn't block
+		waiter = threading.Thread(target=self.runGroup, name="ExLink group "+description,
+			args=(description, devices, command, value, number, deadline))
+		waiter.daemon = True
+		waiter.start()
+
+	########################################
+	#Runs the command on every device and returns {"ok", "failed", "late" :
+	#device names, "seconds"}.  Each device has `deadline` seconds from when
+	#its command is queued; one that hasn't finished by then is counted late
+	#(its command still runs, but nobody waits for it).
+	def runGroup(self, description, devices, command, value, number, deadline):
+		started = time.time()
+		result = {"ok" : [], "failed" : [], "late" : []}
+		finished = threading.Condition()
+		done = [] #device ids whose commands have finished, for the loop below
+		def notify(devId):
+			with finished:
+				done.append(devId)
+				finished.notify()
+
+		waiting = list(devices)
+		running = {} #dev.id -> (dev, future, deadline)
+		while waiting or running:
+			while waiting and len(running) < self.groupParallel:
+				dev = waiting.pop(0)
+				future = self.queueCommand(dev, self.runGroupCommand, dev, command, value, number)
+				running[dev.id] = (dev, future, time.time() + deadline)
+				future.addCallback(lambda future, devId=dev.id: notify(devId))
+
+			with finished:
+				while not done:
+					remaining = min(due for dev, future, due in running.values()) - time.time()
+					if remaining <= 0:
+						break
+					finished.wait(remaining)
+				finishedIds = done[:]
+				del done[:]
+
+			for devId in finishedIds:
+				entry = running.pop(devId, None)
+				if entry is None:
+					continue
+				dev, future, due = entry
+				result["ok" if future.error is None and future.value else "failed"].append(dev.name)
+			now = time.time()
+			for devId, (dev, future, due) in list(running.items()):
+				if due <= now and not future.done():
+					del running[devId]
+					result["late"].append(dev.name)
+
+		result["seconds"] = time.time() - started
+		summary = "Group %s: %d of %d succeeded in %.2f s" % (description, len(result["ok"]), len(devices), result["seconds"])
+		if result["failed"] or result["late"]:
+			if result["failed"]:
+				summary += "; failed: "+", ".join(sorted(result["failed"]))
+			if result["late"]:
+				summary += "; no answer within %g s: " % deadline + ", ".join(sorted(result["late"]))
+			self.logger.warn(summary)
+		else:
+			self.logger.info(summary)
+		return result
+
+	########################################
+	#one device's share of a group action, on its worker; True if it took
+	def runGroupCommand(self, dev, command, value, number):
+		if command == "PowerOn":
+			self.powerOn(dev)
+			return self.getState(dev, "onOffState") is True
+		if command == "PowerOff":
+			self.powerOff(dev)
+			return self.getState(dev, "onOffState") is False
+		if command in self.groupSelections:
+			runner, query = self.groupSelections[command]
+			getattr(self, runner)(dev, value)
+			return self.getState(dev, self.statusStates[query][0]) == value
+		if command == "Enum":
+			return self.sendEnumCommand(dev, value) is True
+		if command == "Integer":
+			return self.sendIntegerCommand(dev, value, number) is True
+		if command == "Preset":
+			return self.runPreset(dev, value)["ok"]
+		return False
 
 	########################################
 	def doNothingMethod(self, valuesDict, typeId="", devId=None):
@@ -1351,3 +2448,17 @@ class Plugin(indigo.PluginBase):
 				returnList.extend([(command, self.enumCommands[command]["name"])])
 				
 		return returnList
+
+	########################################
+	def presetGenerator(self, filter="", valuesDict=None, typeId="", devId=None):
+		return [(name, name) for name in sorted(self.presets)]
+
+	########################################
+	#the Value menu of a group action, for whichever command is chosen
+	def groupValueGenerator(self, filter="", valuesDict=None, typeId="", devId=None):
+		command = (valuesDict or {}).get("Command", "")
+		if command not in self.groupCommands or self.groupChoices(command) is None:
+			return []
+		if command == "Enum":
+			return [(name, name+" ("+self.enumCommands[name]["name"]+")") for name in sorted(self.enumCommands)]
+		return [(name, name) for name in sorted(self.groupChoices(command))]
@@ -0,0 +1,230 @@
+#! /usr/bin/env python
+
+# End-to-end benchmarks for the Ex-Link plugin against the TV emulator.
+#
+# The real Plugin class is loaded with the stub indigo module from this
+# directory and pointed at one or more emulated TVs, then driven through the
+# same methods Indigo would call.  Reported:
+#   sweep       - time for a full status sweep (requestStatus)
+#   throughput  - integer commands per second through one device's queue
+#   concurrent  - per-command latency (submit to finish) while several threads
+#                 fire actions at every device and status sweeps run alongside
+#
+# This is a measuring tool, not a test suite; run it before and after a change
+# and compare.  It needs pyserial and the same Python the plugin runs on.
+#
+#   python bench/benchmark.py
+#   python bench/benchmark.py --transport pty --devices 2 --json
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Samsung Ex-Link.indigoPlugin", "Contents", "Server Plugin"))
+sys.path.insert(0, HERE) #the stub indigo module must win
+
+import indigo
+import plugin
+from exlinkemulator import TVEmulator
+
+################################################################################
+class BenchDevice(object):
+	def __init__(self, id, name, portProps):
+		self.id = id
+		self.name = name
+		self.enabled = True
+		self.configured = True
+		self.onState = True
+		self.pluginProps = portProps
+		self.states = {"onOffState" : True, "input" : "", "Mode3D" : "OFF", "connection" : ""}
+		self.serverUpdates = 0
+
+	########################################
+	def updateStateOnServer(self, key, value, **kwargs):
+		self.serverUpdates += 1
+		self.states[key] = value
+		if key == "onOffState":
+			self.onState = value
+
+	########################################
+	def updateStatesOnServer(self, stateList):
+		self.serverUpdates += 1
+		for state in stateList:
+			self.states[state["key"]] = state["value"]
+			if state["key"] == "onOffState":
+				self.onState = state["value"]
+
+	########################################
+	def stateListOrDisplayStateIdChanged(self):
+		pass
+
+################################################################################
+def percentile(samples, fraction):
+	if not samples:
+		return 0.0
+	ordered = sorted(samples)
+	index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+	return ordered[index]
+
+########################################
+def summarize(samples):
+	return {
+		"count" : len(samples),
+		"min" : min(samples) if samples else 0.0,
+		"p50" : percentile(samples, 0.50),
+		"p95" : percentile(samples, 0.95),
+		"p99" : percentile(samples, 0.99),
+		"max" : max(samples) if samples else 0.0,
+	}
+
+########################################
+def portProps(transport, tv):
+	if transport == "pty":
+		return {"devicePortFieldId_serialConnType" : "local",
+				"devicePortFieldId_serialPortLocal" : tv.servePty()}
+	return {"devicePortFieldId_serialConnType" : "netSocket",
+			"devicePortFieldId_serialPortNetSocket" : tv.serveSocket()}
+
+########################################
+def setUp(args):
+	tvs = []
+	devices = []
+	exlink = plugin.Plugin("com.oldefortran.exlink", "Samsung Ex-Link", "bench", {"PollingFlag" : False})
+	exlink.startup()
+	for number in range(args.devices):
+		if args.shared and tvs:
+			#every device on the first TV's port, as if configured twice
+			props = dict(devices[0].pluginProps)
+		else:
+			tv = TVEmulator(args.ack_latency, args.reply_latency, args.baud,
+				args.drop, args.corrupt, args.noise, seed=number)
+			props = portProps(args.transport, tv)
+			tvs.append(tv)
+		dev = BenchDevice(1000 + number, "TV %d" % (number + 1), props)
+		indigo.devices[dev.id] = dev
+		exlink.deviceStartComm(dev)
+		devices.append(dev)
+	#ports open in the background; wait for them before timing anything
+	deadline = time.time() + 10
+	for dev in devices:
+		while exlink.connections.connection(exlink.getPortKey(dev)) is None and time.time() < deadline:
+			time.sleep(0.01)
+	return exlink, tvs, devices
+
+########################################
+def tearDown(exlink, tvs, devices):
+	for dev in devices:
+		exlink.deviceStopComm(dev)
+		indigo.devices.pop(dev.id, None)
+	exlink.shutdown()
+	exlink.connections.join(1)
+	for tv in tvs:
+		tv.stop()
+
+########################################
+def benchSweep(exlink, dev, sweeps):
+	samples = []
+	for sweep in range(sweeps):
+		start = time.time()
+		exlink.queueCommand(dev, exlink.requestStatus, dev).wait()
+		samples.append(time.time() - start)
+	return summarize(samples)
+
+########################################
+def benchThroughput(exlink, dev, commands):
+	start = time.time()
+	futures = [exlink.queueCommand(dev, exlink.sendIntegerCommand, dev, "Contrast", number % 100)
+		for number in range(commands)]
+	for future in futures:
+		future.wait()
+	elapsed = time.time() - start
+	return {"commands" : commands, "seconds" : elapsed, "perSecond" : commands / elapsed if elapsed else 0.0}
+
+########################################
+def benchConcurrent(exlink, devices, threads, perThread):
+	samples = []
+	samplesLock = threading.Lock()
+	actions = [
+		lambda dev, number: exlink.queueCommand(dev, exlink.runSetVolume, dev, number % 50),
+		lambda dev, number: exlink.queueCommand(dev, exlink.runButton, dev, "VOLUP", exlink.buttons["VOLUP"]),
+		lambda dev, number: exlink.queueCommand(dev, exlink.runEnumCommand, dev, "EdgeEnhancementOn"),
+		lambda dev, number: exlink.queueCommand(dev, exlink.requestStatus, dev),
+	]
+
+	def client(seed):
+		for number in range(perThread):
+			dev = devices[(seed + number) % len(devices)]
+			start = time.time()
+			actions[(seed + number) % len(actions)](dev, number).wait()
+			elapsed = time.time() - start
+			with samplesLock:
+				samples.append(elapsed)
+
+	start = time.time()
+	workers = [threading.Thread(target=client, args=(seed,)) for seed in range(threads)]
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+	result = summarize(samples)
+	result["seconds"] = time.time() - start
+	return result
+
+########################################
+def report(results):
+	sweep = results["sweep"]
+	print("status sweep      p50 %7.1f ms   p95 %7.1f ms   max %7.1f ms   (%d sweeps)" %
+		(sweep["p50"] * 1000, sweep["p95"] * 1000, sweep["max"] * 1000, sweep["count"]))
+	throughput = results["throughput"]
+	print("throughput        %7.1f commands/s   (%d commands in %.2f s)" %
+		(throughput["perSecond"], throughput["commands"], throughput["seconds"]))
+	concurrent = results["concurrent"]
+	print("concurrent        p50 %7.1f ms   p95 %7.1f ms   p99 %7.1f ms   max %7.1f ms   (%d actions)" %
+		(concurrent["p50"] * 1000, concurrent["p95"] * 1000, concurrent["p99"] * 1000,
+		concurrent["max"] * 1000, concurrent["count"]))
+
+########################################
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the Ex-Link plugin against emulated TVs")
+	parser.add_argument("--transport", choices=["socket", "pty"], default="socket")
+	parser.add_argument("--devices", type=int, default=1)
+	parser.add_argument("--shared", action="store_true", help="put every device on one port")
+	parser.add_argument("--sweeps", type=int, default=20)
+	parser.add_argument("--commands", type=int, default=100)
+	parser.add_argument("--threads", type=int, default=4)
+	parser.add_argument("--per-thread", type=int, default=25)
+	parser.add_argument("--ack-latency", type=float, default=0.02)
+	parser.add_argument("--reply-latency", type=float, default=0.05)
+	parser.add_argument("--baud", type=int, default=9600, help="emulated wire speed (0 for none)")
+	parser.add_argument("--drop", type=float, default=0.0)
+	parser.add_argument("--corrupt", type=float, default=0.0)
+	parser.add_argument("--noise", type=float, default=0.0)
+	parser.add_argument("--json", action="store_true", help="print results as JSON")
+	parser.add_argument("--verbose", action="store_true", help="show the plugin's log")
+	args = parser.parse_args()
+
+	logging.basicConfig(level=logging.DEBUG if args.verbose else logging.ERROR,
+		format="%(threadName)s %(message)s")
+
+	exlink, tvs, devices = setUp(args)
+	try:
+		results = {
+			"sweep" : benchSweep(exlink, devices[0], args.sweeps),
+			"throughput" : benchThroughput(exlink, devices[0], args.commands),
+			"concurrent" : benchConcurrent(exlink, devices, args.threads, args.per_thread),
+		}
+	finally:
+		tearDown(exlink, tvs, devices)
+
+	if args.json:
+		print(json.dumps(results, indent=2, sort_keys=True))
+	else:
+		report(results)
+
+if __name__ == "__main__":
+	main()
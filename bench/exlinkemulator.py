@@ -0,0 +1,374 @@
+#! /usr/bin/env python
+
+# A pretend Samsung TV that speaks Ex-Link.
+#
+# Frames come from the plugin's own tables (exlinkcodec), so whatever the plugin
+# sends the emulator understands the same way.  The TV can sit behind a pty
+# (looks like a local serial port) or a TCP socket (open it as socket://host:port);
+# both work with pyserial and the plugin's openSerial.
+#
+# Timing and faults are configurable:
+#   ackLatency    - seconds between receiving a command and acking it
+#   replyLatency  - further seconds before a status reply follows the ack
+#   baud          - if set, each written byte also costs 10 bits of wire time
+#   dropRate      - fraction of commands silently ignored (no ack, no reply)
+#   corruptRate   - fraction of status replies sent with a bad checksum
+#   noiseRate     - fraction of frames preceded by a junk byte
+#   announce      - send a status frame unasked whenever remote() changes something
+#   unsupported   - names of queries, commands or selections (as the plugin
+#                   calls them: "3D_MODE", "Input PC1") this TV never answers
+# A TV that's powered off ignores everything except PowerOn.
+#
+#   python exlinkemulator.py --socket 4000
+#   python exlinkemulator.py --pty
+
+import argparse
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Samsung Ex-Link.indigoPlugin", "Contents", "Server Plugin"))
+
+import exlinkcodec
+
+COMMAND_START = bytes(bytearray([0x08, 0x22]))
+COMMAND_LENGTH = 7
+REPLY_HEADER = [0x03, 0x0C, 0xF5, 0x08, 0xF0]
+
+#3D enum commands that change what the 3D mode query reports
+THREED_COMMANDS = {
+	"3DModeOff" : "OFF",
+	"3DMode2Dto3D" : "TWO_TO_THREE",
+	"3DModeSideBySide" : "SIDE_BY_SIDE",
+	"3DModeTopBottom" : "TOP_BOTTOM",
+}
+
+#query -> (state attribute, response table); value queries have no table
+QUERY_STATES = {
+	"INPUT" : ("input", exlinkcodec.INPUTS),
+	"PICTURE_MODE" : ("pictureMode", exlinkcodec.PICTURE_MODES),
+	"PICTURE_SIZE" : ("pictureSize", exlinkcodec.PICTURE_SIZES),
+	"SOUND_MODE" : ("soundMode", exlinkcodec.SOUND_MODES),
+	"3D_MODE" : ("Mode3D", exlinkcodec.THREED_MODES),
+	"VOLUME" : ("volume", None),
+	"MUTE" : ("mute", None),
+	"CHANNEL" : ("channel", None),
+}
+
+################################################################################
+class TVEmulator(object):
+	def __init__(self, ackLatency=0.02, replyLatency=0.05, baud=0,
+			dropRate=0.0, corruptRate=0.0, noiseRate=0.0, seed=None, announce=False, unsupported=()):
+		self.ackLatency = ackLatency
+		self.replyLatency = replyLatency
+		self.baud = baud
+		self.dropRate = dropRate
+		self.corruptRate = corruptRate
+		self.noiseRate = noiseRate
+		self.announce = announce
+		self.unsupported = set(unsupported)
+		self.random = random.Random(seed)
+		self.lock = threading.Lock()
+
+		self.power = True
+		self.input = "HDMI1"
+		self.pictureMode = "STANDARD"
+		self.pictureSize = "SIXTEEN_NINE"
+		self.soundMode = "STANDARD"
+		self.Mode3D = "OFF"
+		self.volume = 10
+		self.mute = False
+		self.channel = 7
+		self.settings = {} #write-only integer settings, by command name
+
+		self.commands = 0
+		self.dropped = 0
+		self.commandHandlers = self.buildHandlers()
+		self.integerPrefixes = dict((prefix, name)
+			for name, (prefix, total) in exlinkcodec.INTEGER_TEMPLATES.items())
+		self.stopping = False
+		self.servers = []
+		self.writers = [] #every connection's write, for announcements
+		self.writeLock = threading.Lock()
+
+	########################################
+	def buildHandlers(self):
+		handlers = {}
+		for name, frame in exlinkcodec.ENUM_FRAMES.items():
+			handlers[frame] = ("enum", name)
+		for name, frame in exlinkcodec.BUTTON_FRAMES.items():
+			handlers[frame] = ("button", name)
+		for name, frame in exlinkcodec.INPUT_FRAMES.items():
+			handlers[frame] = ("input", name)
+		for name, frame in exlinkcodec.PICTURE_MODE_FRAMES.items():
+			handlers[frame] = ("pictureMode", name)
+		for name, frame in exlinkcodec.PICTURE_SIZE_FRAMES.items():
+			handlers[frame] = ("pictureSize", name)
+		for name, frame in exlinkcodec.SOUND_MODE_FRAMES.items():
+			handlers[frame] = ("soundMode", name)
+		for name, frame in exlinkcodec.QUERY_FRAMES.items():
+			handlers[frame] = ("query", name)
+		return handlers
+
+	########################################
+	def powerOff(self):
+		self.power = False
+
+	########################################
+	def powerOn(self):
+		self.power = True
+
+	########################################
+	#Returns the frames to send back for one command, as (delay, frame) pairs
+	#where each delay is counted from the frame before it.
+	def process(self, command):
+		command = bytes(command)
+		with self.lock:
+			self.commands += 1
+			if not exlinkcodec.checksumOK(command):
+				return []
+			handler = self.commandHandlers.get(command)
+			if handler is None and command[:5] in self.integerPrefixes:
+				handler = ("integer", self.integerPrefixes[command[:5]])
+			if handler is None:
+				return []
+			if not self.power and handler != ("enum", "PowerOn"):
+				return []
+			if handler[1] in self.unsupported or self.selectionName(handler) in self.unsupported:
+				return []
+			if self.random.random() < self.dropRate:
+				self.dropped += 1
+				return []
+
+			kind, name = handler
+			frames = [(self.ackLatency, exlinkcodec.ACK_FRAME)]
+			if kind == "query":
+				frames.append((self.replyLatency, self.reply(name)))
+			elif kind == "enum":
+				self.applyEnum(name)
+			elif kind == "button":
+				self.applyButton(name)
+			elif kind == "integer":
+				self.applyInteger(name, bytearray(command)[5])
+			else:
+				setattr(self, kind, name)
+			return frames
+
+	########################################
+	#"Input HDMI1" and so on, as the plugin names selections
+	def selectionName(self, handler):
+		kind, name = handler
+		return kind[0].upper()+kind[1:]+" "+name
+
+	########################################
+	def reply(self, query):
+		if query == "POWER":
+			frame = bytearray(exlinkcodec.POWER_REPLY)
+		else:
+			attribute, table = QUERY_STATES[query]
+			value = getattr(self, attribute)
+			if table is None:
+				frame = bytearray(REPLY_HEADER + [exlinkcodec.QUERIES[query][3], 0x00, 0x00, 0xF1, int(value), 0x00, 0x00])
+				frame.append(exlinkcodec.checksum(frame))
+			else:
+				response = table[value].get("response")
+				if not response and attribute == "input":
+					#the smarthub apps all answer with the generic smarthub reply
+					response = exlinkcodec.INPUTS["SMARTHUB"]["response"]
+				frame = bytearray(REPLY_HEADER + list(response))
+		if self.random.random() < self.corruptRate:
+			frame[-1] ^= 0xFF
+		return bytes(frame)
+
+	########################################
+	def applyEnum(self, name):
+		if name == "PowerOff":
+			self.power = False
+		elif name == "PowerOn":
+			self.power = True
+		elif name in THREED_COMMANDS:
+			self.Mode3D = THREED_COMMANDS[name]
+
+	########################################
+	def applyButton(self, name):
+		if name == "VOLUP":
+			self.volume = min(100, self.volume + 1)
+		elif name == "VOLDOWN":
+			self.volume = max(0, self.volume - 1)
+		elif name == "MUTE":
+			self.mute = not self.mute
+		elif name == "CHUP":
+			self.channel = min(255, self.channel + 1)
+		elif name == "CHDOWN":
+			self.channel = max(1, self.channel - 1)
+
+	########################################
+	def applyInteger(self, name, value):
+		if name == "Volume":
+			self.volume = value
+		elif name == "Channel":
+			self.channel = value
+		else:
+			self.settings[name] = value
+
+	########################################
+	#A change made at the TV itself, e.g. remote("input", "HDMI2").  Returns
+	#the number of connections told about it.
+	def remote(self, attribute, value):
+		with self.lock:
+			setattr(self, attribute, value)
+			query = [query for query, (state, table) in QUERY_STATES.items() if state == attribute][0]
+			frame = self.reply(query)
+		if not self.announce:
+			return 0
+		with self.writeLock:
+			for write in list(self.writers):
+				write(frame)
+			return len(self.writers)
+
+	########################################
+	#Reads commands from one connection until it closes, answering each in turn
+	#the way a TV works through its serial buffer.
+	def serve(self, read, write):
+		self.writers.append(write)
+		try:
+			self.answer(read, write)
+		finally:
+			self.writers.remove(write)
+
+	########################################
+	def answer(self, read, write):
+		buffer = bytearray()
+		while not self.stopping:
+			data = read()
+			if not data:
+				return
+			buffer += bytearray(data)
+			while True:
+				start = buffer.find(COMMAND_START)
+				if start < 0:
+					del buffer[:-1]
+					break
+				del buffer[:start]
+				if len(buffer) < COMMAND_LENGTH:
+					break
+				command = bytes(buffer[:COMMAND_LENGTH])
+				del buffer[:COMMAND_LENGTH]
+				for delay, frame in self.process(command):
+					if delay > 0:
+						time.sleep(delay)
+					if self.random.random() < self.noiseRate:
+						frame = bytes(bytearray([0x55])) + frame
+					if self.baud:
+						time.sleep(len(frame) * 10.0 / self.baud)
+					with self.writeLock:
+						write(frame)
+
+	########################################
+	#returns a socket:// URL for the plugin to open
+	def serveSocket(self, host="127.0.0.1", port=0):
+		listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+		listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		listener.bind((host, port))
+		listener.listen(4)
+		self.servers.append(listener)
+
+		def accept():
+			while not self.stopping:
+				try:
+					conn, address = listener.accept()
+				except socket.error:
+					return
+				conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+				thread = threading.Thread(target=self.serveConnection, args=(conn,), name="ExLink emulator connection")
+				thread.daemon = True
+				thread.start()
+
+		thread = threading.Thread(target=accept, name="ExLink emulator listener")
+		thread.daemon = True
+		thread.start()
+		return "socket://%s:%d" % listener.getsockname()
+
+	########################################
+	def serveConnection(self, conn):
+		def read():
+			try:
+				return conn.recv(256)
+			except socket.error:
+				return None
+		try:
+			self.serve(read, conn.sendall)
+		except socket.error:
+			pass
+		finally:
+			conn.close()
+
+	########################################
+	#returns the path of a pty that behaves like a local serial port
+	def servePty(self):
+		import pty
+		import tty
+		master, slave = pty.openpty()
+		tty.setraw(slave)
+		self.servers.append(master)
+
+		def read():
+			try:
+				return os.read(master, 256)
+			except OSError:
+				return None
+
+		def write(frame):
+			os.write(master, frame)
+
+		thread = threading.Thread(target=self.serve, args=(read, write), name="ExLink emulator pty")
+		thread.daemon = True
+		thread.start()
+		return os.ttyname(slave)
+
+	########################################
+	def stop(self):
+		self.stopping = True
+		for server in self.servers:
+			try:
+				if isinstance(server, int):
+					os.close(server)
+				else:
+					server.close()
+			except (OSError, socket.error):
+				pass
+
+########################################
+def main():
+	parser = argparse.ArgumentParser(description="Emulate a Samsung TV on an Ex-Link port")
+	parser.add_argument("--socket", type=int, metavar="PORT", help="listen on this TCP port")
+	parser.add_argument("--pty", action="store_true", help="serve on a new pty")
+	parser.add_argument("--ack-latency", type=float, default=0.02)
+	parser.add_argument("--reply-latency", type=float, default=0.05)
+	parser.add_argument("--baud", type=int, default=0)
+	parser.add_argument("--drop", type=float, default=0.0)
+	parser.add_argument("--corrupt", type=float, default=0.0)
+	parser.add_argument("--noise", type=float, default=0.0)
+	parser.add_argument("--off", action="store_true", help="start with the TV powered off")
+	parser.add_argument("--unsupported", default="", help="comma-separated queries and commands to ignore")
+	args = parser.parse_args()
+
+	tv = TVEmulator(args.ack_latency, args.reply_latency, args.baud, args.drop, args.corrupt, args.noise,
+		unsupported=[name.strip() for name in args.unsupported.split(",") if name.strip()])
+	tv.power = not args.off
+	if args.pty:
+		print("Ex-Link TV on "+tv.servePty())
+	else:
+		print("Ex-Link TV on "+tv.serveSocket(port=args.socket or 0))
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		tv.stop()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,54 @@
+#! /usr/bin/env python
+
+# Just enough of the indigo module to run the plugin outside the Indigo server.
+# Only used by the benchmarks in this directory; serial ports are opened with
+# pyserial's serial_for_url so both pty paths and socket:// URLs work.
+
+import logging
+import time
+
+import serial
+
+kDeviceAction = type("kDeviceAction", (object,), {"TurnOn" : "TurnOn", "TurnOff" : "TurnOff", "Toggle" : "Toggle"})
+kUniversalAction = type("kUniversalAction", (object,), {"RequestStatus" : "RequestStatus"})
+
+Dict = dict
+List = list
+
+################################################################################
+class Devices(dict):
+	def iter(self, filter=None):
+		return iter(list(self.values()))
+
+devices = Devices()
+
+################################################################################
+class PluginBase(object):
+	class StopThread(Exception):
+		pass
+
+	def __init__(self, pluginId, pluginDisplayName, pluginVersion, pluginPrefs):
+		self.pluginId = pluginId
+		self.pluginDisplayName = pluginDisplayName
+		self.pluginVersion = pluginVersion
+		self.pluginPrefs = pluginPrefs
+		self.logger = logging.getLogger("Plugin")
+		self.stopping = False
+
+	########################################
+	def __del__(self):
+		pass
+
+	########################################
+	def openSerial(self, ownerName, portUrl, baudrate, **kwargs):
+		try:
+			return serial.serial_for_url(portUrl, baudrate, **kwargs)
+		except Exception:
+			self.logger.error(ownerName+": unable to open "+portUrl)
+			return None
+
+	########################################
+	def sleep(self, seconds):
+		if self.stopping:
+			raise self.StopThread()
+		time.sleep(seconds)